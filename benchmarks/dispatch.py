@@ -0,0 +1,96 @@
+"""
+1000 个订阅时，一个订阅一个线程 和 Dispatcher 线程池 的对比
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/dispatch.py [subscriptions] [messages_per_subscription] [workers]
+"""
+import _thread as thread
+import os
+import queue
+import sys
+import threading
+import time
+
+from onetoken_sync.dispatch import Dispatcher
+
+
+def thread_count():
+    try:
+        return len(os.listdir('/proc/self/task'))
+    except OSError:
+        return threading.active_count()
+
+
+class Counter:
+    def __init__(self, total):
+        self.total = total
+        self.count = 0
+        self.lock = thread.allocate_lock()
+        self.done = threading.Event()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.count += 1
+            if self.count == self.total:
+                self.done.set()
+
+
+def thread_per_key(n_keys, n_msgs):
+    """
+    原来 Quote.handle_q 的方式
+    """
+    counter = Counter(n_keys * n_msgs)
+    queues = [queue.Queue() for _ in range(n_keys)]
+
+    def run(q):
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            counter(item)
+
+    for q in queues:
+        thread.start_new_thread(run, (q,))
+    threads = thread_count()
+    start = time.perf_counter()
+    for i in range(n_msgs):
+        for q in queues:
+            q.put(i)
+    counter.done.wait()
+    cost = time.perf_counter() - start
+    for q in queues:
+        q.put(None)
+    return cost, threads
+
+
+def dispatcher(n_keys, n_msgs, workers):
+    counter = Counter(n_keys * n_msgs)
+    d = Dispatcher(counter, workers)
+    channels = [d.channel(i) for i in range(n_keys)]
+    threads = thread_count()
+    start = time.perf_counter()
+    for i in range(n_msgs):
+        for ch in channels:
+            ch.put(i)
+    counter.done.wait()
+    cost = time.perf_counter() - start
+    d.stop()
+    return cost, threads
+
+
+def main():
+    n_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_msgs = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    total = n_keys * n_msgs
+    print('{} subscriptions, {} messages'.format(n_keys, total))
+    for name, run in [('dispatcher x{}'.format(workers), lambda: dispatcher(n_keys, n_msgs, workers)),
+                      ('thread per key', lambda: thread_per_key(n_keys, n_msgs))]:
+        cost, threads = run()
+        time.sleep(0.5)
+        print('{:<16} threads={:<6} {:.3f}s {:>10.0f} msg/s'.format(name, threads, cost, total / cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+对比不同 json 库解析一条推送消息的耗时
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/json_codec.py [count]
+"""
+import gzip
+import json
+import sys
+import timeit
+
+from onetoken_sync import codec
+from onetoken_sync.config import Config
+
+MESSAGE = {
+    'uri': 'single-tick-verbose',
+    'data': {'contract': 'huobip/btc.usdt', 'last': 7505.4, 'volume': 12345.6, 'source': 'huobip',
+             'time': '2019-11-29T08:00:00.123456+08:00', 'exchange_time': '2019-11-29T08:00:00.100000+08:00',
+             'bids': [{'price': 7505.4 - i * 0.1, 'volume': 0.5 + i} for i in range(20)],
+             'asks': [{'price': 7505.5 + i * 0.1, 'volume': 0.5 + i} for i in range(20)]},
+}
+
+
+def bench(func, count):
+    return min(timeit.repeat(func, number=count, repeat=3)) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    text = json.dumps(MESSAGE)
+    raw = text.encode()
+    compressed = gzip.compress(raw)
+    print('message {} bytes, gzip {} bytes'.format(len(raw), len(compressed)))
+    print('{:<8} {:>12} {:>12} {:>12}'.format('backend', 'str us', 'bytes us', 'gzip us'))
+    for name in codec.BACKENDS:
+        Config.JSON_CODEC = name
+        if codec.get_backend() != name:
+            print('{:<8} not installed'.format(name))
+            continue
+        assert codec.loads(raw) == MESSAGE
+        a = bench(lambda: codec.loads(text), count)
+        b = bench(lambda: codec.loads(raw), count)
+        c = bench(lambda: codec.loads(gzip.decompress(compressed)), count)
+        print('{:<8} {:>12.2f} {:>12.2f} {:>12.2f}'.format(name, a, b, c))
+    c = bench(lambda: json.loads(gzip.decompress(compressed).decode()), count)
+    print('{:<8} {:>12} {:>12} {:>12.2f}'.format('before', '-', '-', c))
+    Config.JSON_CODEC = 'auto'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+对比 model 中普通类和 __slots__ 类的内存占用
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/model_memory.py [count]
+"""
+import sys
+import tracemalloc
+
+import arrow
+
+from onetoken_sync.model import Candle, CompactCandle, CompactOrder, CompactTick, CompactZhubi, Order, Tick, Zhubi
+
+tm = arrow.get('2019-11-29T08:00:00.123+08:00').datetime
+
+candle = {'time': '2019-11-29T08:00:00+08:00', 'open': 7500.1, 'high': 7510.2, 'low': 7490.3, 'close': 7505.4,
+          'volume': 12.5, 'amount': 93812.5, 'contract': 'huobip/btc.usdt', 'duration': '1m'}
+zhubi = {'time': '2019-11-29T08:00:00.123+08:00', 'exchange_time': '2019-11-29T08:00:00.100+08:00',
+         'contract': 'huobip/btc.usdt', 'price': 7505.4, 'amount': 0.5, 'bs': 'b'}
+order = {'contract': 'huobip/btc.usdt', 'entrust_price': 7500, 'bs': 'b', 'entrust_amount': 1,
+         'entrust_time': '2019-11-29T08:00:00+08:00', 'account': 'huobip/demo',
+         'last_update': '2019-11-29T08:00:01+08:00', 'exchange_oid': 'huobip/btc.usdt-123',
+         'client_oid': 'huobip/btc.usdt-xxx', 'status': 'pending', 'version': 1}
+
+
+def build_tick(cls, i):
+    return cls(tm, 7505.4 + i, 100, [{'price': 7505, 'volume': 1}], [{'price': 7506, 'volume': 1}], 'huobip/btc.usdt')
+
+
+def build_candle(cls, i):
+    return cls(tm, 7500.1 + i, 7510.2, 7490.3, 7505.4, 12.5, 'huobip/btc.usdt', '1m', 93812.5)
+
+
+def build_zhubi(cls, i):
+    return cls(tm, tm, 'huobip/btc.usdt', 7505.4 + i, 0.5, 'b')
+
+
+def build_order(cls, i):
+    return cls('huobip/btc.usdt', 7500 + i, 'b', 1, 'huobip/demo', entrust_time=tm, status='pending')
+
+
+def measure(builder, cls, count):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    items = [builder(cls, i) for i in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(items) == count
+    return (after - before) / count
+
+
+def check_from_dict():
+    assert CompactCandle.from_dict(candle).close == Candle.from_dict(candle).close
+    assert CompactZhubi.from_dict(zhubi).price == Zhubi.from_dict(zhubi).price
+    assert CompactOrder.from_dict(order).exchange_oid == Order.from_dict(order).exchange_oid
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    check_from_dict()
+    print('{:<8} {:>12} {:>12} {:>8}'.format('model', 'dict B/obj', 'slots B/obj', 'saved'))
+    for name, builder, normal, compact in [('Tick', build_tick, Tick, CompactTick),
+                                           ('Candle', build_candle, Candle, CompactCandle),
+                                           ('Zhubi', build_zhubi, Zhubi, CompactZhubi),
+                                           ('Order', build_order, Order, CompactOrder)]:
+        a = measure(builder, normal, count)
+        b = measure(builder, compact, count)
+        print('{:<8} {:>12.1f} {:>12.1f} {:>7.1f}%'.format(name, a, b, (a - b) / a * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+对比 timeparse.parse_time 和 arrow.get 的解析耗时
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/parse_time.py [count]
+"""
+import sys
+import timeit
+
+import arrow
+
+from onetoken_sync.timeparse import parse_time
+
+SAMPLES = {
+    'iso ms +08:00': ['2019-11-29T08:00:{:02d}.{:03d}+08:00'.format(i // 1000 % 60, i % 1000) for i in range(5000)],
+    'iso us Z': ['2019-11-29T08:00:{:02d}.{:06d}Z'.format(i // 1000 % 60, i * 7 % 1000000) for i in range(5000)],
+    'epoch float': [1575014400 + i / 1000 for i in range(5000)],
+    'epoch ms': [1575014400000 + i for i in range(5000)],
+}
+
+
+def bench(func, values, count):
+    n = len(values)
+
+    def run():
+        for i in range(count):
+            func(values[i % n])
+
+    return min(timeit.repeat(run, number=1, repeat=3)) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('{:<16} {:>12} {:>12} {:>8}'.format('format', 'arrow us', 'fast us', 'speedup'))
+    for name, values in SAMPLES.items():
+        for v in values[:100]:
+            assert parse_time(v) == arrow.get(v).datetime
+        a = bench(lambda v: arrow.get(v).datetime, values, count)
+        b = bench(parse_time, values, count)
+        print('{:<16} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(name, a, b, a / b))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+断线之后恢复 1000 个订阅需要的时间，对比 逐个发送 和 合并成批量订阅帧
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/recovery.py [contracts] [batch]
+"""
+import logging
+import sys
+import time
+
+from onetoken_sync.config import Config
+from onetoken_sync.logger import log
+from onetoken_sync.mock_server import MockServer
+from onetoken_sync.quote import TickQuote
+
+
+def recover(n_contracts, batch):
+    Config.QUOTE_SUB_BATCH = batch
+    contracts = ['mock/c{}.usdt'.format(i) for i in range(n_contracts)]
+    with MockServer(max_batch=max(batch, 1)) as server:
+        q = TickQuote('bench')
+        q.ws_url = server.url('/api/v1/ws/tick?gzip=true')
+        q.subscribe_many(contracts, lambda t: None)
+        q.run()
+        assert server.wait_for(lambda: len(server.subscriptions) == n_contracts, 30), 'initial subscribe timeout'
+
+        def recovered():
+            conns = server.live_connections()
+            return len(conns) == 1 and len(conns[0].subscriptions) == n_contracts
+
+        start = time.time()
+        server.drop_all()
+        assert server.wait_for(recovered, 60), 'recovery timeout'
+        elapsed = time.time() - start
+        frames = server.live_connections()[0].frames_received
+        q.close()
+    return elapsed, frames
+
+
+def main():
+    n_contracts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    log.setLevel(logging.ERROR)
+    print('recover {} subscriptions'.format(n_contracts))
+    for b in (1, batch):
+        elapsed, frames = recover(n_contracts, b)
+        print('  batch={:<4} {:>8.1f} ms  {:>5} frames received after reconnect'.format(b, elapsed * 1000, frames))
+
+
+if __name__ == '__main__':
+    main()
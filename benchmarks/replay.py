@@ -0,0 +1,76 @@
+"""
+用 Replay 回放合成的 gzip tick 帧，测量 Quote 解析和分发的吞吐量
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/replay.py [frames] [contracts] [frames_dir]
+
+不指定 frames_dir 时在临时目录里生成数据，指定时直接回放 FrameRecorder 记录的真实数据
+"""
+import gzip
+import json
+import logging
+import random
+import shutil
+import sys
+import tempfile
+
+from onetoken_sync.logger import log
+from onetoken_sync.quote import TickQuote
+from onetoken_sync.recorder import FrameRecorder
+from onetoken_sync.replay import Replay
+
+
+def generate(path, n_frames, contracts):
+    recorder = FrameRecorder(path)
+    recorder.write(json.dumps({'uri': 'auth', 'message': 'Auth succeed.'}), 1, ts=1)
+    for i in range(n_frames):
+        mid = 100 + random.random()
+        tick = {'contract': contracts[i % len(contracts)], 'last': mid, 'volume': i,
+                'time': '2019-11-29T08:{:02d}:{:02d}.{:06d}+08:00'.format(i // 60000000 % 60, i // 1000000 % 60,
+                                                                           i % 1000000),
+                'bids': [{'price': mid - 0.01 * k, 'volume': random.random()} for k in range(1, 21)],
+                'asks': [{'price': mid + 0.01 * k, 'volume': random.random()} for k in range(1, 21)]}
+        recorder.write(gzip.compress(json.dumps({'uri': 'single-tick-verbose', 'data': tick}).encode()), 2,
+                       ts=2 + i * 1000)
+    recorder.close()
+
+
+def replay(path, contracts, lazy, read_fields):
+    q = TickQuote('bench', lazy=lazy)
+
+    def on_tick(tick):
+        if read_fields:
+            tick.bid1, tick.time
+
+    for c in contracts:
+        q.subscribe_tick(c, on_tick)
+    stats = Replay(q, path).run()
+    q.close()
+    return stats
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_contracts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    log.setLevel(logging.ERROR)
+    contracts = ['mock/c{}.usdt'.format(i) for i in range(n_contracts)]
+    generated = len(sys.argv) <= 3
+    if generated:
+        path = tempfile.mkdtemp()
+        generate(path, n_frames, contracts)
+    else:
+        path = sys.argv[3]
+    print('replay {}'.format(path))
+    for lazy in (False, True):
+        for read_fields in (False, True):
+            stats = replay(path, contracts, lazy, read_fields)
+            print('  lazy={:<5} read_fields={:<5} {:>8} frames  parse {:>9.0f} msg/s  with callbacks {:>9.0f} msg/s'
+                  .format(str(lazy), str(read_fields), stats['frames'], stats['msgs_per_sec'],
+                          stats['total_msgs_per_sec']))
+    if generated:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+每条推送找到订阅的开销：json.dumps(sort_keys=True) 拼字符串 key 和 直接拼 tuple key 的对比
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/routing.py [subscriptions] [messages]
+"""
+import json
+import sys
+import time
+
+from onetoken_sync.quote import Quote
+
+CHANNEL = 'subscribe-single-tick-verbose'
+
+
+def bench(name, make_key, table, contracts, n_msgs):
+    hit = 0
+    start = time.perf_counter()
+    for i in range(n_msgs):
+        if make_key(contracts[i % len(contracts)]) in table:
+            hit += 1
+    elapsed = time.perf_counter() - start
+    assert hit == n_msgs
+    print('  {:<12} {:>8.0f} ns/msg'.format(name, elapsed / n_msgs * 1e9))
+
+
+def main():
+    n_subs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_msgs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    # 推送里的 contract 每次都是新解析出来的字符串
+    contracts = [''.join(list('huobip/c{}.usdt'.format(i))) for i in range(n_subs)]
+    print('route {} messages over {} subscriptions'.format(n_msgs, n_subs))
+
+    json_table = {json.dumps({'uri': CHANNEL, 'contract': c}, sort_keys=True): None for c in contracts}
+    bench('json.dumps', lambda c: json.dumps({'contract': c, 'uri': CHANNEL}, sort_keys=True), json_table,
+          contracts, n_msgs)
+
+    tuple_table = {Quote.key_of({'uri': CHANNEL, 'contract': c}): None for c in contracts}
+    bench('tuple', lambda c: (CHANNEL, c), tuple_table, contracts, n_msgs)
+
+
+if __name__ == '__main__':
+    main()
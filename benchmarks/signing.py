@@ -0,0 +1,45 @@
+"""
+10k 次下单请求的签名和序列化开销：util.gen_sign 和 预先初始化 HMAC 的 util.Signer 的对比
+
+在仓库根目录运行(不需要安装 onetoken_sync):
+
+    PYTHONPATH=. python benchmarks/signing.py [calls]
+"""
+import sys
+import time
+
+from onetoken_sync import codec, util
+
+SECRET = 'a' * 48
+EXCHANGE, NAME = 'binance', 'test_user1'
+
+
+def with_gen_sign(orders):
+    for data in orders:
+        nonce = util.gen_nonce()
+        json_str = codec.dumps(data)
+        util.gen_sign(SECRET, 'POST', '/{}/{}{}'.format(EXCHANGE, NAME, '/orders'), nonce, json_str)
+
+
+def with_signer(orders):
+    signer = util.Signer(SECRET, '/{}/{}'.format(EXCHANGE, NAME))
+    for data in orders:
+        nonce = util.gen_nonce()
+        json_str = codec.dumps(data)
+        signer.sign('POST', '/orders', nonce, json_str)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    orders = [{'contract': 'binance/btc.usdt', 'price': 7000 + i * 0.01, 'bs': 'b', 'amount': 0.01,
+               'client_oid': util.rand_client_oid('binance/btc.usdt')} for i in range(n)]
+    print('sign {} orders, json codec {}'.format(n, codec.get_backend()))
+    for name, func in (('gen_sign', with_gen_sign), ('Signer', with_signer)):
+        start = time.perf_counter()
+        func(orders)
+        elapsed = time.perf_counter() - start
+        print('  {:<10} {:>8.2f} us/order  {:>8.1f} ms total'.format(name, elapsed / n * 1e6, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
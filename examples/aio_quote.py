@@ -0,0 +1,37 @@
+import asyncio
+
+from onetoken_sync.aio import AsyncTickQuote, AsyncTickV3Quote
+
+
+# 需要安装 aiohttp，python 3.6+
+
+async def stream_tick():
+    """
+    async for 接收 tick 示例
+    :return:
+    """
+    q = AsyncTickQuote()
+    async for tick in q.stream('huobip/btc.usdt'):
+        print(tick)
+
+
+async def stream_many():
+    """
+    一个 event loop 同时订阅多个合约，只保留最新的盘口 示例
+    :return:
+    """
+    q = AsyncTickV3Quote()
+
+    async def consume(contract):
+        async for tick in q.stream(contract, policy='latest'):
+            print(tick)
+
+    await asyncio.gather(*[consume(c) for c in ['huobip/btc.usdt', 'huobip/eth.usdt', 'binance/btc.usdt']])
+
+
+def main():
+    asyncio.get_event_loop().run_until_complete(stream_tick())
+
+
+if __name__ == '__main__':
+    main()
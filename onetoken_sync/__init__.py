@@ -1,8 +1,16 @@
 from .account import Account, Info
+from .aggregator import Aggregator
 from .account_ws import AccountWs
+from .ws_mux import AccountWsMux
+from .book import OrderBook, BookView, Level
+from .depth import Depth
+from .dispatch import ALL, LATEST, bounded
 from .config import Config
 from .logger import log, log_level
-from .model import Tick, Order, Candle, Zhubi
+from .model import Tick, LazyTick, Order, Candle, Zhubi, CompactTick, CompactOrder, CompactCandle, CompactZhubi
+from .order_store import OrderStore
+from .pool import TickQuotePool
+from .recorder import TickRecorder, ZhubiRecorder, Reader
 from .rpcutil import Error, HTTPError, Code, Const
 from .quote import Quote, get_client, subscribe_tick, get_v3_client, subscribe_tick_v3, get_candle_client, \
     subscribe_candle, get_zhubi_client, subscribe_zhubi, get_last_tick, get_contracts, get_contract
@@ -1,22 +1,28 @@
-import json
+import _thread as thread
+import threading
 import time
 from typing import Tuple, Union
 
 import requests
 
-from . import util
+from . import codec, util
+from .config import Config
 from .logger import log
 from .model import Info
 from .account_ws import AccountWs
+from .order_store import OrderStore
+from .ws_mux import get_account_ws_mux
 
 
 class Account:
-    def __init__(self, symbol: str, api_key: str = None, api_secret: str = None, session: requests.sessions = None):
+    def __init__(self, symbol: str, api_key: str = None, api_secret: str = None, session: requests.sessions = None,
+                 ws_mux=None):
         """
         Account初始化
         :param symbol: account symbol, binance/test_user1
         :param api_key: ot-key in 1token
         :param api_secret: ot-secret in 1token
+        :param ws_mux: AccountWsMux，多个账户的 websocket 共用一个线程；Config.ACCOUNT_WS_MUX 为 True 时默认使用共享的 mux
         """
         self.symbol = symbol
         if api_key is None and api_secret is None:
@@ -35,11 +41,23 @@ class Account:
         else:
             self.margin_contract = None
         self.host = util.get_trans_host(self.exchange)
+        self.signer = util.Signer(self.api_secret, '/{}/{}'.format(self.exchange, self.name))
         if session is None:
-            self.session = requests.session()
+            # 每个 Account 单独的 session，所有 Account 共享同一个连接池
+            self.session = util.get_transport().new_session()
         else:
             self.session = session
-        self._ws = AccountWs(self.symbol, self.api_key, self.api_secret)
+        if ws_mux is None and Config.ACCOUNT_WS_MUX:
+            ws_mux = get_account_ws_mux()
+        self._ws = AccountWs(self.symbol, self.api_key, self.api_secret, mux=ws_mux)
+        self.order_store = None
+        self._reconcile_stop = None
+        self._info = None
+        self._info_time = 0
+        self._info_lock = thread.allocate_lock()
+        self.info_hits = 0
+        self.info_misses = 0
+        self.info_pushes = 0
 
     def __str__(self):
         return '<{}>'.format(self.symbol)
@@ -64,9 +82,12 @@ class Account:
 
     def ws_close(self):
         """
-        关闭websocket
+        关闭websocket，同时停止 track_orders 的校对线程
         :return: None
         """
+        if self._reconcile_stop is not None:
+            self._reconcile_stop.set()
+            self._reconcile_stop = None
         self._ws.close()
 
     def ws_subscribe_info(self, handler, handler_name=None):
@@ -87,6 +108,71 @@ class Account:
         """
         self._ws.subscribe_orders(handler, handler_name)
 
+    def track_info(self):
+        """
+        用 websocket 的账户信息推送原地更新本地缓存，get_info 在缓存足够新时不再请求 REST
+        :return: None
+        """
+        self.ws_subscribe_info(self._on_info_push, 'info-cache')
+
+    def _on_info_push(self, info):
+        self._set_info(info.data, push=True)
+
+    def _set_info(self, data, push=False):
+        # 缓存是 Account 私有的 Info，原地更新；get_info 返回它的拷贝，推送给其他 handler 的 Info 也不会被修改
+        with self._info_lock:
+            if push:
+                self.info_pushes += 1
+            if self._info is None:
+                self._info = Info({})
+            self._info.update(data)
+            self._info_time = time.time()
+
+    @property
+    def info_age(self):
+        """
+        缓存的账户信息距离上一次更新的秒数，没有缓存时为 None
+        """
+        if self._info is None:
+            return None
+        return time.time() - self._info_time
+
+    def info_stats(self):
+        """
+        账户信息缓存的命中 / 未命中次数，收到的推送数量和缓存的时间
+        :return: dict
+        """
+        return {'hits': self.info_hits,
+                'misses': self.info_misses,
+                'pushes': self.info_pushes,
+                'age': self.info_age}
+
+    def track_orders(self, reconcile_interval=None):
+        """
+        用 websocket 的订单推送维护本地的订单，查询未完成订单不再需要 REST
+        :param reconcile_interval: 每隔多少秒用 REST 校对一次，None 表示不自动校对；ws_close 时停止
+        :return: OrderStore，重复调用返回同一个，校对线程也只有一个
+        """
+        if self.order_store is None:
+            self.order_store = OrderStore()
+        if 'order-store' not in self._ws.sub_queue.get('order', {}):
+            self.ws_subscribe_orders(self.order_store.update, 'order-store')
+        if reconcile_interval and self._reconcile_stop is None:
+            stop = self._reconcile_stop = threading.Event()
+            store = self.order_store
+
+            def run():
+                while not stop.wait(reconcile_interval):
+                    try:
+                        _, err = store.reconcile(self)
+                        if err:
+                            log.warning('reconcile orders failed', err)
+                    except:
+                        log.exception('reconcile orders failed')
+
+            thread.start_new_thread(run, ())
+        return self.order_store
+
     @property
     def trans_path(self):
         """
@@ -161,18 +247,32 @@ class Account:
         t = self.api_call('delete', '/orders/all', params=data)
         return t
 
-    def get_info(self, timeout=15) -> Tuple[Union[Info, None], Union[Exception, None]]:
+    def get_info(self, timeout=15, max_staleness=None) -> Tuple[Union[Info, None], Union[Exception, None]]:
         """
-        获取账户信息
+        获取账户信息，缓存不超过 max_staleness 秒时返回缓存的一份拷贝，否则请求 REST
+        max_staleness 为 0 时不使用缓存，和原来一样每次请求 REST
         :param timeout: 超时时间
+        :param max_staleness: 缓存的最长时间(秒)，默认为 Config.ACCOUNT_INFO_MAX_STALENESS，0 表示总是请求 REST
         :return: Info, Error
         """
-        y, err = self.api_call('get', '/info', timeout=timeout)
-        if err:
-            return None, err
-        if not isinstance(y, dict):
-            return None, ValueError('%s not dict' % y)
-        acc_info = Info(y)
+        if max_staleness is None:
+            max_staleness = Config.ACCOUNT_INFO_MAX_STALENESS
+        acc_info = None
+        with self._info_lock:
+            if max_staleness and self._info is not None and time.time() - self._info_time <= max_staleness:
+                self.info_hits += 1
+                acc_info = self._info.copy()
+            else:
+                self.info_misses += 1
+        if acc_info is None:
+            y, err = self.api_call('get', '/info', timeout=timeout)
+            if err:
+                return None, err
+            if not isinstance(y, dict):
+                return None, ValueError('%s not dict' % y)
+            if max_staleness:
+                self._set_info(y)
+            acc_info = Info(y)
         if self.margin_contract is not None:
             pos_symbol = self.margin_contract.split('/', 1)[-1]
             return acc_info.get_margin_acc_info(pos_symbol), None
@@ -250,6 +350,47 @@ class Account:
         log.debug(res)
         return res
 
+    @property
+    def executor(self):
+        """
+        批量下单 / 撤单使用的线程池，所有 Account 共享，最多 Config.ACCOUNT_HTTP_WORKERS 个请求同时进行
+        :return: ThreadPoolExecutor
+        """
+        return util.get_executor()
+
+    def _batch(self, func, args_list):
+        def call(args):
+            try:
+                return func(*args)
+            except Exception as e:
+                log.exception('batch call fail')
+                return None, e
+
+        if len(args_list) <= 1:
+            return [call(args) for args in args_list]
+        return list(self.executor.map(call, args_list))
+
+    def place_orders(self, orders):
+        """
+        并发下单，结果和 orders 的顺序一致
+        :param orders: [{'con': ..., 'price': ..., 'bs': ..., 'amount': ..., 'client_oid': ..., 'options': ...}, ...]
+        :return: [(dict, Error), ...]
+        """
+        log.debug('Place orders', len(orders))
+        return self._batch(lambda order: self.place_order(**order), [(order,) for order in orders])
+
+    def cancel_orders(self, client_oids=None, exchange_oids=None):
+        """
+        并发撤单，每个单号一个请求，结果和传入的顺序一致(先 client_oids 后 exchange_oids)
+        :param client_oids: [binance/btc.usdt-xxxxxxx, ...]
+        :param exchange_oids: [binance/btc.usdt-xxxxxxx, ...]
+        :return: [(dict, Error), ...]
+        """
+        args_list = [(self.cancel_use_client_oid, oid) for oid in client_oids or ()]
+        args_list += [(self.cancel_use_exchange_oid, oid) for oid in exchange_oids or ()]
+        log.debug('Cancel orders', len(args_list))
+        return self._batch(lambda func, oid: func(oid), args_list)
+
     def get_dealt_trans(self, con=None):
         """
         获取成交记录
@@ -286,16 +427,15 @@ class Account:
 
         nonce = util.gen_nonce()
         url = self.trans_path + endpoint
-        json_str = json.dumps(data) if data else ''
-        sign = util.gen_sign(self.api_secret, method, '/{}/{}{}'.format(self.exchange, self.name, endpoint), nonce,
-                             json_str)
+        json_str = codec.dumps(data) if data else ''
+        sign = self.signer.sign(method, endpoint, nonce, json_str)
         headers = {
             'Api-Nonce': str(nonce),
             'Api-Key': self.api_key,
             'Api-Signature': sign,
             'Content-Type': 'application/json'
         }
-        res, err = util.http_go(func, url=url, data=json_str, params=params, headers=headers, timeout=timeout)
+        res, err = util.http_go(func, url=url, data=json_str.encode(), params=params, headers=headers, timeout=timeout)
         if err:
             return None, err
         return res, None
@@ -1,9 +1,12 @@
+import json
 import logging
 import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 
 import pytest
 
-from . import Account
+from . import Account, HTTPError, OrderStore, util
 
 logging.basicConfig(level=logging.INFO)
 contract = 'binance/eos.usdt'
@@ -12,6 +15,8 @@ place_order_params = {'con': contract, 'price': 10, 'bs': 's', 'amount': 1}
 
 @pytest.fixture(scope='session')
 def acc():
+    if not util.load_ot_from_config_file()[2]:
+        pytest.skip('no ot_key / ot_secret in ~/.onetoken/config.yml')
     acc = Account(symbol='binance/otplay2')
     return acc
 
@@ -81,3 +86,92 @@ def test_order_use_exchange_oid(acc: Account):
     assert not err
     assert order[0]['exchange_oid'] == oid
     cancel_all(acc)
+
+
+def test_info_push_does_not_modify_handed_out_info():
+    acc = Account('binance/test', 'key', 'secret')
+    got = []
+    acc.track_info()
+    acc.ws_subscribe_info(got.append, 'keep')
+    for balance in (100, 200):
+        data = {'balance': balance, 'position': [{'contract': 'usdt', 'total_amount': balance}]}
+        acc.ws.on_message(json.dumps({'uri': 'info', 'data': data}))
+    assert [info.balance for info in got] == [100, 200]
+    assert got[0].get_total_amount('usdt') == 100
+    cached, err = acc.get_info(max_staleness=10)
+    assert not err and cached.balance == 200 and cached is not got[1]
+    position = acc._info.position_dict['usdt']
+    acc.ws.on_message(json.dumps({'uri': 'info', 'data': {'balance': 300, 'position': [
+        {'contract': 'usdt', 'total_amount': 300}, {'contract': 'btc', 'total_amount': 1}]}}))
+    assert acc._info.position_dict['usdt'] is position and position['total_amount'] == 300
+    assert cached.get_total_amount('usdt') == 200 and cached.get_total_amount('btc') == 0
+    assert acc.info_stats()['pushes'] == 3 and acc.info_stats()['hits'] == 1
+
+
+class OrderHandler(BaseHTTPRequestHandler):
+    """
+    下单的 price 决定响应时间(先发出的请求后返回)，price 小于 0 时返回 400
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code, js):
+        body = json.dumps(js).encode()
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        if data['price'] < 0:
+            self.reply(400, {'code': 'invalid-price', 'message': 'price < 0'})
+            return
+        time.sleep(data['price'] / 100)
+        self.reply(200, {'exchange_oid': 'e{}'.format(data['price'])})
+
+    def do_DELETE(self):
+        oid = parse_qs(urlparse(self.path).query)['exchange_oid'][0]
+        self.reply(200 if oid.startswith('e') else 400, [{'exchange_oid': oid}])
+
+
+def test_place_and_cancel_orders_offline(http_server):
+    acc = Account('binance/test', 'key', 'secret')
+    acc.host = http_server(OrderHandler) + '/binance'
+    prices = [10, 8, 6, -1, 4, 2]
+    orders = [dict(place_order_params, price=p) for p in prices]
+    orders.append({'con': contract})
+    res = acc.place_orders(orders)
+    assert len(res) == len(orders)
+    for p, (r, err) in zip(prices, res):
+        if p < 0:
+            assert r is None and isinstance(err, HTTPError)
+        else:
+            assert err is None and r['exchange_oid'] == 'e{}'.format(p)
+    assert res[-1][0] is None and isinstance(res[-1][1], TypeError)
+    res = acc.cancel_orders(exchange_oids=['e10', 'x1', 'e8'])
+    assert [err is None for _, err in res] == [True, False, True]
+    assert res[2][0] == [{'exchange_oid': 'e8'}]
+    other = Account('binance/test2', 'key', 'secret')
+    assert acc.executor is other.executor
+    assert acc.session is not other.session
+    assert acc.session.get_adapter(acc.host) is other.session.get_adapter(acc.host)
+
+
+def test_track_orders_single_reconcile_thread(monkeypatch):
+    calls = []
+    monkeypatch.setattr(OrderStore, 'reconcile', lambda store, acc, contract=None: calls.append(1) or (0, None))
+    acc = Account('binance/test', 'key', 'secret')
+    store = acc.track_orders(reconcile_interval=0.05)
+    stop = acc._reconcile_stop
+    assert acc.track_orders(reconcile_interval=0.05) is store and acc._reconcile_stop is stop
+    time.sleep(0.32)
+    assert 1 <= len(calls) <= 6
+    acc.ws_close()
+    time.sleep(0.1)
+    n = len(calls)
+    time.sleep(0.2)
+    assert len(calls) == n
+    assert acc.track_orders() is store and 'order-store' in acc.ws.sub_queue['order']
@@ -1,15 +1,38 @@
 import _thread as thread
-import json
+import collections
+import random
+import socket
+import threading
 import time
 from datetime import datetime
 
 import websocket
 
-from . import util
+from . import codec, util
+from .config import Config
 from .logger import log
 from .model import Info
 
 
+class Backoff:
+    """
+    带随机抖动的指数退避，第 n 次的等待时间在 [d/2, d] 之间，d = min(maximum, minimum * 2 ** n)
+    """
+
+    def __init__(self, minimum=None, maximum=None):
+        self.minimum = Config.ACCOUNT_WS_BACKOFF_MIN if minimum is None else minimum
+        self.maximum = Config.ACCOUNT_WS_BACKOFF_MAX if maximum is None else maximum
+        self.attempts = 0
+
+    def next(self):
+        d = min(self.maximum, self.minimum * 2 ** self.attempts)
+        self.attempts += 1
+        return d / 2 + random.uniform(0, d / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
 class AccountWs:
     IDLE = 'idle'
     GOING_TO_CONNECT = 'going-to-connect'
@@ -17,12 +40,16 @@ class AccountWs:
     READY = 'ready'
     GOING_TO_DICCONNECT = 'going-to-disconnect'
 
-    def __init__(self, symbol: str, api_key: str = None, api_secret: str = None):
+    def __init__(self, symbol: str, api_key: str = None, api_secret: str = None, ping_interval=None,
+                 ping_timeout=None, mux=None):
         """
         websocket 初始化
         :param symbol:
         :param api_key:
         :param api_secret:
+        :param ping_interval: 心跳间隔(秒)，默认 Config.ACCOUNT_WS_PING_INTERVAL
+        :param ping_timeout: 发出 ping 之后多久没有收到 pong 认为连接已经断开，默认 Config.ACCOUNT_WS_PING_TIMEOUT
+        :param mux: AccountWsMux，设置之后连接、心跳和重连都由 mux 的线程负责，不再单独启动线程
         """
         self.symbol = symbol
         if api_key is None and api_secret is None:
@@ -39,8 +66,21 @@ class AccountWs:
         self.ws = None  # type: (websocket.WebSocketApp, None)
         self.ws_state = self.IDLE
         self.ws_support = True
+        self.mux = mux
         self.last_pong = 0
         self.sub_queue = {}
+        self.ping_interval = ping_interval or Config.ACCOUNT_WS_PING_INTERVAL
+        self.ping_timeout = ping_timeout or Config.ACCOUNT_WS_PING_TIMEOUT
+        self.backoff = Backoff()
+        self._pong = threading.Event()
+        self._wake = threading.Event()
+        self._closed = None  # 当前连接关闭时 set
+        self._was_ready = False
+        self.connected_at = None
+        self.disconnected_at = None
+        self.reconnects = 0
+        self.heartbeat_lost = 0
+        self.reconnect_latency = collections.deque(maxlen=100)
 
     def set_ws_state(self, new, reason=''):
         """
@@ -52,36 +92,41 @@ class AccountWs:
         log.info('set ws state from %s to %s' % (self.ws_state, new), reason)
         self.ws_state = new
 
-    def keep_connection(self):
+    def heartbeat(self, ws, closed):
         """
-        发送心跳包，保持连接
-        :return:
+        每 ping_interval 秒发送一次 ping，ping_timeout 秒内没有收到 pong 就关闭连接，由 run 的循环马上重连
+        :param ws: 当前连接
+        :param closed: 当前连接关闭时 set 的 Event
+        :return: None
         """
-        def run():
-            while self.is_running:
-                if not self.ws_support:
-                    break
-                if self.ws_state == self.GOING_TO_CONNECT:
-                    self.ws_connect()
-                elif self.ws_state == self.READY:
-                    try:
-                        while self.ws.keep_running:
-                            ping = datetime.now().timestamp()
-                            self.send_json({'uri': 'ping', 'uuid': ping})
-                            time.sleep(10)
-                            if self.last_pong < ping:
-                                log.warning('ws connection heartbeat lost')
-                                break
-                    except:
-                        log.exception('ws connection ping failed')
-                    finally:
-                        if self.is_running:
-                            self.set_ws_state(self.GOING_TO_CONNECT, 'heartbeat lost')
-                elif self.ws_state == self.GOING_TO_DICCONNECT:
-                    self.ws.close()
-                time.sleep(1)
+        while not closed.is_set() and self.is_running:
+            ping = datetime.now().timestamp()
+            self._pong.clear()
+            try:
+                ws.send(codec.dumps({'uri': 'ping', 'uuid': ping}))
+            except:
+                log.exception('ws connection ping failed')
+                break
+            if not self._pong.wait(self.ping_timeout):
+                if not closed.is_set():
+                    log.warning('ws connection heartbeat lost')
+                    self.heartbeat_lost += 1
+                    self._shutdown(ws)
+                break
+            closed.wait(max(self.ping_interval - (datetime.now().timestamp() - ping), 0))
 
-        thread.start_new_thread(run, ())
+    @staticmethod
+    def _shutdown(ws):
+        # 在其他线程里 close 只会关掉 fd，不能唤醒正在 select 这个 socket 的 run_forever，
+        # shutdown 之后 run_forever 读到 EOF，按正常的断线流程退出并重连
+        sock = getattr(ws.sock, 'sock', None)
+        if sock is None:
+            ws.close()
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            ws.close()
 
     @property
     def ws_path(self):
@@ -91,29 +136,34 @@ class AccountWs:
         """
         return self.host_ws
 
+    def ws_headers(self):
+        """
+        建立连接用的签名 header，每次重连都重新签名
+        :return: dict
+        """
+        nonce = util.gen_nonce()
+        sign = util.gen_sign(self.api_secret, 'GET', '/ws/' + self.account, nonce, None)
+        return {'Api-Nonce': str(nonce), 'Api-Key': self.api_key, 'Api-Signature': sign}
+
     def ws_connect(self):
         """
-        连接 websocket
+        创建 websocket 连接
         :return: None
         """
         self.set_ws_state(self.CONNECTING)
-        nonce = util.gen_nonce()
-        sign = util.gen_sign(self.api_secret, 'GET', '/ws/' + self.account, nonce, None)
-        headers = {'Api-Nonce': str(nonce), 'Api-Key': self.api_key, 'Api-Signature': sign}
         url = self.ws_path
         try:
+            # websocket-client 0.x 调用 bound method 时不传 ws，1.x 总是传 ws，这里统一成不传
             self.ws = websocket.WebSocketApp(url,
-                                             header=headers,
-                                             on_message=self.on_message,
-                                             on_error=self.on_error,
-                                             on_close=self.on_close)
-
+                                             header=self.ws_headers(),
+                                             on_open=lambda ws: self.on_open(ws),
+                                             on_message=lambda ws, message: self.on_message(message),
+                                             on_error=lambda ws, error: self.on_error(error),
+                                             on_close=lambda ws, *args: self.on_close())
         except:
+            self.ws = None
             self.set_ws_state(self.GOING_TO_CONNECT, 'ws connect failed')
             log.exception('ws connect failed')
-            time.sleep(5)
-        else:
-            log.info('ws connected.')
 
     def send_message(self, message):
         """
@@ -129,7 +179,7 @@ class AccountWs:
         :param js: dict
         :return: None
         """
-        self.ws.send(json.dumps(js))
+        self.ws.send(codec.dumps(js))
 
     def on_message(self, message):
         """
@@ -138,7 +188,7 @@ class AccountWs:
         :return: None
         """
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             log.debug(data)
             if 'uri' not in data:
                 if 'code' in data:
@@ -152,14 +202,14 @@ class AccountWs:
             action = data['uri']
             if action == 'pong':
                 self.last_pong = datetime.now().timestamp()
+                self._pong.set()
                 return
             if action in ['connection', 'status']:
                 if data.get('code', data.get('status', None)) in ['ok', 'connected']:
-                    self.set_ws_state(self.READY, 'Connected and auth passed.')
-                    for key in self.sub_queue.keys():
-                        self.send_json({'uri': 'sub-{}'.format(key)})
+                    self.on_ready()
                 else:
                     self.set_ws_state(self.GOING_TO_CONNECT, data['message'])
+                    self.ws.close()
             elif action == 'info':
                 if data.get('status', 'ok') == 'ok':
                     if 'info' not in self.sub_queue:
@@ -233,40 +283,94 @@ class AccountWs:
         elif self.ws_state == self.IDLE:
             self.set_ws_state(self.GOING_TO_CONNECT, 'user sub order')
 
+    def on_open(self, ws):
+        """
+        websocket 建立的回调，启动这个连接的心跳
+        :param ws:
+        :return: None
+        """
+        self.connected_at = time.time()
+        self._closed = threading.Event()
+        thread.start_new_thread(self.heartbeat, (ws, self._closed))
+
+    def on_ready(self):
+        """
+        认证通过，重新发送所有订阅，并记录从断开到重新可用的耗时
+        :return: None
+        """
+        self.set_ws_state(self.READY, 'Connected and auth passed.')
+        self._was_ready = True
+        self.backoff.reset()
+        if self.disconnected_at is not None:
+            self.reconnects += 1
+            self.reconnect_latency.append(time.time() - self.disconnected_at)
+            self.disconnected_at = None
+        for key in self.sub_queue.keys():
+            self.send_json({'uri': 'sub-{}'.format(key)})
+
     @staticmethod
-    def on_error(ws, error):
+    def on_error(error):
         """
         websocket 发生错误的回调
-        :param ws:
         :param error:
         :return: None
         """
         log.exception(error)
 
-    @staticmethod
-    def on_close(ws):
+    def on_close(self):
         """
         websocket 关闭的回调
-        :param ws:
         :return: None
         """
+        if self._closed is not None:
+            self._closed.set()
+        if self.disconnected_at is None:
+            self.disconnected_at = time.time()
         log.info("### websocket closed ###")
 
+    def reconnect_stats(self):
+        """
+        断线重连的统计，latency 为从连接断开到重新认证通过的秒数
+        :return: dict
+        """
+        latency = list(self.reconnect_latency)
+        return {'state': self.ws_state,
+                'reconnects': self.reconnects,
+                'heartbeat_lost': self.heartbeat_lost,
+                'last_latency': latency[-1] if latency else None,
+                'avg_latency': sum(latency) / len(latency) if latency else None,
+                'max_latency': max(latency) if latency else None,
+                'backoff_attempts': self.backoff.attempts}
+
     def run(self) -> None:
         """
-        运行 websocket
+        运行 websocket，连接断开之后马上重连；连续失败时按照带抖动的指数退避等待
         :return: None
         """
         def _run():
-            while self.is_running:
-                if self.ws:
-                    self.ws.on_open = self.keep_connection
+            while self.is_running and self.ws_support:
+                self._was_ready = False
+                self.ws_connect()
+                if self.ws is not None:
                     self.ws.run_forever()
-                else:
-                    self.ws_connect()
+                if not self.is_running or not self.ws_support:
+                    break
+                if self.disconnected_at is None:
+                    self.disconnected_at = time.time()
+                self.set_ws_state(self.GOING_TO_CONNECT, 'connection closed')
+                # 认证通过过的连接断开时马上重连，连续失败才退避
+                if self._was_ready:
+                    continue
+                delay = self.backoff.next()
+                log.info('reconnect in {:.2f} seconds'.format(delay))
+                self._wake.wait(delay)
+                self._wake.clear()
 
         if self.is_running:
             log.warning('ws is already running')
+        elif self.mux is not None:
+            self.is_running = True
+            self.mux.add(self)
         else:
             self.is_running = True
             thread.start_new_thread(_run, ())
@@ -277,7 +381,11 @@ class AccountWs:
         :return: None
         """
         self.is_running = False
-        self.ws.close()
+        self._wake.set()
+        if self.mux is not None:
+            self.mux.remove(self)
+        if self.ws:
+            self.ws.close()
         self.ws = None  # type: (websocket.WebSocketApp, None)
         self.ws_state = self.IDLE
         self.last_pong = 0
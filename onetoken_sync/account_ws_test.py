@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from .account_ws import AccountWs, Backoff
+from .mock_server import MockServer
+
+
+@pytest.fixture
+def ws(server, account_ws):
+    return account_ws(server, ping_interval=0.2, ping_timeout=0.2)
+
+
+def test_subscribe_and_push(server, ws):
+    got = []
+    received = threading.Event()
+
+    def on_order(order):
+        got.append(order)
+        received.set()
+
+    ws.run()
+    assert server.wait_for(lambda: ws.ws_state == AccountWs.READY)
+    ws.subscribe_orders(on_order)
+    assert server.wait_for(lambda: server.subscriptions == [{'uri': 'sub-order'}])
+    server.push({'uri': 'order', 'data': [{'exchange_oid': 'e1', 'status': 'pending'}]})
+    assert received.wait(5)
+    assert got[0]['exchange_oid'] == 'e1'
+
+
+def test_reconnect_immediately(server, ws):
+    ws.subscribe_info(lambda info: None)
+    ws.subscribe_orders(lambda order: None)
+    ws.run()
+    assert server.wait_for(lambda: len(server.subscriptions) == 2)
+    server.drop_all()
+    assert server.wait_for(lambda: len(server.subscriptions) == 4)
+    stats = ws.reconnect_stats()
+    assert stats['reconnects'] == 1
+    assert stats['last_latency'] < 1
+    assert stats['backoff_attempts'] == 0
+
+
+def test_heartbeat_lost(account_ws):
+    with MockServer(respond_pong=False) as server:
+        ws = account_ws(server, ping_interval=0.2, ping_timeout=0.2)
+        ws.run()
+        assert server.wait_for(lambda: ws.reconnects >= 1)
+        assert ws.heartbeat_lost >= 1
+
+
+def test_backoff():
+    backoff = Backoff(1, 8)
+    delays = [backoff.next() for _ in range(6)]
+    for d, upper in zip(delays, [1, 2, 4, 8, 8, 8]):
+        assert upper / 2 <= d <= upper
+    backoff.reset()
+    assert backoff.next() <= 1
@@ -0,0 +1,191 @@
+"""
+用逐笔成交或者 tick 在本地合成 K 线，支持任意时间周期、成交量 K 线和成交额 K 线
+
+    agg = Aggregator('7m', on_candle)
+    quote.subscribe_zhubi('huobip/btc.usdt', agg)     # 逐笔成交
+    quote.subscribe_tick('huobip/btc.usdt', agg)      # tick 用相邻两条的成交量之差作为成交量
+
+duration 的格式:
+    3s / 7m / 1h / 1d    时间 K 线，按 UTC 对齐
+    vol:100              每成交 100 个合成一根
+    dollar:1000000       每成交 1000000 计价货币合成一根
+
+一笔成交不会被拆分到两根 K 线里，成交量 / 成交额 K 线在累计值跨过 size 的整数倍时结束
+"""
+import re
+
+from .model import Candle
+from .timeparse import to_us, from_us
+
+TIME = 'time'
+VOLUME = 'vol'
+DOLLAR = 'dollar'
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(duration):
+    """
+    :param duration: 3s / 7m / 1h / 1d / vol:100 / dollar:1000000
+    :return: (kind, size)，时间 K 线的 size 为微秒
+    """
+    m = re.match(r'^(\d+)([smhd])$', duration)
+    if m:
+        return TIME, int(m.group(1)) * _UNITS[m.group(2)] * 1000000
+    if ':' in duration:
+        kind, size = duration.split(':', 1)
+        if kind in (VOLUME, DOLLAR) and float(size) > 0:
+            return kind, float(size)
+    raise ValueError('unknown duration {}, should be like 3s/7m/1h/1d/vol:100/dollar:1000000'.format(duration))
+
+
+class _Bar:
+    __slots__ = ('index', 'time', 'open', 'high', 'low', 'close', 'volume', 'amount')
+
+    def __init__(self, index, time, price):
+        self.index = index
+        self.time = time
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.volume = 0.0
+        self.amount = 0.0
+
+
+class Aggregator:
+    """
+    可以直接作为 subscribe_zhubi / subscribe_tick / subscribe_tick_v3 的回调，每个 contract 单独维护当前的 K 线
+    K 线结束时调用 on_update(candle)，和 subscribe_candle 的回调一致
+    """
+
+    def __init__(self, duration, on_update):
+        """
+        :param duration: 3s / 7m / 1h / 1d / vol:100 / dollar:1000000
+        :param on_update: K 线结束时的回调
+        """
+        self.duration = duration
+        self.kind, self.size = parse_duration(duration)
+        self.on_update = on_update
+        self.bars = {}  # contract -> 当前的 _Bar
+        self.cum = {}  # contract -> 累计成交量 / 成交额
+        self.tick_volume = {}  # contract -> 上一条 tick 的累计成交量
+
+    def __call__(self, data):
+        if isinstance(data, list):
+            for zhubi in data:
+                self.add_trade(zhubi.contract, zhubi.time, zhubi.price, zhubi.amount)
+        else:
+            self.add_tick(data)
+
+    def add_tick(self, tick):
+        """
+        tick 的 volume 是累计成交量，和上一条的差值作为这段时间的成交量，第一条 tick 只记录基准
+        """
+        last = self.tick_volume.get(tick.contract)
+        self.tick_volume[tick.contract] = tick.volume
+        if last is None:
+            return
+        # 累计成交量被重置时只更新基准
+        volume = tick.volume - last if tick.volume >= last else 0.0
+        self.add_trade(tick.contract, tick.time, tick.price, volume)
+
+    def add_trade(self, contract, time, price, volume):
+        """
+        :param contract: 交易对
+        :param time: 成交时间 datetime
+        :param price: 成交价
+        :param volume: 成交量
+        """
+        if self.kind == TIME:
+            ts = to_us(time)
+            index = ts // self.size
+        else:
+            before = self.cum.get(contract, 0.0)
+            index = int(before // self.size)
+            self.cum[contract] = before + (volume if self.kind == VOLUME else price * volume)
+        bar = self.bars.get(contract)
+        if bar is not None and index != bar.index:
+            # 乱序到达的上一周期成交直接并入当前 K 线
+            if index < bar.index:
+                index = bar.index
+            else:
+                self._emit(contract, bar)
+                bar = None
+        if bar is None:
+            start = from_us(index * self.size) if self.kind == TIME else time
+            bar = _Bar(index, start, price)
+            self.bars[contract] = bar
+        if price > bar.high:
+            bar.high = price
+        if price < bar.low:
+            bar.low = price
+        bar.close = price
+        bar.volume += volume
+        bar.amount += price * volume
+        if self.kind != TIME and self.cum[contract] >= (bar.index + 1) * self.size:
+            self._emit(contract, bar)
+
+    def _emit(self, contract, bar):
+        del self.bars[contract]
+        self.on_update(Candle.from_datetime(bar.time, bar.open, bar.high, bar.low, bar.close, bar.volume, contract,
+                                            self.duration, bar.amount))
+
+    def flush(self, now=None):
+        """
+        没有新的成交时时间 K 线不会自动结束，定时调用 flush 结束已经到期的 K 线
+        :param now: 当前时间 datetime，None 表示结束所有 contract 当前的 K 线
+        :return: 结束的 K 线数量
+        """
+        n = 0
+        ts = to_us(now) if now is not None else None
+        for contract, bar in list(self.bars.items()):
+            if ts is None or (self.kind == TIME and ts >= (bar.index + 1) * self.size):
+                self._emit(contract, bar)
+                n += 1
+        return n
+
+
+def aggregate(time, price, volume, duration):
+    """
+    历史数据的批量合成，和 Aggregator 的结果一致(最后一根没有结束的 K 线也会返回)，需要安装 numpy
+    :param time: 微秒时间戳数组(例如 recorder.Reader.read 返回的 time)，按时间排序
+    :param price: 成交价数组
+    :param volume: 成交量数组
+    :param duration: 3s / 7m / 1h / 1d / vol:100 / dollar:1000000
+    :return: {'time', 'open', 'high', 'low', 'close', 'volume', 'amount'} 的 numpy 数组，time 为微秒时间戳
+    """
+    import numpy as np
+    kind, size = parse_duration(duration)
+    time = np.asarray(time, dtype=np.int64)
+    price = np.asarray(price, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    turnover = price * volume
+    if not len(time):
+        return {k: np.empty(0) for k in ('time', 'open', 'high', 'low', 'close', 'volume', 'amount')}
+    if kind == TIME:
+        index = time // size
+    else:
+        cum = np.cumsum(volume if kind == VOLUME else turnover)
+        before = cum - (volume if kind == VOLUME else turnover)
+        index = (before // size).astype(np.int64)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(index)) + 1])
+    ends = np.concatenate([starts[1:], [len(time)]])
+    return {'time': index[starts] * size if kind == TIME else time[starts],
+            'open': price[starts],
+            'high': np.maximum.reduceat(price, starts),
+            'low': np.minimum.reduceat(price, starts),
+            'close': price[ends - 1],
+            'volume': np.add.reduceat(volume, starts),
+            'amount': np.add.reduceat(turnover, starts)}
+
+
+def to_candles(arrays, contract, duration):
+    """
+    :param arrays: aggregate 的返回值
+    :return: [Candle, ...]
+    """
+    keys = ('time', 'open', 'high', 'low', 'close', 'volume', 'amount')
+    columns = [arrays[k].tolist() for k in keys]
+    return [Candle.from_datetime(from_us(t), o, h, l, c, v, contract, duration, a)
+            for t, o, h, l, c, v, a in zip(*columns)]
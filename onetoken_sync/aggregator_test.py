@@ -0,0 +1,65 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from .aggregator import Aggregator, aggregate, to_candles, parse_duration
+from .model import Tick, Zhubi
+from .timeparse import parse_time, to_us
+
+contract = 'huobip/btc.usdt'
+t0 = parse_time('2019-11-29T08:00:00+08:00')
+
+
+def trades(n, seed=1):
+    rnd = random.Random(seed)
+    return [Zhubi(t0 + timedelta(milliseconds=i * 700), None, contract, 100 + rnd.random(), rnd.random() * 3, 'b')
+            for i in range(n)]
+
+
+def test_parse_duration():
+    assert parse_duration('7m') == ('time', 420 * 10 ** 6)
+    assert parse_duration('vol:100') == ('vol', 100)
+    with pytest.raises(ValueError):
+        parse_duration('7x')
+
+
+def test_time_bars():
+    got = []
+    agg = Aggregator('3s', got.append)
+    agg(trades(10))
+    # 0.0 ~ 6.3s 的成交，前两根已经结束
+    assert [c.time for c in got] == [t0, t0 + timedelta(seconds=3)]
+    assert got[0].volume == pytest.approx(sum(z.amount for z in trades(10)[:5]))
+    assert got[0].high == max(z.price for z in trades(10)[:5])
+    assert agg.flush(t0 + timedelta(seconds=8)) == 0
+    assert agg.flush(t0 + timedelta(seconds=9)) == 1
+    assert got[-1].close == trades(10)[-1].price and got[-1].duration == '3s'
+
+
+def test_tick_volume_delta():
+    got = []
+    agg = Aggregator('vol:5', got.append)
+    for i, volume in enumerate([100, 102, 104, 107, 3, 10]):
+        agg(Tick(t0 + timedelta(seconds=i), 100 + i, volume, contract=contract))
+    # 累计成交量从 107 重置为 3 的那条 tick 成交量记为 0
+    assert [c.volume for c in got] == [7, 7]
+    assert (got[0].open, got[0].close) == (101, 103)
+    assert (got[1].open, got[1].close) == (104, 105)
+
+
+@pytest.mark.parametrize('duration', ['3s', '1m', 'vol:5', 'dollar:700'])
+def test_batch_matches_streaming(duration):
+    np = pytest.importorskip('numpy')
+    data = trades(200)
+    got = []
+    agg = Aggregator(duration, got.append)
+    agg(data)
+    agg.flush()
+    arrays = aggregate(np.array([to_us(z.time) for z in data]), [z.price for z in data], [z.amount for z in data],
+                       duration)
+    batch = to_candles(arrays, contract, duration)
+    assert len(batch) == len(got)
+    for a, b in zip(batch, got):
+        assert (a.time, a.open, a.high, a.low, a.close) == (b.time, b.open, b.high, b.low, b.close)
+        assert a.volume == pytest.approx(b.volume) and a.amount == pytest.approx(b.amount)
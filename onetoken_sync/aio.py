@@ -0,0 +1,460 @@
+"""
+基于 asyncio 的行情和账户 websocket 客户端，一个 event loop 可以处理大量订阅
+
+    async def main():
+        q = AsyncTickQuote()
+        async for tick in q.stream('huobip/btc.usdt'):
+            print(tick)
+
+需要安装 aiohttp，python 3.6+
+"""
+import asyncio
+import collections
+import time
+from datetime import datetime
+
+from . import codec, util
+from .account_ws import Backoff
+from .config import Config
+from .dispatch import ALL, policy_size
+from .logger import log
+from .model import Info, Tick, LazyTick
+from .quote import Quote, TickQuote, TickV3Quote, CandleQuote, ZhubiQuote
+
+
+class Stream:
+    """
+    一个 async for 的消费者，按照 policy 缓存还没有被取走的数据
+    """
+
+    def __init__(self, policy=ALL):
+        self.maxlen = policy_size(policy)
+        self.pending = collections.deque()
+        self.waiter = None
+        self.dropped = 0
+
+    def put(self, item):
+        if self.maxlen is not None and len(self.pending) >= self.maxlen:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(item)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self):
+        while not self.pending:
+            self.waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.pending.popleft()
+
+
+class _AsyncWs:
+    """
+    websocket 连接的公共部分：断线重连、心跳和收发消息
+    """
+    PING_INTERVAL = 5
+    PONG_TIMEOUT = 20
+
+    def __init__(self, ws_url):
+        self.ws_url = ws_url
+        self.ws = None
+        self.session = None
+        self.task = None
+        self.is_running = False
+        self.last_pong = 0
+        self.decoder = codec.GzipDecoder()
+        self.backoff = Backoff(1, 64)
+        self._was_ready = False
+
+    def ws_headers(self):
+        return None
+
+    async def send_json(self, js):
+        """
+        通过 websocket 发送json
+        :param js: dict
+        :return: None
+        """
+        await self.ws.send_str(codec.dumps(js))
+
+    async def on_connected(self):
+        pass
+
+    def on_disconnected(self):
+        pass
+
+    def on_message(self, data):
+        log.info('receive message %s' % data)
+
+    def ping_message(self):
+        return {'uri': 'ping'}
+
+    async def heart_beat_loop(self, ws):
+        while not ws.closed:
+            if time.time() - self.last_pong > self.PONG_TIMEOUT:
+                log.warning('connection heart beat lost', self.ws_url)
+                await ws.close()
+                break
+            try:
+                await ws.send_str(codec.dumps(self.ping_message()))
+            except Exception as e:
+                log.warning('send ping failed', e)
+            await asyncio.sleep(self.PING_INTERVAL)
+
+    async def _run(self):
+        import aiohttp
+        self.session = aiohttp.ClientSession()
+        try:
+            while self.is_running:
+                self._was_ready = False
+                try:
+                    self.ws = await self.session.ws_connect(self.ws_url, headers=self.ws_headers(), autoping=True)
+                except Exception as e:
+                    log.warning('try connect to %s failed' % self.ws_url, e)
+                else:
+                    await self._serve()
+                if not self.is_running:
+                    break
+                # 认证通过过的连接断开时马上重连，连续失败才退避
+                if self._was_ready:
+                    continue
+                delay = self.backoff.next()
+                log.info('reconnect in {:.2f} seconds'.format(delay))
+                await asyncio.sleep(delay)
+        finally:
+            await self.session.close()
+            self.session = None
+
+    async def _serve(self):
+        import aiohttp
+        self.last_pong = time.time()
+        heart_beat = asyncio.ensure_future(self.heart_beat_loop(self.ws))
+        try:
+            await self.on_connected()
+            async for msg in self.ws:
+                if msg.type not in (aiohttp.WSMsgType.BINARY, aiohttp.WSMsgType.TEXT):
+                    break
+                try:
+                    if msg.type == aiohttp.WSMsgType.BINARY:
+                        data = self.decoder.loads(msg.data)
+                    else:
+                        data = codec.loads(msg.data)
+                    self.on_message(data)
+                except Exception as e:
+                    log.warning('msg error...', e)
+        except Exception as e:
+            log.warning('ws connection error', e)
+        finally:
+            heart_beat.cancel()
+            self.on_disconnected()
+            log.info('### websocket closed ###')
+
+    def run(self):
+        """
+        在当前 event loop 里开始运行，断线会自动重连
+        :return: asyncio.Task
+        """
+        if self.is_running:
+            log.warning('ws is already running')
+        else:
+            self.is_running = True
+            self.task = asyncio.ensure_future(self._run())
+        return self.task
+
+    async def close(self):
+        """
+        关闭 websocket
+        :return: None
+        """
+        self.is_running = False
+        if self.ws is not None:
+            await self.ws.close()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.ws = None
+
+
+class AsyncQuote(_AsyncWs):
+    def __init__(self, key, ws_url, data_parser):
+        super().__init__(ws_url)
+        self.key = key
+        self.data_parser = data_parser
+        self.queue_handlers = collections.defaultdict(list)
+        self.streams = collections.defaultdict(list)
+        self.data_queue = {}  # q_key -> sub_data
+        self.authorized = asyncio.Event()
+
+    async def on_connected(self):
+        await self.send_json({'uri': 'auth'})
+
+    def on_disconnected(self):
+        self.authorized.clear()
+
+    def on_message(self, data):
+        uri = data.get('uri', 'data')
+        if uri == 'pong':
+            self.last_pong = time.time()
+        elif uri == 'auth':
+            log.info(data)
+            self._was_ready = True
+            self.backoff.reset()
+            self.authorized.set()
+            q_keys = list(self.data_queue.keys())
+            if q_keys:
+                log.info('recover subscriptions', q_keys)
+            for q_key in q_keys:
+                asyncio.ensure_future(self.send_json(self.data_queue[q_key]))
+        elif uri in ('subscribe-single-tick-verbose', 'subscribe-single-zhubi-verbose', 'subscribe-single-candle'):
+            log.info(data)
+        else:
+            q_key, parsed_data = self.data_parser(data)
+            if q_key is None:
+                log.warning('unknown message', data)
+                return
+            if q_key not in self.data_queue:
+                return
+            for s in self.streams.get(q_key, ()):
+                s.put(parsed_data)
+            for callback in self.queue_handlers.get(q_key, ()):
+                try:
+                    r = callback(parsed_data)
+                    if asyncio.iscoroutine(r):
+                        asyncio.ensure_future(r)
+                except:
+                    log.exception('quote callback fail')
+
+    async def subscribe_data(self, uri, on_update=None, **kwargs):
+        """
+        订阅数据，没有连接或者还没有认证时会在认证成功之后发送
+        :param uri: 订阅的频道
+        :param on_update: 回调函数，可以是 async 函数
+        :param kwargs: 订阅参数，例如 contract
+        :return: q_key
+        """
+        sub_data = {'uri': uri}
+        sub_data.update(kwargs)
+        q_key = Quote.key_of(sub_data)
+        if on_update:
+            self.queue_handlers[q_key].append(on_update)
+        if q_key not in self.data_queue:
+            self.data_queue[q_key] = sub_data
+            log.info('subscribe', uri, **kwargs)
+            if self.authorized.is_set():
+                await self.send_json(sub_data)
+        if not self.is_running:
+            self.run()
+        return q_key
+
+    async def stream_data(self, uri, policy=ALL, **kwargs):
+        s = Stream(policy)
+        q_key = await self.subscribe_data(uri, **kwargs)
+        self.streams[q_key].append(s)
+        try:
+            while True:
+                yield await s.get()
+        finally:
+            self.streams[q_key].remove(s)
+
+
+class AsyncTickQuote(AsyncQuote):
+    parse_tick = TickQuote.parse_tick
+    tick_class = Tick
+
+    def __init__(self, key='default', ws_url=None, lazy=False):
+        super().__init__(key, ws_url or Config.TICK_HOST_WS, self.parse_tick)
+        self.channel = 'subscribe-single-tick-verbose'
+        if lazy:
+            self.tick_class = LazyTick
+
+    async def subscribe_tick(self, contract, on_update):
+        await self.subscribe_data(self.channel, on_update=on_update, contract=contract)
+
+    def stream(self, contract, policy=ALL):
+        """
+        async for tick in quote.stream(contract)
+        :param contract: 交易对 huobip/btc.usdt
+        :param policy: 消费来不及时的策略 all / latest / bounded(n)
+        """
+        return self.stream_data(self.channel, policy, contract=contract)
+
+
+class AsyncTickV3Quote(AsyncQuote):
+    parse_tick = TickV3Quote.parse_tick
+
+    def __init__(self, ws_url=None):
+        super().__init__('tick.v3', ws_url or Config.TICK_V3_HOST_WS, self.parse_tick)
+        self.channel = 'subscribe-single-tick-verbose'
+        self.books = {}
+        self.ticks = {}
+
+    async def subscribe_tick_v3(self, contract, on_update):
+        await self.subscribe_data(self.channel, on_update=on_update, contract=contract)
+
+    def stream(self, contract, policy=ALL):
+        return self.stream_data(self.channel, policy, contract=contract)
+
+
+class AsyncCandleQuote(AsyncQuote):
+    parse_candle = CandleQuote.parse_candle
+
+    def __init__(self, key='default', ws_url=None):
+        super().__init__(key, ws_url or Config.CANDLE_HOST_WS, self.parse_candle)
+        self.channel = 'subscribe-single-candle'
+
+    async def subscribe_candle(self, contract, duration, on_update):
+        await self.subscribe_data(self.channel, on_update=on_update, contract=contract, duration=duration)
+
+    def stream(self, contract, duration, policy=ALL):
+        return self.stream_data(self.channel, policy, contract=contract, duration=duration)
+
+
+class AsyncZhubiQuote(AsyncQuote):
+    parse_zhubi = ZhubiQuote.parse_zhubi
+
+    def __init__(self, key='default', ws_url=None):
+        super().__init__(key, ws_url or Config.TICK_HOST_WS, self.parse_zhubi)
+        self.channel = 'subscribe-single-zhubi-verbose'
+
+    async def subscribe_zhubi(self, contract, on_update):
+        await self.subscribe_data(self.channel, on_update=on_update, contract=contract)
+
+    def stream(self, contract, policy=ALL):
+        return self.stream_data(self.channel, policy, contract=contract)
+
+
+class AsyncAccountWs(_AsyncWs):
+    PING_INTERVAL = 10
+    PONG_TIMEOUT = 30
+
+    def __init__(self, symbol: str, api_key: str = None, api_secret: str = None):
+        """
+        websocket 初始化
+        :param symbol: account symbol, binance/test_user1
+        :param api_key: ot-key in 1token
+        :param api_secret: ot-secret in 1token
+        """
+        self.symbol = symbol
+        if api_key is None and api_secret is None:
+            self.api_key, self.api_secret, ok = util.load_ot_from_config_file()
+        else:
+            self.api_key = api_key
+            self.api_secret = api_secret
+        self.account, self.exchange = util.get_name_exchange(symbol)
+        super().__init__(util.get_ws_host(self.exchange, self.account))
+        self.ws_support = True
+        self.ready = asyncio.Event()
+        self.backoff = Backoff()
+        self.sub_queue = {}
+        self.streams = collections.defaultdict(list)
+
+    def ws_headers(self):
+        nonce = util.gen_nonce()
+        sign = util.gen_sign(self.api_secret, 'GET', '/ws/' + self.account, nonce, None)
+        return {'Api-Nonce': str(nonce), 'Api-Key': self.api_key, 'Api-Signature': sign}
+
+    def ping_message(self):
+        return {'uri': 'ping', 'uuid': datetime.now().timestamp()}
+
+    def on_disconnected(self):
+        self.ready.clear()
+
+    def on_message(self, data):
+        log.debug(data)
+        if 'uri' not in data:
+            if data.get('code') == 'no-router-found':
+                log.warning('ws push not supported for this exchange {}'.format(self.exchange))
+                self.ws_support = False
+                self.is_running = False
+                return
+            log.warning('unexpected msg get', data)
+            return
+        action = data['uri']
+        if action == 'pong':
+            self.last_pong = time.time()
+        elif action in ['connection', 'status']:
+            if data.get('code', data.get('status', None)) in ['ok', 'connected']:
+                log.info('Connected and auth passed.')
+                self._was_ready = True
+                self.backoff.reset()
+                self.ready.set()
+                for key in self.sub_queue.keys():
+                    asyncio.ensure_future(self.send_json({'uri': 'sub-{}'.format(key)}))
+            else:
+                log.warning('ws auth failed', data.get('message'))
+                asyncio.ensure_future(self.ws.close())
+        elif action == 'info':
+            if data.get('status', 'ok') == 'ok':
+                self._publish('info', Info(data['data']))
+        elif action == 'order':
+            if data.get('status', 'ok') == 'ok':
+                for order in data['data']:
+                    self._publish('order', order)
+            else:
+                log.warning('order update error message', data)
+        else:
+            log.info('receive message %s' % data)
+
+    def _publish(self, key, item):
+        for s in self.streams.get(key, ()):
+            s.put(item)
+        for handler in self.sub_queue.get(key, {}).values():
+            try:
+                r = handler(item)
+                if asyncio.iscoroutine(r):
+                    asyncio.ensure_future(r)
+            except:
+                log.exception('handle {} error'.format(key))
+
+    async def _subscribe(self, key, handler=None, handler_name=None):
+        if not self.ws_support:
+            log.warning('ws push not supported for this exchange {}'.format(self.exchange))
+            return
+        new = key not in self.sub_queue
+        if new:
+            self.sub_queue[key] = {}
+        if handler is not None:
+            if handler_name is None:
+                handler_name = 'default'
+            if handler_name in self.sub_queue[key]:
+                log.warning('handler %s is already exist, will overwrite' % handler_name)
+            self.sub_queue[key][handler_name] = handler
+        if new and self.ready.is_set():
+            await self.send_json({'uri': 'sub-{}'.format(key)})
+        if not self.is_running:
+            self.run()
+
+    async def subscribe_info(self, handler, handler_name=None):
+        await self._subscribe('info', handler, handler_name)
+
+    async def subscribe_orders(self, handler, handler_name=None):
+        await self._subscribe('order', handler, handler_name)
+
+    async def _stream(self, key, policy):
+        s = Stream(policy)
+        await self._subscribe(key)
+        self.streams[key].append(s)
+        try:
+            while True:
+                yield await s.get()
+        finally:
+            self.streams[key].remove(s)
+
+    def stream_info(self, policy=ALL):
+        """
+        async for info in ws.stream_info()
+        """
+        return self._stream('info', policy)
+
+    def stream_orders(self, policy=ALL):
+        """
+        async for order in ws.stream_orders()
+        """
+        return self._stream('order', policy)
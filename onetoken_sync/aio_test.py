@@ -0,0 +1,116 @@
+import asyncio
+import sys
+
+import pytest
+
+from .config import Config
+from .mock_server import OP_BINARY
+
+if sys.version_info < (3, 6):
+    pytest.skip('aio requires python 3.6+', allow_module_level=True)
+pytest.importorskip('aiohttp')
+
+from .aio import AsyncAccountWs, AsyncTickQuote, AsyncTickV3Quote  # noqa: E402
+
+contract = 'huobip/btc.usdt'
+tick = {'contract': contract, 'last': 100.5, 'volume': 10, 'time': '2019-11-29T08:00:00.123+08:00',
+        'bids': [{'price': 100, 'volume': 1}], 'asks': [{'price': 101, 'volume': 1}]}
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+def test_tick_stream(server):
+    async def main():
+        q = AsyncTickQuote(ws_url=server.url('/api/v1/ws/tick?gzip=true'))
+        stream = q.stream(contract)
+        first = asyncio.ensure_future(stream.__anext__())
+        assert await server.wait_async(lambda: server.subscriptions)
+        assert server.subscriptions == [{'uri': 'subscribe-single-tick-verbose', 'contract': contract}]
+        for i in range(3):
+            server.push({'uri': 'single-tick-verbose', 'data': dict(tick, last=100 + i)})
+        t = await asyncio.wait_for(first, 5)
+        assert t.contract == contract and t.price == 100
+        assert (await stream.__anext__()).price == 101
+        assert (await stream.__anext__()).price == 102
+        assert q.decoder.frames >= 4
+        await stream.aclose()
+        await q.close()
+
+    run(main())
+
+
+def test_v3_resubscribe_after_reconnect(server):
+    async def main():
+        q = AsyncTickV3Quote(ws_url=server.url('/api/v1/ws/tick-v3'))
+        got = []
+        await q.subscribe_tick_v3(contract, got.append)
+        assert await server.wait_async(lambda: len(server.subscriptions) == 1)
+        server.drop_all()
+        assert await server.wait_async(lambda: len(server.subscriptions) == 2, 10)
+        server.push({'c': contract, 'tp': 's', 'tm': '2019-11-29T08:00:00+08:00', 'l': 100.5, 'v': 1, 'vc': 1,
+                     'b': [[100, 1]], 'a': [[101, 1]]})
+        server.push({'c': contract, 'tp': 'd', 'tm': '2019-11-29T08:00:01+08:00', 'l': 100.7, 'v': 2, 'vc': 2,
+                     'b': [[100.5, 2]], 'a': []})
+        assert await server.wait_async(lambda: len(got) == 2)
+        assert got[1].bid1 == 100.5 and got[1].price == 100.7
+        await q.close()
+
+    run(main())
+
+
+def test_account_stream(server, monkeypatch):
+    monkeypatch.setattr(Config, 'TRADE_HOST_WS', server.url('/api/v1/ws/trade'))
+
+    async def main():
+        ws = AsyncAccountWs('binance/demo', 'key', 'secret')
+        stream = ws.stream_info()
+        first = asyncio.ensure_future(stream.__anext__())
+        assert await server.wait_async(lambda: server.subscriptions)
+        assert server.subscriptions == [{'uri': 'sub-info'}]
+        server.push({'uri': 'info', 'data': {'balance': 1000, 'position': [{'contract': 'btc', 'total_amount': 1}]}})
+        info = await asyncio.wait_for(first, 5)
+        assert info.balance == 1000 and info.get_total_amount('btc') == 1
+        await stream.aclose()
+        await ws.close()
+
+    run(main())
+
+
+def test_bad_frame_keeps_connection(server):
+    async def main():
+        q = AsyncTickQuote(ws_url=server.url('/api/v1/ws/tick?gzip=true'))
+        got = []
+        await q.subscribe_tick(contract, got.append)
+        assert await server.wait_async(lambda: server.subscriptions)
+        for conn in server.live_connections():
+            conn.send_frame(OP_BINARY, b'not gzip')
+        server.push({'uri': 'single-tick-verbose', 'data': tick})
+        assert await server.wait_async(lambda: got)
+        assert len(server.connections) == 1
+        await q.close()
+
+    run(main())
+
+
+def test_account_auth_failed_backoff(server, monkeypatch):
+    monkeypatch.setattr(Config, 'TRADE_HOST_WS', server.url('/api/v1/ws/trade'))
+    monkeypatch.setattr(Config, 'ACCOUNT_WS_BACKOFF_MIN', 1)
+
+    async def main():
+        ws = AsyncAccountWs('binance/demo', 'key', 'secret')
+        ws.ws_headers = lambda: {}  # 没有签名，替身服务会认证失败并等待客户端关闭
+        ws.run()
+        await asyncio.sleep(1)
+        assert 1 <= len(server.connections) <= 2
+        assert ws.backoff.attempts >= 1
+        await ws.close()
+
+    run(main())
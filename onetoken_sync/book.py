@@ -0,0 +1,197 @@
+import bisect
+
+from .depth import Depth
+from .model import Tick
+
+
+class Level(dict):
+    """
+    只读的盘口档位，行为和 {'price': ..., 'volume': ...} 一致，但是不允许修改
+    同一个价格档位在多个版本的盘口之间共享
+    """
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('book level is read-only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # pickle 默认通过 __setitem__ 重建 dict 子类
+        return (Level, (dict(self),))
+
+
+class BookView:
+    """
+    盘口某一个版本的不可变快照，bids / asks 为 Level 组成的 tuple
+    """
+    __slots__ = ('version', 'bids', 'asks')
+
+    def __init__(self, version, bids, asks):
+        self.version = version
+        self.bids = bids
+        self.asks = asks
+
+    def __repr__(self):
+        return '<BookView v{} {}x{}>'.format(self.version, len(self.bids), len(self.asks))
+
+
+class OrderBook:
+    """
+    单个合约的增量盘口，价格档位始终保持有序
+    tick-v3 推送的 snapshot / delta 在这里合并，每次 delta 只需要 O(k log n)
+    """
+
+    def __init__(self, contract=None, source=None):
+        self.contract = contract
+        self.source = source
+        self.bids = {}  # price -> Level
+        self.asks = {}  # price -> Level
+        self._bid_keys = []  # -price 升序，也就是买一在最前
+        self._ask_keys = []  # price 升序，也就是卖一在最前
+        self._bid_view = None
+        self._ask_view = None
+        self._view = None
+        self._tick = None
+        self.time = None
+        self.exchange_time = None
+        self.price = None
+        self.volume = 0
+        self.amount = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self.bids) + len(self.asks)
+
+    def __str__(self):
+        return '<OrderBook {} v{} {}/{} {}x{}>'.format(self.contract, self.version, self.bid1, self.ask1,
+                                                       len(self.bids), len(self.asks))
+
+    def __repr__(self):
+        return str(self)
+
+    @staticmethod
+    def _apply(side, keys, levels, sign):
+        for p, v in levels:
+            k = sign * p
+            if v > 0:
+                if p not in side:
+                    bisect.insort(keys, k)
+                side[p] = Level(price=p, volume=v)
+            elif p in side:
+                del side[p]
+                del keys[bisect.bisect_left(keys, k)]
+
+    def reset(self, bids, asks):
+        """
+        用全量盘口覆盖
+        :param bids: [[price, volume], ...]
+        :param asks: [[price, volume], ...]
+        :return: None
+        """
+        self.bids = {p: Level(price=p, volume=v) for p, v in bids if v > 0}
+        self.asks = {p: Level(price=p, volume=v) for p, v in asks if v > 0}
+        self._bid_keys = sorted(-p for p in self.bids)
+        self._ask_keys = sorted(self.asks)
+        self._bid_view = self._ask_view = self._view = self._tick = None
+        self.version += 1
+
+    def update(self, bids, asks):
+        """
+        合并增量盘口，volume 为 0 表示删除该档位
+        :param bids: [[price, volume], ...]
+        :param asks: [[price, volume], ...]
+        :return: None
+        """
+        if bids:
+            self._apply(self.bids, self._bid_keys, bids, -1)
+            self._bid_view = None
+        if asks:
+            self._apply(self.asks, self._ask_keys, asks, 1)
+            self._ask_view = None
+        self._view = self._tick = None
+        self.version += 1
+
+    def set_trade(self, time, price, volume, exchange_time=None, amount=None):
+        self.time = time
+        self.exchange_time = exchange_time
+        self.price = price
+        self.volume = volume
+        self.amount = amount
+        self._tick = None
+
+    @property
+    def bid1(self):
+        if self._bid_keys:
+            return -self._bid_keys[0]
+        return None
+
+    @property
+    def ask1(self):
+        if self._ask_keys:
+            return self._ask_keys[0]
+        return None
+
+    def bid_levels(self, depth=None):
+        if self._bid_view is None:
+            bids = self.bids
+            self._bid_view = tuple([bids[-k] for k in self._bid_keys])
+        return self._bid_view if depth is None else self._bid_view[:depth]
+
+    def ask_levels(self, depth=None):
+        if self._ask_view is None:
+            asks = self.asks
+            self._ask_view = tuple([asks[k] for k in self._ask_keys])
+        return self._ask_view if depth is None else self._ask_view[:depth]
+
+    def view(self):
+        """
+        当前版本的不可变快照，盘口没有变化时返回同一个对象
+        没有变化的一侧以及没有变化的档位会和上一个版本共享
+        :return: BookView
+        """
+        if self._view is None:
+            self._view = BookView(self.version, self.bid_levels(), self.ask_levels())
+        return self._view
+
+    def to_depth(self, depth=None):
+        """
+        盘口的数组表示，需要安装 numpy
+        :param depth: 截取的档位数量，None 为全部
+        :return: Depth
+        """
+        bid_keys = self._bid_keys[:depth]
+        ask_keys = self._ask_keys[:depth]
+        bids, asks = self.bids, self.asks
+        return Depth([-k for k in bid_keys], [bids[-k]['volume'] for k in bid_keys],
+                     ask_keys, [asks[k]['volume'] for k in ask_keys])
+
+    def to_tick(self, depth=None):
+        """
+        按当前盘口生成 Tick，只有真正需要回调的时候才调用
+        返回的 Tick 引用不可变快照，可以直接交给多个回调或者保存历史，不需要 copy
+        :param depth: 截取的档位数量，None 为全部
+        :return: Tick
+        """
+        if depth is None and self._tick is not None:
+            return self._tick
+        view = self.view()
+        if depth is not None:
+            view = BookView(view.version, view.bids[:depth], view.asks[:depth])
+        tick = Tick.from_view(view,
+                              time=self.time,
+                              price=self.price,
+                              volume=self.volume,
+                              contract=self.contract,
+                              source=self.source,
+                              exchange_time=self.exchange_time,
+                              amount=self.amount)
+        if depth is None:
+            self._tick = tick
+        return tick
@@ -0,0 +1,100 @@
+import pickle
+
+import arrow
+import pytest
+
+from .book import OrderBook
+from .quote import TickV3Quote
+
+contract = 'huobip/btc.usdt'
+
+
+def snapshot(**kwargs):
+    data = {'c': contract, 'tp': 's', 'tm': '2019-11-29T08:00:00.123+08:00', 'et': '2019-11-29T08:00:00.100+08:00',
+            'l': 100.5, 'v': 10, 'vc': 1005,
+            'b': [[100, 1], [99, 2], [98, 3]],
+            'a': [[101, 1], [102, 2], [103, 3]]}
+    data.update(kwargs)
+    return data
+
+
+def snapshot_time():
+    return arrow.get(snapshot()['tm']).datetime
+
+
+def delta(bids, asks):
+    return snapshot(tp='d', b=bids, a=asks, l=100.7)
+
+
+def test_book_update():
+    book = OrderBook(contract)
+    book.reset([[100, 1], [99, 2]], [[101, 1], [102, 2]])
+    book.update([[99.5, 4], [100, 0]], [[101, 0], [100.8, 5], [105, 1]])
+    assert book.bid1 == 99.5
+    assert book.ask1 == 100.8
+    assert [x['price'] for x in book.bid_levels()] == [99.5, 99]
+    assert [x['price'] for x in book.ask_levels()] == [100.8, 102, 105]
+    assert book.ask_levels(1) == ({'price': 100.8, 'volume': 5},)
+    book.update([[1, 0]], [])
+    assert len(book) == 5
+
+
+def test_v3_parse_tick():
+    q = TickV3Quote()
+    q_key, tick = q.parse_tick(delta([], []))
+    assert q_key is None
+    q_key, tick = q.parse_tick(snapshot())
+    assert tick is None and contract not in q.ticks
+    q.data_queue[q_key] = None
+    q_key, tick = q.parse_tick(delta([[100, 0], [99.5, 7]], [[101.5, 1]]))
+    assert tick.contract == contract
+    assert tick.price == 100.7
+    assert tick.bid1 == 99.5
+    assert tick.ask1 == 101
+    assert [x['price'] for x in tick.bids] == [99.5, 99, 98]
+    assert [x['price'] for x in tick.asks] == [101, 101.5, 102, 103]
+    assert tick.time.tzinfo
+    assert q.ticks[contract] is tick
+
+
+def test_book_view_shared():
+    book = OrderBook(contract)
+    book.reset([[100, 1], [99, 2]], [[101, 1], [102, 2]])
+    v1 = book.view()
+    assert book.view() is v1
+    book.update([], [[101, 3]])
+    v2 = book.view()
+    assert v2 is not v1
+    assert v2.bids is v1.bids
+    assert v2.asks[1] is v1.asks[1]
+    assert v1.asks[0]['volume'] == 1 and v2.asks[0]['volume'] == 3
+    with pytest.raises(TypeError):
+        v2.asks[0]['volume'] = 0
+
+
+def test_tick_from_view():
+    book = OrderBook(contract)
+    book.reset([[100, 1], [99, 2]], [[101, 3], [102, 2]])
+    book.set_trade(snapshot_time(), 100.5, 10)
+    tick = book.to_tick()
+    assert book.to_tick() is tick
+    assert tick.bid1 == 100 and tick.ask1 == 101
+    assert tick.middle == 100.5
+    assert tick.weighted_middle == (100 * 3 + 101 * 1) / 4
+    cp = tick.copy()
+    assert cp is not tick and cp.bids is tick.bids
+    book.update([[100, 0]], [])
+    assert tick.bid1 == 100
+    assert book.to_tick().bid1 == 99
+    assert book.to_tick(1).asks == ({'price': 101, 'volume': 3},)
+
+
+def test_tick_pickle():
+    book = OrderBook(contract)
+    book.reset([[100, 1], [99, 2]], [[101, 3], [102, 2]])
+    book.set_trade(snapshot_time(), 100.5, 10)
+    tick = pickle.loads(pickle.dumps(book.to_tick()))
+    assert tick.bids == ({'price': 100, 'volume': 1}, {'price': 99, 'volume': 2})
+    assert tick.ask1 == 101
+    with pytest.raises(TypeError):
+        tick.bids[0]['volume'] = 0
@@ -0,0 +1,150 @@
+import json
+import zlib
+
+from .config import Config
+from .logger import log
+
+BACKENDS = ['orjson', 'ujson', 'json']
+
+
+def _json_dumps(obj):
+    return json.dumps(obj)
+
+
+def _json_loads(s):
+    # python 3.5 的 json.loads 只接受 str
+    if isinstance(s, (bytes, bytearray)):
+        s = s.decode('utf-8')
+    return json.loads(s)
+
+
+_name = None  # Config.JSON_CODEC that the current backend was resolved from
+_backend = 'json'
+_loads = _json_loads
+_dumps = _json_dumps
+
+
+def _import_backend(name):
+    if name == 'orjson':
+        import orjson
+
+        def dumps(obj):
+            try:
+                return orjson.dumps(obj).decode()
+            except TypeError:
+                return json.dumps(obj)
+
+        return orjson.loads, dumps
+    if name == 'ujson':
+        import ujson
+
+        def dumps(obj):
+            return ujson.dumps(obj, escape_forward_slashes=False)
+
+        return ujson.loads, dumps
+    if name == 'json':
+        return _json_loads, _json_dumps
+    raise ValueError('unknown json codec {}, should be one of auto/{}'.format(name, '/'.join(BACKENDS)))
+
+
+def _resolve():
+    global _name, _backend, _loads, _dumps
+    name = Config.JSON_CODEC
+    candidates = BACKENDS if name == 'auto' else [name]
+    for backend in candidates:
+        try:
+            loads, dumps = _import_backend(backend)
+        except ImportError:
+            if name != 'auto':
+                log.warning('json codec {} not installed, fall back to json'.format(backend))
+            continue
+        break
+    else:
+        backend = 'json'
+        loads, dumps = _import_backend(backend)
+    _backend, _loads, _dumps = backend, loads, dumps
+    _name = name
+    log.debug('use json codec', backend)
+
+
+def get_backend():
+    """
+    当前使用的 json 库名称
+    :return: orjson / ujson / json
+    """
+    if _name != Config.JSON_CODEC:
+        _resolve()
+    return _backend
+
+
+def loads(s):
+    """
+    解析 json，可以直接传入 bytes，不需要先 decode
+    :param s: bytes / str
+    :return: object
+    """
+    if _name != Config.JSON_CODEC:
+        _resolve()
+    return _loads(s)
+
+
+def dumps(obj):
+    """
+    序列化为 json 字符串
+    :param obj: object
+    :return: str
+    """
+    if _name != Config.JSON_CODEC:
+        _resolve()
+    return _dumps(obj)
+
+
+class GzipDecoder:
+    """
+    websocket gzip 帧解压，每个连接一个，同时统计压缩前后的字节数
+    每一帧都是独立的 gzip member，zlib 的流式解压对象在 member 结束之后不能重置，
+    所以直接用 zlib 的一次性解压，省掉 gzip 模块在 python 层解析头部的开销
+    """
+    WBITS = 16 + zlib.MAX_WBITS  # 只接受 gzip 头
+
+    def __init__(self):
+        self.frames = 0
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
+
+    def decompress(self, data):
+        """
+        :param data: gzip bytes
+        :return: bytes
+        """
+        raw = zlib.decompress(data, self.WBITS)
+        self.frames += 1
+        self.compressed_bytes += len(data)
+        self.decompressed_bytes += len(raw)
+        return raw
+
+    def loads(self, data):
+        """
+        解压之后直接把 bytes 交给 json 解析(标准库 json 会在 loads 里先 decode)
+        :param data: gzip bytes
+        :return: object
+        """
+        return loads(self.decompress(data))
+
+    @property
+    def ratio(self):
+        if not self.decompressed_bytes:
+            return None
+        return self.compressed_bytes / self.decompressed_bytes
+
+    def stats(self):
+        return {'frames': self.frames,
+                'compressed_bytes': self.compressed_bytes,
+                'decompressed_bytes': self.decompressed_bytes,
+                'saved_bytes': self.decompressed_bytes - self.compressed_bytes,
+                'ratio': self.ratio}
+
+    def reset(self):
+        self.frames = 0
+        self.compressed_bytes = 0
+        self.decompressed_bytes = 0
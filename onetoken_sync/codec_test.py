@@ -0,0 +1,27 @@
+import gzip
+
+import pytest
+
+from . import codec
+from .config import Config
+
+
+@pytest.fixture
+def stdlib_json():
+    old = Config.JSON_CODEC
+    Config.JSON_CODEC = 'json'
+    yield
+    Config.JSON_CODEC = old
+
+
+def test_json_loads_bytes(stdlib_json):
+    assert codec.get_backend() == 'json'
+    assert codec.loads(b'{"a":1}') == {'a': 1}
+    assert codec.loads(bytearray(b'{"a":1}')) == {'a': 1}
+    assert codec.loads('{"a":1}') == {'a': 1}
+
+
+def test_gzip_loads(stdlib_json):
+    decoder = codec.GzipDecoder()
+    assert decoder.loads(gzip.compress(b'{"uri":"pong"}')) == {'uri': 'pong'}
+    assert decoder.frames == 1
@@ -5,6 +5,48 @@ class Config:
     TICK_HOST_WS = 'wss://1token.trade/api/v1/ws/tick?gzip=true'
     TICK_V3_HOST_WS = 'wss://1token.trade/api/v1/ws/tick-v3?gzip=true'
     CANDLE_HOST_WS = 'wss://1token.trade/api/v1/ws/candle?gzip=true'
+    # Account.place_orders / cancel_orders 同时进行的请求数量
+    ACCOUNT_HTTP_WORKERS = 8
+    # Account.get_info 的缓存最长可以使用多少秒，0 表示总是请求 REST；配合 Account.track_info 使用
+    ACCOUNT_INFO_MAX_STALENESS = 0
+    # 账户 websocket 的心跳间隔和等待 pong 的时间(秒)
+    ACCOUNT_WS_PING_INTERVAL = 10
+    ACCOUNT_WS_PING_TIMEOUT = 5
+    # 账户 websocket 连续重连失败时的退避时间范围(秒)
+    ACCOUNT_WS_BACKOFF_MIN = 0.5
+    ACCOUNT_WS_BACKOFF_MAX = 30
+    ACCOUNT_WS_CONNECT_TIMEOUT = 10
+    # 为 True 时所有 Account 的 websocket 由进程内共享的 AccountWsMux 的一个线程驱动
+    ACCOUNT_WS_MUX = False
+    ACCOUNT_WS_MUX_CONNECT_WORKERS = 4
+    # 共享 http 连接池：缓存的 host 数量、每个 host 保持的连接数
+    HTTP_POOL_CONNECTIONS = 10
+    HTTP_POOL_MAXSIZE = 32
+    # 连接失败和 GET 读取失败的重试次数及退避系数(秒)，下单撤单等签名请求读取失败不会重试
+    HTTP_RETRIES = 2
+    HTTP_RETRY_BACKOFF = 0.1
+    HTTP_TCP_KEEPALIVE = True
+    # 第一次使用时预先建立的连接数量，0 表示不预热
+    HTTP_PREWARM = 0
+    # auto / orjson / ujson / json, auto 会按顺序选择已经安装的库
+    JSON_CODEC = 'auto'
+    # 每个 Quote 处理回调的线程数量，订阅按 contract 分片到这些线程上
+    QUOTE_WORKERS = 4
+    # 行情连接建立之后等待认证成功的时间(秒)，超时会断开重连
+    QUOTE_AUTH_TIMEOUT = 5
+    # 一个订阅帧里最多合并的 contract 数量，1 表示每个 contract 单独一帧
+    QUOTE_SUB_BATCH = 1
+    # TickQuotePool 的连接数量
+    QUOTE_POOL_SIZE = 4
+    # 连接的接收延迟比最快的连接高出多少秒时迁移 contract
+    QUOTE_POOL_MAX_LAG = 1
+    # TickQuotePool 检查负载的间隔(秒)，0 表示不自动迁移
+    QUOTE_POOL_REBALANCE_INTERVAL = 10
+    # 本地行情记录每个 segment 覆盖的最长时间(秒)和最大字节数
+    RECORDER_ROTATE_SECONDS = 3600
+    RECORDER_ROTATE_BYTES = 64 * 1024 * 1024
+    # 每个 contract 在内存里缓冲多少字节之后写入文件
+    RECORDER_BUFFER_BYTES = 64 * 1024
 
     @classmethod
     def change_host(cls, target='1token.trade/', match='1token.trade/', nossl=False):
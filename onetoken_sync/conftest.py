@@ -0,0 +1,56 @@
+import socketserver
+import threading
+from http.server import HTTPServer
+
+import pytest
+
+from .account_ws import AccountWs
+from .mock_server import MockServer
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    with MockServer() as s:
+        yield s
+
+
+@pytest.fixture
+def account_ws():
+    """
+    create(server, name='test', **kwargs) 创建连接到 server 的 AccountWs('binance/' + name)，结束时关闭
+    """
+    created = []
+
+    def create(server, name='test', **kwargs):
+        ws = AccountWs('binance/' + name, 'key', 'secret', **kwargs)
+        ws.host_ws = server.url('/api/v1/ws/trade/binance/' + name)
+        created.append(ws)
+        return ws
+
+    yield create
+    for ws in created:
+        if ws.is_running:
+            ws.close()
+
+
+@pytest.fixture
+def http_server():
+    """
+    start(handler) 在本地启动一个 http 服务，返回 http://127.0.0.1:port
+    """
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'http://127.0.0.1:{}'.format(server.server_port)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,116 @@
+class Depth:
+    """
+    用 numpy 数组表示的盘口，每一侧两个连续的 float64 数组 (price, volume)
+    bids 按价格从高到低，asks 按价格从低到高；数组只读，可以在多个 Tick 之间共享
+    需要安装 numpy
+    """
+    __slots__ = ('bid_price', 'bid_volume', 'ask_price', 'ask_volume')
+
+    def __init__(self, bid_price, bid_volume, ask_price, ask_volume):
+        import numpy as np
+        bid_price, bid_volume = self._prepare(np, bid_price, bid_volume, True)
+        ask_price, ask_volume = self._prepare(np, ask_price, ask_volume, False)
+        self.bid_price = bid_price
+        self.bid_volume = bid_volume
+        self.ask_price = ask_price
+        self.ask_volume = ask_volume
+
+    @staticmethod
+    def _prepare(np, price, volume, descending):
+        price = np.ascontiguousarray(price, dtype=np.float64).reshape(-1)
+        volume = np.ascontiguousarray(volume, dtype=np.float64).reshape(-1)
+        assert price.shape == volume.shape
+        diff = np.diff(price)
+        if (diff > 0).any() if descending else (diff < 0).any():
+            order = np.argsort(-price if descending else price, kind='stable')
+            price, volume = price[order], volume[order]
+        price.flags.writeable = False
+        volume.flags.writeable = False
+        return price, volume
+
+    @classmethod
+    def from_levels(cls, bids, asks):
+        """
+        :param bids: [{'price': ..., 'volume': ...}, ...]
+        :param asks: [{'price': ..., 'volume': ...}, ...]
+        :return: Depth
+        """
+        return cls([x['price'] for x in bids], [x['volume'] for x in bids],
+                   [x['price'] for x in asks], [x['volume'] for x in asks])
+
+    def to_levels(self):
+        bids = [{'price': p, 'volume': v} for p, v in zip(self.bid_price.tolist(), self.bid_volume.tolist())]
+        asks = [{'price': p, 'volume': v} for p, v in zip(self.ask_price.tolist(), self.ask_volume.tolist())]
+        return bids, asks
+
+    def __repr__(self):
+        return '<Depth {}x{} {}/{}>'.format(len(self.bid_price), len(self.ask_price), self.bid1, self.ask1)
+
+    @property
+    def nbytes(self):
+        return self.bid_price.nbytes + self.bid_volume.nbytes + self.ask_price.nbytes + self.ask_volume.nbytes
+
+    @property
+    def bid1(self):
+        if len(self.bid_price):
+            return float(self.bid_price[0])
+        return None
+
+    @property
+    def ask1(self):
+        if len(self.ask_price):
+            return float(self.ask_price[0])
+        return None
+
+    def side(self, bs):
+        """
+        和 Tick.get_interest_side 一致，卖出看 bids，买入看 asks
+        :param bs: b/s
+        :return: (price, volume)
+        """
+        if bs == 's':
+            return self.bid_price, self.bid_volume
+        if bs == 'b':
+            return self.ask_price, self.ask_volume
+        raise ValueError('bs should be b or s, got {}'.format(bs))
+
+    def cum_depth(self, bs):
+        """
+        累计挂单量
+        :param bs: b/s
+        :return: np.ndarray
+        """
+        import numpy as np
+        _, volume = self.side(bs)
+        return np.cumsum(volume)
+
+    def vwap(self, bs, size):
+        """
+        吃掉 size 数量时的成交均价，深度不够时返回 None
+        :param bs: b/s
+        :param size: 数量
+        :return: float
+        """
+        import numpy as np
+        price, volume = self.side(bs)
+        if size <= 0:
+            return float(price[0]) if len(price) else None
+        cum = np.cumsum(volume)
+        idx = int(np.searchsorted(cum, size))
+        if idx >= len(cum):
+            return None
+        filled = float(cum[idx - 1]) if idx > 0 else 0.0
+        cost = float(np.dot(price[:idx], volume[:idx])) + float(price[idx]) * (size - filled)
+        return cost / size
+
+    def imbalance(self, levels=None):
+        """
+        盘口买卖量不平衡度 (bid - ask) / (bid + ask)，范围 [-1, 1]
+        :param levels: 统计的档位数量，None 为全部
+        :return: float
+        """
+        bid = float(self.bid_volume[:levels].sum())
+        ask = float(self.ask_volume[:levels].sum())
+        if bid + ask == 0:
+            return 0.0
+        return (bid - ask) / (bid + ask)
@@ -0,0 +1,46 @@
+import arrow
+import pytest
+
+from .book import OrderBook
+from .model import Tick
+
+np = pytest.importorskip('numpy')
+
+tm = arrow.get('2019-11-29T08:00:00+08:00').datetime
+
+
+def make_tick():
+    return Tick.from_arrays(tm, 100.5, [99, 100, 98], [2, 1, 3], [101, 102, 103], [1, 2, 3], contract='a/b.c')
+
+
+def test_from_arrays():
+    tick = make_tick()
+    assert tick.depth.bid_price.dtype == np.float64
+    assert tick.depth.bid_price.tolist() == [100, 99, 98]
+    assert tick.bid1 == 100 and tick.ask1 == 101
+    assert tick.middle == 100.5
+    assert tick.weighted_middle == (100 * 1 + 101 * 1) / 2
+    assert 'bids' not in tick.__dict__
+    assert tick.bids[0] == {'price': 100, 'volume': 1}
+    assert tick.copy().depth is tick.depth
+    with pytest.raises(ValueError):
+        tick.depth.ask_price[0] = 0
+
+
+def test_helpers():
+    tick = make_tick()
+    assert tick.cum_depth('b').tolist() == [1, 3, 6]
+    assert tick.vwap('b', 2) == (101 + 102) / 2
+    assert tick.vwap('s', 3) == (100 + 99 * 2) / 3
+    assert tick.vwap('b', 7) is None
+    assert tick.imbalance() == 0
+    assert tick.imbalance(1) == 0
+    plain = Tick(tm, 100.5, bids=[{'price': 100, 'volume': 3}], asks=[{'price': 101, 'volume': 1}])
+    assert plain.imbalance() == 0.5
+
+
+def test_book_to_depth():
+    book = OrderBook()
+    book.reset([[100, 1], [99, 2]], [[101, 1], [102, 2]])
+    depth = book.to_depth(1)
+    assert depth.bid_price.tolist() == [100] and depth.ask_volume.tolist() == [1]
@@ -0,0 +1,163 @@
+import _thread as thread
+import collections
+import queue
+
+from .logger import log
+
+ALL = 'all'  # 每一条数据都交给回调
+LATEST = 'latest'  # 回调来不及处理时只保留最新的一条
+
+
+class Bounded:
+    """
+    最多缓存 size 条数据，超过时丢掉最旧的一条
+    """
+    __slots__ = ('size',)
+
+    def __init__(self, size):
+        assert size >= 1
+        self.size = size
+
+    def __eq__(self, other):
+        return isinstance(other, Bounded) and other.size == self.size
+
+    def __repr__(self):
+        return 'bounded({})'.format(self.size)
+
+
+def bounded(size):
+    return Bounded(size)
+
+
+def policy_size(policy):
+    """
+    :param policy: all / latest / bounded(n)
+    :return: 缓存上限，None 表示不限制
+    """
+    if policy is None or policy == ALL:
+        return None
+    if policy == LATEST:
+        return 1
+    if isinstance(policy, Bounded):
+        return policy.size
+    raise ValueError('unknown delivery policy {}, should be all/latest/bounded(n)'.format(policy))
+
+
+class Channel:
+    """
+    一个订阅在 Dispatcher 里的入口，同一个 key 的数据总是由同一个 worker 按顺序处理
+    按照 policy 缓存还没有交给回调的数据，并统计被丢掉的数量
+    """
+    BATCH = 64  # 一次最多连续处理的数量，避免一个繁忙的 key 占住 worker
+
+    def __init__(self, key, q, policy=ALL):
+        self.key = key
+        self._q = q
+        self.lock = thread.allocate_lock()
+        self.pending = collections.deque()
+        self.scheduled = False
+        self.policy = policy
+        self.maxlen = policy_size(policy)
+        self.received = 0
+        self.dropped = 0
+
+    def set_policy(self, policy):
+        with self.lock:
+            self.policy = policy
+            self.maxlen = policy_size(policy)
+            while self.maxlen is not None and len(self.pending) > self.maxlen:
+                self.pending.popleft()
+                self.dropped += 1
+
+    def put(self, item):
+        with self.lock:
+            self.received += 1
+            if self.maxlen is not None and len(self.pending) >= self.maxlen:
+                self.pending.popleft()
+                self.dropped += 1
+            self.pending.append(item)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self._q.put(self)
+
+    def drain(self, handler):
+        for _ in range(self.BATCH):
+            with self.lock:
+                if not self.pending:
+                    self.scheduled = False
+                    return
+                item = self.pending.popleft()
+            try:
+                handler(self.key, item)
+            except:
+                log.exception('dispatch fail')
+        # 还有剩余的数据，排到队尾让同一个 worker 上的其他 key 先处理
+        self._q.put(self)
+
+    def stats(self):
+        return {'policy': str(self.policy),
+                'received': self.received,
+                'dropped': self.dropped,
+                'pending': len(self.pending)}
+
+
+class Dispatcher:
+    """
+    固定数量的 worker 线程处理所有订阅的回调，订阅按 key 分片到 worker 上
+    线程数量不随订阅数量增长，同一个 key 的数据保持先后顺序
+    """
+
+    def __init__(self, handler, workers=4):
+        """
+        :param handler: func(key, item) worker 线程里调用
+        :param workers: worker 线程数量
+        """
+        assert workers >= 1
+        self.handler = handler
+        self.workers = workers
+        self.queues = []
+        self.lock = thread.allocate_lock()
+
+    @property
+    def is_running(self):
+        return bool(self.queues)
+
+    def start(self):
+        with self.lock:
+            if self.queues:
+                return
+            self.queues = [queue.Queue() for _ in range(self.workers)]
+            for q in self.queues:
+                thread.start_new_thread(self._run, (q,))
+
+    def stop(self):
+        with self.lock:
+            queues, self.queues = self.queues, []
+            for q in queues:
+                q.put(None)
+
+    def shard(self, key):
+        return hash(key) % self.workers
+
+    def channel(self, key, policy=ALL):
+        """
+        获取 key 对应的 Channel，worker 线程在第一次调用时启动
+        :param key: 订阅的 key
+        :param policy: all / latest / bounded(n)
+        :return: Channel
+        """
+        if not self.queues:
+            self.start()
+        return Channel(key, self.queues[self.shard(key)], policy)
+
+    def _run(self, q):
+        while True:
+            try:
+                ch = q.get()
+            except:
+                log.warning('get data from queue failed')
+                continue
+            if ch is None:
+                break
+            ch.drain(self.handler)
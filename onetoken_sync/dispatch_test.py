@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from .dispatch import ALL, LATEST, Dispatcher, bounded
+from .mock_server import wait_for
+
+
+def collect(n_keys, n_items, workers):
+    got = {}
+    done = threading.Event()
+    total = n_keys * n_items
+    count = [0]
+    lock = threading.Lock()
+
+    def handler(key, item):
+        got.setdefault(key, []).append(item)
+        with lock:
+            count[0] += 1
+            if count[0] == total:
+                done.set()
+
+    d = Dispatcher(handler, workers)
+    channels = [d.channel('key-%s' % i) for i in range(n_keys)]
+    for item in range(n_items):
+        for ch in channels:
+            ch.put(item)
+    assert done.wait(10)
+    d.stop()
+    return got
+
+
+def test_order_per_key():
+    got = collect(100, 50, 4)
+    assert len(got) == 100
+    for items in got.values():
+        assert items == list(range(50))
+
+
+def test_shard_stable():
+    d = Dispatcher(lambda k, v: None, 8)
+    assert d.shard('a') == d.shard('a')
+    assert not d.is_running
+    d.channel('a')
+    assert d.is_running and len(d.queues) == 8
+    d.stop()
+    assert not d.is_running
+
+
+def blocked_dispatcher(policy):
+    release = threading.Event()
+    started = threading.Event()
+    got = []
+
+    def handler(key, item):
+        started.set()
+        release.wait(5)
+        got.append(item)
+
+    d = Dispatcher(handler, 1)
+    ch = d.channel('key', policy)
+    ch.put(0)
+    assert started.wait(5)
+    for i in range(1, 11):
+        ch.put(i)
+    return d, ch, release, got
+
+
+def test_policy_latest():
+    d, ch, release, got = blocked_dispatcher(LATEST)
+    assert ch.dropped == 9
+    release.set()
+    assert wait_for(lambda: len(got) == 2)
+    assert got == [0, 10]
+    assert ch.stats() == {'policy': 'latest', 'received': 11, 'dropped': 9, 'pending': 0}
+    d.stop()
+
+
+def test_policy_bounded():
+    d, ch, release, got = blocked_dispatcher(bounded(3))
+    assert ch.dropped == 7
+    release.set()
+    assert wait_for(lambda: len(got) == 4)
+    assert got == [0, 8, 9, 10]
+    d.stop()
+
+
+def test_policy_all():
+    d, ch, release, got = blocked_dispatcher(ALL)
+    release.set()
+    assert wait_for(lambda: len(got) == 11)
+    assert got == list(range(11)) and ch.dropped == 0
+    with pytest.raises(ValueError):
+        ch.set_policy('newest')
+    d.stop()
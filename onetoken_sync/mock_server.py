@@ -0,0 +1,352 @@
+"""
+本地的 websocket 替身服务，模拟 1token 行情和账户推送的协议，用于离线测试和压测
+
+    server = MockServer().start()
+    Config.TICK_HOST_WS = server.url('/api/v1/ws/tick?gzip=true')
+    ...
+    server.push({'uri': 'single-tick-verbose', 'data': {...}})
+    server.stop()
+
+只依赖标准库，实现了 RFC 6455 里客户端会用到的部分：握手、分片、ping/pong 和 close
+"""
+import base64
+import gzip
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from .logger import log
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def _unmask(data, mask):
+    n = len(data)
+    if not n:
+        return data
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+def encode_frame(opcode, payload):
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return header + payload
+
+
+class Connection:
+    """
+    替身服务上的一个客户端连接
+    """
+
+    def __init__(self, server, sock, path, headers):
+        self.server = server
+        self.sock = sock
+        self.path = path
+        self.headers = headers
+        url = urlparse(path)
+        self.gzip = parse_qs(url.query).get('gzip', ['false'])[0] == 'true'
+        self.is_account = '/ws/trade/' in url.path
+        self.lock = threading.Lock()
+        self.alive = True
+        self.authorized = False
+        self.subscriptions = []
+        self.received = []
+        self.frames_received = 0
+        self.connected_at = time.time()
+
+    def __repr__(self):
+        return '<Connection {} subs={}>'.format(self.path, len(self.subscriptions))
+
+    def send_frame(self, opcode, payload):
+        with self.lock:
+            if not self.alive:
+                return False
+            try:
+                self.sock.sendall(encode_frame(opcode, payload))
+                return True
+            except OSError:
+                self.alive = False
+                return False
+
+    def send_json(self, js):
+        """
+        行情连接带 gzip=true 时按二进制 gzip 帧发送，否则按文本帧发送
+        """
+        raw = json.dumps(js).encode()
+        if self.gzip:
+            return self.send_frame(OP_BINARY, gzip.compress(raw))
+        return self.send_frame(OP_TEXT, raw)
+
+    def close(self, code=1000):
+        self.send_frame(OP_CLOSE, struct.pack('!H', code))
+        self.drop()
+
+    def drop(self):
+        """
+        不发送 close 帧直接断开，模拟网络中断
+        """
+        with self.lock:
+            self.alive = False
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    def _recv_exact(self, n):
+        buf = b''
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError('connection closed')
+            buf += chunk
+        return buf
+
+    def recv_message(self):
+        """
+        :return: (opcode, payload)，分片的消息会拼接完整
+        """
+        message_op, parts = None, []
+        while True:
+            b1, b2 = self._recv_exact(2)
+            fin, opcode = b1 & 0x80, b1 & 0x0F
+            n = b2 & 0x7F
+            if n == 126:
+                n, = struct.unpack('!H', self._recv_exact(2))
+            elif n == 127:
+                n, = struct.unpack('!Q', self._recv_exact(8))
+            mask = self._recv_exact(4) if b2 & 0x80 else None
+            payload = self._recv_exact(n) if n else b''
+            if mask:
+                payload = _unmask(payload, mask)
+            if opcode >= OP_CLOSE:
+                return opcode, payload
+            if opcode != OP_CONT:
+                message_op = opcode
+            parts.append(payload)
+            if fin:
+                return message_op, b''.join(parts)
+
+
+def wait_for(cond, timeout=5):
+    """
+    每 10ms 检查一次 cond()，timeout 秒内为 True 时返回 True
+    """
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class MockServer:
+    """
+    :param auth_delay: 收到 auth 之后延迟多久回复
+    :param respond_pong: 是否回复 {'uri': 'ping'}，设为 False 可以模拟心跳丢失
+    :param max_batch: 一个订阅帧里最多允许的 contract 数量
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, auth_delay=0, respond_pong=True, max_batch=100):
+        self.host = host
+        self.port = port
+        self.auth_delay = auth_delay
+        self.respond_pong = respond_pong
+        self.max_batch = max_batch
+        self.sock = None
+        self.connections = []
+        self.lock = threading.Lock()
+        self.handlers = []
+        self.is_running = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.is_running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.is_running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        for conn in self.live_connections():
+            conn.drop()
+
+    def url(self, path='/'):
+        return 'ws://{}:{}{}'.format(self.host, self.port, path)
+
+    def live_connections(self):
+        with self.lock:
+            return [c for c in self.connections if c.alive]
+
+    @staticmethod
+    def wait_for(cond, timeout=5):
+        return wait_for(cond, timeout)
+
+    def wait_async(self, cond, timeout=5):
+        """
+        在 asyncio 里等待 cond()，不阻塞 event loop: await server.wait_async(cond)
+        """
+        import asyncio
+        return asyncio.get_event_loop().run_in_executor(None, wait_for, cond, timeout)
+
+    def on_message(self, handler):
+        """
+        自定义的消息处理，handler(conn, js) 返回 True 表示已经处理，不再走默认逻辑
+        """
+        self.handlers.append(handler)
+
+    def push(self, js, path=None):
+        """
+        向所有连接(或者 path 包含指定字符串的连接)推送消息
+        :return: 发送成功的连接数
+        """
+        n = 0
+        for conn in self.live_connections():
+            if path is None or path in conn.path:
+                n += conn.send_json(js)
+        return n
+
+    def drop_all(self):
+        for conn in self.live_connections():
+            conn.drop()
+
+    @property
+    def subscriptions(self):
+        with self.lock:
+            return [s for c in self.connections for s in c.subscriptions]
+
+    def _accept_loop(self):
+        while self.is_running:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _handshake(self, sock):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('handshake closed')
+            data += chunk
+        lines = data.split(b'\r\n\r\n', 1)[0].decode().split('\r\n')
+        path = lines[0].split(' ')[1]
+        headers = {}
+        for line in lines[1:]:
+            k, v = line.split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + GUID).encode()).digest()).decode()
+        sock.sendall(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      'Sec-WebSocket-Accept: {}\r\n\r\n'.format(accept)).encode())
+        return path, headers
+
+    def _serve(self, sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            path, headers = self._handshake(sock)
+        except Exception as e:
+            log.warning('mock server handshake failed', e)
+            sock.close()
+            return
+        conn = Connection(self, sock, path, headers)
+        with self.lock:
+            self.connections.append(conn)
+        if conn.is_account:
+            if 'api-signature' in headers:
+                conn.authorized = True
+                conn.send_json({'uri': 'connection', 'code': 'ok'})
+            else:
+                conn.send_json({'uri': 'connection', 'code': 'fail', 'message': 'missing signature'})
+        try:
+            while conn.alive:
+                opcode, payload = conn.recv_message()
+                conn.frames_received += 1
+                if opcode == OP_CLOSE:
+                    conn.close()
+                    break
+                if opcode == OP_PING:
+                    conn.send_frame(OP_PONG, payload)
+                    continue
+                if opcode == OP_PONG:
+                    continue
+                try:
+                    js = json.loads(payload.decode())
+                except ValueError:
+                    conn.send_json({'code': 'not-json', 'message': payload.decode(errors='replace')})
+                    continue
+                conn.received.append(js)
+                self._handle(conn, js)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            conn.alive = False
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _handle(self, conn, js):
+        for handler in self.handlers:
+            if handler(conn, js):
+                return
+        uri = js.get('uri')
+        if uri == 'ping':
+            if self.respond_pong:
+                conn.send_json({'uri': 'pong', 'uuid': js.get('uuid')})
+        elif uri == 'auth':
+            if self.auth_delay:
+                time.sleep(self.auth_delay)
+            conn.authorized = True
+            conn.send_json({'uri': 'auth', 'message': 'Auth succeed.'})
+        elif uri in ('sub-info', 'sub-order'):
+            conn.subscriptions.append(js)
+        elif uri and uri.startswith('subscribe-'):
+            contracts = js.get('contract')
+            if isinstance(contracts, list):
+                if len(contracts) > self.max_batch:
+                    conn.send_json({'uri': uri, 'code': 'too-many-contracts', 'message': len(contracts)})
+                    return
+                for contract in contracts:
+                    conn.subscriptions.append(dict(js, contract=contract))
+            else:
+                conn.subscriptions.append(js)
+            conn.send_json({'uri': uri, 'code': 'ok', 'message': 'subscribe succeed'})
+        elif uri and uri.startswith('unsubscribe-'):
+            sub = dict(js, uri=uri[2:])
+            conn.subscriptions = [s for s in conn.subscriptions if s != sub]
+            conn.send_json({'uri': uri, 'code': 'ok', 'message': 'unsubscribe succeed'})
+        else:
+            conn.send_json({'code': 'no-router-found', 'message': uri})
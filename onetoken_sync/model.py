@@ -1,21 +1,47 @@
+import copy
 import json
 import logging
 
 import arrow
 
+from .depth import Depth
+from .timeparse import parse_time
+
+
+class _TickBase:
+    __slots__ = ()
 
-class Tick:
     def copy(self):
-        return Tick(time=self.time,
-                    price=self.price,
-                    volume=self.volume,
-                    bids=json.loads(json.dumps(self.bids)),
-                    asks=json.loads(json.dumps(self.asks)),
-                    contract=self.contract,
-                    source=self.source,
-                    exchange_time=self.exchange_time,
-                    amount=self.amount,
-                    )
+        if self.depth is not None:
+            return self.from_depth(self.depth,
+                                   time=self.time,
+                                   price=self.price,
+                                   volume=self.volume,
+                                   contract=self.contract,
+                                   source=self.source,
+                                   exchange_time=self.exchange_time,
+                                   amount=self.amount,
+                                   )
+        if self.view is not None:
+            return self.from_view(self.view,
+                                  time=self.time,
+                                  price=self.price,
+                                  volume=self.volume,
+                                  contract=self.contract,
+                                  source=self.source,
+                                  exchange_time=self.exchange_time,
+                                  amount=self.amount,
+                                  )
+        return type(self)(time=self.time,
+                          price=self.price,
+                          volume=self.volume,
+                          bids=json.loads(json.dumps(self.bids)),
+                          asks=json.loads(json.dumps(self.asks)),
+                          contract=self.contract,
+                          source=self.source,
+                          exchange_time=self.exchange_time,
+                          amount=self.amount,
+                          )
 
     def __init__(self, time, price, volume=0, bids=None, asks=None, contract=None,
                  source=None,
@@ -35,7 +61,9 @@ class Tick:
         self.amount = amount
         self.bids = []
         self.asks = []
-        if isinstance(time, arrow.Arrow):
+        self.view = None
+        self.depth = None
+        if isinstance(exchange_time, arrow.Arrow):
             exchange_time = exchange_time.datetime
         if exchange_time:
             assert exchange_time.tzinfo
@@ -50,6 +78,78 @@ class Tick:
             assert 'price' in item and 'volume' in item
             # self.asks = asks
 
+    @classmethod
+    def from_view(cls, view, time, price, volume=0, contract=None, source=None, exchange_time=None, amount=None):
+        """
+        引用一个不可变的盘口快照(book.BookView)，bids / asks 直接共享快照里的档位，不做排序和拷贝
+        """
+        t = cls.__new__(cls)
+        t.contract = contract
+        t.source = source
+        t.time = time
+        t.price = price
+        t.volume = volume
+        t.amount = amount
+        t.exchange_time = exchange_time
+        t.view = view
+        t.depth = None
+        t.bids = view.bids
+        t.asks = view.asks
+        return t
+
+    @classmethod
+    def from_arrays(cls, time, price, bid_price, bid_volume, ask_price, ask_volume, volume=0, contract=None,
+                    source=None, exchange_time=None, amount=None):
+        """
+        用 numpy 数组表示盘口，bids / asks 只有在被访问时才会转换成 dict 列表
+        """
+        return cls.from_depth(Depth(bid_price, bid_volume, ask_price, ask_volume), time, price, volume, contract,
+                              source, exchange_time, amount)
+
+    @classmethod
+    def from_depth(cls, depth, time, price, volume=0, contract=None, source=None, exchange_time=None, amount=None):
+        if isinstance(time, arrow.Arrow):
+            time = time.datetime
+        assert time.tzinfo
+        t = cls.__new__(cls)
+        t.contract = contract
+        t.source = source
+        t.time = time
+        t.price = price
+        t.volume = volume
+        t.amount = amount
+        t.exchange_time = exchange_time
+        t.view = None
+        t.depth = depth
+        return t
+
+    def __getattr__(self, name):
+        # array-backed tick: bids / asks are materialized on first access
+        if name in ('bids', 'asks'):
+            depth = getattr(self, 'depth', None)
+            if depth is not None:
+                self.bids, self.asks = depth.to_levels()
+                return getattr(self, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def to_depth(self):
+        """
+        盘口的数组表示
+        :return: Depth
+        """
+        if self.depth is None:
+            return Depth.from_levels(self.bids, self.asks)
+        return self.depth
+
+    def cum_depth(self, bs):
+        return self.to_depth().cum_depth(bs)
+
+    def vwap(self, bs, size):
+        return self.to_depth().vwap(bs, size)
+
+    def imbalance(self, levels=None):
+        return self.to_depth().imbalance(levels)
+
     # last as an candidate of last
     @property
     def last(self):
@@ -61,18 +161,27 @@ class Tick:
 
     @property
     def bid1(self):
+        if self.depth is not None:
+            return self.depth.bid1
         if self.bids:
             return self.bids[0]['price']
         return None
 
     @property
     def ask1(self):
+        if self.depth is not None:
+            return self.depth.ask1
         if self.asks:
             return self.asks[0]['price']
         return None
 
     @property
     def weighted_middle(self):
+        if self.depth is not None:
+            d = self.depth
+            a = d.bid_price[0] * d.ask_volume[0]
+            b = d.ask_price[0] * d.bid_volume[0]
+            return float((a + b) / (d.ask_volume[0] + d.bid_volume[0]))
         a = self.bids[0]['price'] * self.asks[0]['volume']
         b = self.asks[0]['price'] * self.bids[0]['volume']
         return (a + b) / (self.asks[0]['volume'] + self.bids[0]['volume'])
@@ -99,9 +208,9 @@ class Tick:
     def __repr__(self):
         return str(self)
 
-    @staticmethod
-    def init_with_dict(dct):
-        return Tick(dct['time'], dct['price'], dct['volume'], dct['bids'], dct['asks'])
+    @classmethod
+    def init_with_dict(cls, dct):
+        return cls(dct['time'], dct['price'], dct['volume'], dct['bids'], dct['asks'])
 
     def to_dict(self):
         dct = {'time': self.time.isoformat(), 'price': self.price, 'volume': self.volume, 'asks': self.asks,
@@ -131,8 +240,8 @@ class Tick:
         lst = [self.contract, self.time.timestamp(), self.price, self.volume, b, a]
         return lst
 
-    @staticmethod
-    def from_short_list(lst):
+    @classmethod
+    def from_short_list(cls, lst):
         if isinstance(lst[0], str):
             # convert string to contract
             # lst[0] = ContractApi.get_by_symbol(lst[0])
@@ -142,7 +251,7 @@ class Tick:
         asks = [{'price': float(p), 'volume': float(v)} for p, v in zip(asks.split(',')[::2], asks.split(',')[1::2])]
 
         time = arrow.Arrow.fromtimestamp(lst[1]).datetime
-        return Tick(contract=lst[0], time=time, price=lst[2], volume=lst[3], bids=bids, asks=asks)
+        return cls(contract=lst[0], time=time, price=lst[2], volume=lst[3], bids=bids, asks=asks)
 
     def to_ws_str(self):
         lst = self.to_short_list()
@@ -155,17 +264,17 @@ class Tick:
         d = dict_or_str
         exg_tm = d.get('exchange_time', None)
         if exg_tm is not None:
-            exg_tm = arrow.get(exg_tm)
-        t = Tick(time=arrow.get(d['time']),
-                 exchange_time=exg_tm,
-                 # contract=ContractApi.get_by_symbol(d['contract']),
-                 contract=d['contract'],
-                 volume=d['volume'],
-                 asks=d['asks'],
-                 bids=d['bids'],
-                 price=d['last'],
-                 source=d.get('source', None),
-                 )
+            exg_tm = parse_time(exg_tm)
+        t = cls(time=parse_time(d['time']),
+                exchange_time=exg_tm,
+                # contract=ContractApi.get_by_symbol(d['contract']),
+                contract=d['contract'],
+                volume=d['volume'],
+                asks=d['asks'],
+                bids=d['bids'],
+                price=d['last'],
+                source=d.get('source', None),
+                )
         return t
 
     def bs1(self, bs):
@@ -175,6 +284,63 @@ class Tick:
             return self.ask1
 
 
+class Tick(_TickBase):
+    pass
+
+
+class LazyTick(Tick):
+    """
+    引用推送的原始 dict，time / exchange_time / bids / asks 在第一次访问时才解析
+    只读取 contract 和 last 的回调不需要付出解析时间和排序盘口的开销
+    """
+
+    @classmethod
+    def from_dict(cls, dict_or_str):
+        if isinstance(dict_or_str, str):
+            dict_or_str = json.loads(dict_or_str)
+        d = dict_or_str
+        t = cls.__new__(cls)
+        t.raw = d
+        t.contract = d['contract']
+        t.price = d['last']
+        t.volume = d['volume']
+        t.source = d.get('source', None)
+        t.amount = None
+        t.view = None
+        t.depth = None
+        return t
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('raw')
+        if raw is None:
+            return super().__getattr__(name)
+        if name == 'time':
+            self.time = parse_time(raw['time'])
+            return self.time
+        if name == 'exchange_time':
+            exg_tm = raw.get('exchange_time', None)
+            self.exchange_time = parse_time(exg_tm) if exg_tm is not None else None
+            return self.exchange_time
+        if name in ('bids', 'asks'):
+            side = raw[name]
+            for item in side:
+                assert 'price' in item and 'volume' in item
+            if name == 'bids':
+                self.bids = sorted(side, key=lambda x: -x['price'])
+            else:
+                self.asks = sorted(side, key=lambda x: x['price'])
+            return getattr(self, name)
+        return super().__getattr__(name)
+
+
+class CompactTick(_TickBase):
+    """
+    和 Tick 接口一致，使用 __slots__ 节省内存
+    """
+    __slots__ = ('contract', 'source', 'time', 'price', 'volume', 'amount', 'exchange_time', 'bids', 'asks', 'view',
+                 'depth')
+
+
 class Contract:
 
     def __init__(self, exchange: str, name: str, min_change=0.001, alias="", category='XTC', first_day=None,
@@ -235,6 +401,36 @@ class Info:
         # ['position_dict']
         self.position_dict = {item['contract']: item for item in data.get('position', [])}
 
+    def update(self, data):
+        """
+        用新的账户信息原地更新，position_dict 里已有的持仓 dict 保持同一个对象，只更新推送里的字段
+        新出现的持仓保存一份浅拷贝，不会引用(也不会修改)传入的 dict
+        :param data: 账户信息 dict
+        """
+        assert isinstance(data, dict)
+        position_dict = self.position_dict
+        positions = []
+        for item in data.get('position', []):
+            old = position_dict.get(item['contract'])
+            if old is None:
+                old = position_dict[item['contract']] = dict(item)
+            else:
+                old.update(item)
+            positions.append(old)
+        if len(position_dict) != len(positions):
+            keep = {item['contract'] for item in positions}
+            for contract in [c for c in position_dict if c not in keep]:
+                del position_dict[contract]
+        self.data.clear()
+        self.data.update(data)
+        self.data['position'] = positions
+
+    def copy(self):
+        """
+        :return: 和当前内容一致、互不影响的 Info
+        """
+        return Info(copy.deepcopy(self.data))
+
     @property
     def balance(self):
         return self.data['balance']
@@ -286,7 +482,9 @@ class Info:
         return json.dumps(self.data)
 
 
-class Order:
+class _OrderBase:
+    __slots__ = ()
+
     BUY = 'b'
     SELL = 's'
 
@@ -323,27 +521,27 @@ class Order:
         self.tags = tags if tags else {}
         self.options = options if options else {}
 
-    @staticmethod
-    def from_dict(dct) -> 'Order':
-        o = Order(contract_symbol=dct['contract'],
-                  entrust_price=dct['entrust_price'],
-                  average_dealt_price=dct.get('average_dealt_price', 0),
-                  bs=dct['bs'],
-                  entrust_amount=dct['entrust_amount'],
-                  entrust_time=arrow.get(dct['entrust_time']).datetime,
-                  account_symbol=dct['account'],
-                  last_update=arrow.get(dct['last_update']).datetime,
-                  exg_oid=dct['exchange_oid'],
-                  client_oid=dct['client_oid'],
-                  status=dct['status'],
-                  version=dct['version'],
-                  dealt_amount=dct.get('dealt_amount', 0),
-                  last_dealt_amount=dct.get('last_dealt_amount', 0),
-                  commission=dct.get('commission', 0),
-                  tags=dct.get('tags', {}),
-                  options=dct.get('options', {}),
-                  comment=dct.get('comment', '')
-                  )
+    @classmethod
+    def from_dict(cls, dct) -> 'Order':
+        o = cls(contract_symbol=dct['contract'],
+                entrust_price=dct['entrust_price'],
+                average_dealt_price=dct.get('average_dealt_price', 0),
+                bs=dct['bs'],
+                entrust_amount=dct['entrust_amount'],
+                entrust_time=parse_time(dct['entrust_time']),
+                account_symbol=dct['account'],
+                last_update=parse_time(dct['last_update']),
+                exg_oid=dct['exchange_oid'],
+                client_oid=dct['client_oid'],
+                status=dct['status'],
+                version=dct['version'],
+                dealt_amount=dct.get('dealt_amount', 0),
+                last_dealt_amount=dct.get('last_dealt_amount', 0),
+                commission=dct.get('commission', 0),
+                tags=dct.get('tags', {}),
+                options=dct.get('options', {}),
+                comment=dct.get('comment', '')
+                )
         return o
 
     def __str__(self):
@@ -385,7 +583,22 @@ class Order:
     ALL_STATUSES.extend(END_STATUSES)
 
 
-class Candle:
+class Order(_OrderBase):
+    pass
+
+
+class CompactOrder(_OrderBase):
+    """
+    和 Order 接口一致，使用 __slots__ 节省内存
+    """
+    __slots__ = ('bs', 'entrust_price', 'entrust_amount', 'contract_symbol', 'account', 'exchange_oid', 'client_oid',
+                 'entrust_time', 'last_update', 'comment', 'status', 'version', 'last_dealt_amount',
+                 'avg_dealt_price', 'dealt_amount', 'commission', 'tags', 'options')
+
+
+class _CandleBase:
+    __slots__ = ()
+
     def __init__(self, time, open, high, low, close, volume, contract, duration, amount=None):
         self.contract = contract
         self.time = time
@@ -397,6 +610,20 @@ class Candle:
         self.amount = amount
         self.duration = duration
 
+    @property
+    def time(self):
+        """
+        from_dict 得到的 K 线在第一次访问时才把 datetime 转换成 arrow.Arrow
+        """
+        if self._time is None and self._dt is not None:
+            self._time = arrow.Arrow.fromdatetime(self._dt)
+        return self._time
+
+    @time.setter
+    def time(self, value):
+        self._time = value
+        self._dt = None
+
     def __str__(self):
         return '<Candle-{}:{}-{} {} {} {} {} {} {}>'.format(self.duration, self.contract,
                                                             self.time.strftime('%H:%M:%S'),
@@ -406,13 +633,36 @@ class Candle:
     def __repr__(self):
         return self.__str__()
 
+    @classmethod
+    def from_datetime(cls, dt, *args, **kwargs):
+        """
+        用带时区的 datetime 创建 K 线，time 在访问时才转换成 arrow.Arrow，和 from_dict 得到的 K 线一致
+        """
+        candle = cls(None, *args, **kwargs)
+        candle._dt = dt
+        return candle
+
     @classmethod
     def from_dict(cls, data):
-        return cls(arrow.get(data['time']), data['open'], data['high'], data['low'],
-                   data['close'], data['volume'], data['contract'], data['duration'], data.get('amount', None))
+        return cls.from_datetime(parse_time(data['time']), data['open'], data['high'], data['low'],
+                                 data['close'], data['volume'], data['contract'], data['duration'],
+                                 data.get('amount', None))
+
 
+class Candle(_CandleBase):
+    pass
+
+
+class CompactCandle(_CandleBase):
+    """
+    和 Candle 接口一致，使用 __slots__ 节省内存
+    """
+    __slots__ = ('contract', '_time', '_dt', 'open', 'high', 'low', 'close', 'volume', 'amount', 'duration')
+
+
+class _ZhubiBase:
+    __slots__ = ()
 
-class Zhubi:
     def __init__(self, time, exchange_time, contract, price, amount, bs):
         self.contract = contract
         self.time = time
@@ -429,11 +679,22 @@ class Zhubi:
 
     @classmethod
     def from_dict(cls, data):
-        return cls(arrow.get(data['time']).datetime, arrow.get(data['exchange_time']).datetime, data['contract'],
+        return cls(parse_time(data['time']), parse_time(data['exchange_time']), data['contract'],
                    data['price'],
                    data['amount'], data['bs'])
 
 
+class Zhubi(_ZhubiBase):
+    pass
+
+
+class CompactZhubi(_ZhubiBase):
+    """
+    和 Zhubi 接口一致，使用 __slots__ 节省内存
+    """
+    __slots__ = ('contract', 'time', 'exchange_time', 'price', 'amount', 'bs')
+
+
 class Error:
 
     def __init__(self, code, message='', status=400, data=None):
@@ -0,0 +1,183 @@
+import _thread as thread
+import collections
+
+from .logger import log
+from .model import Order
+
+
+class OrderStore:
+    """
+    本地维护的自己的订单，由 AccountWs 的订单推送更新，按 client_oid / exchange_oid / contract / status 建立索引
+
+        store = acc.track_orders()
+        store.get(client_oid=oid)
+        store.active('binance/btc.usdt')
+
+    推送的 version 比本地旧的更新会被丢弃；REST 只在 reconcile 时使用
+    """
+
+    def __init__(self, keep_ended=1000):
+        """
+        :param keep_ended: 最多保留多少个已经结束的订单，超过时删除最早结束的
+        """
+        self.keep_ended = keep_ended
+        self.lock = thread.allocate_lock()
+        self.orders = {}  # key -> Order
+        self.by_client_oid = {}
+        self.by_exchange_oid = {}
+        self.by_contract = collections.defaultdict(dict)  # contract -> {key: Order}
+        self.by_status = collections.defaultdict(dict)  # status -> {key: Order}
+        self._ended = collections.OrderedDict()
+        self.lost = collections.OrderedDict()  # key -> Order，reconcile 时 REST 已经查不到的未结束订单
+        self.updates = 0
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __call__(self, order):
+        self.update(order)
+
+    def _find_key(self, client_oid, exchange_oid):
+        if client_oid and client_oid in self.by_client_oid:
+            return self.by_client_oid[client_oid]
+        if exchange_oid and exchange_oid in self.by_exchange_oid:
+            return self.by_exchange_oid[exchange_oid]
+        return None
+
+    def update(self, order):
+        """
+        :param order: 推送的订单 dict 或者 Order
+        :return: True 表示已经更新，False 表示是过期的推送
+        """
+        if isinstance(order, dict):
+            order = Order.from_dict(order)
+        with self.lock:
+            key = self._find_key(order.client_oid, order.exchange_oid)
+            old = self.orders.get(key) if key is not None else None
+            if old is not None and order.version < old.version:
+                self.stale += 1
+                log.debug('stale order update', order.client_oid, version=order.version, current=old.version)
+                return False
+            if old is not None:
+                self._unindex(key, old)
+            else:
+                key = order.client_oid or order.exchange_oid
+                self.lost.pop(key, None)
+            self._index(key, order)
+            self.updates += 1
+            if order.status in Order.END_STATUSES:
+                self._ended[key] = None
+                self._ended.move_to_end(key)
+                while len(self._ended) > self.keep_ended:
+                    k, _ = self._ended.popitem(last=False)
+                    self._unindex(k, self.orders.pop(k))
+            return True
+
+    def _index(self, key, order):
+        self.orders[key] = order
+        if order.client_oid:
+            self.by_client_oid[order.client_oid] = key
+        if order.exchange_oid:
+            self.by_exchange_oid[order.exchange_oid] = key
+        self.by_contract[order.contract_symbol][key] = order
+        self.by_status[order.status][key] = order
+
+    def _unindex(self, key, order):
+        self.by_client_oid.pop(order.client_oid, None)
+        self.by_exchange_oid.pop(order.exchange_oid, None)
+        self.by_contract[order.contract_symbol].pop(key, None)
+        self.by_status[order.status].pop(key, None)
+        self._ended.pop(key, None)
+
+    def get(self, client_oid=None, exchange_oid=None):
+        """
+        :return: Order，没有时返回 None
+        """
+        with self.lock:
+            key = self._find_key(client_oid, exchange_oid)
+            return self.orders.get(key) if key is not None else None
+
+    def find(self, contract=None, status=None):
+        """
+        :param contract: 交易对 binance/btc.usdt
+        :param status: 订单状态，或者 active / end 表示所有未结束 / 已结束的状态
+        :return: [Order, ...]
+        """
+        if status == Order.ACTIVE:
+            statuses = Order.ACTIVE_STATUS
+        elif status == Order.END:
+            statuses = Order.END_STATUSES
+        elif status is None:
+            statuses = None
+        else:
+            statuses = [status]
+        with self.lock:
+            if contract is not None:
+                orders = list(self.by_contract.get(contract, {}).values())
+                if statuses is not None:
+                    orders = [o for o in orders if o.status in statuses]
+                return orders
+            if statuses is None:
+                return list(self.orders.values())
+            return [o for s in statuses for o in self.by_status.get(s, {}).values()]
+
+    def active(self, contract=None):
+        return self.find(contract, Order.ACTIVE)
+
+    def _retire(self, exchange_oid):
+        with self.lock:
+            key = self.by_exchange_oid.get(exchange_oid)
+            order = self.orders.get(key) if key is not None else None
+            if order is None or order.status not in Order.ACTIVE_STATUS:
+                return None
+            del self.orders[key]
+            self._unindex(key, order)
+            self.lost[key] = order
+            while len(self.lost) > self.keep_ended:
+                self.lost.popitem(last=False)
+            return order
+
+    def reconcile(self, account, contract=None):
+        """
+        用 REST 校对本地的订单：同步 pending list，本地未结束但是不在 pending list 里的订单单独查询最新状态
+        单独查询也查不到的订单从 store 里移到 lost，不再算作未结束的订单
+        :param account: Account
+        :param contract: 只校对这个交易对
+        :return: 更新的订单数量, Error
+        """
+        pending, err = account.get_pending_list(contract)
+        if err:
+            return 0, err
+        changed = 0
+        seen = set()
+        for dct in pending:
+            order = Order.from_dict(dct)
+            seen.add(order.exchange_oid)
+            current = self.get(order.client_oid, order.exchange_oid)
+            if current is None or current.version != order.version:
+                changed += self.update(order)
+        missing = [o.exchange_oid for o in self.active(contract) if o.exchange_oid and o.exchange_oid not in seen]
+        if missing:
+            res, err = account.get_order_use_exchange_oid(*missing)
+            if err:
+                return changed, err
+            found = set()
+            for dct in res:
+                found.add(dct.get('exchange_oid'))
+                changed += self.update(dct)
+            for exchange_oid in missing:
+                if exchange_oid not in found and self._retire(exchange_oid) is not None:
+                    log.warning('order not found when reconciling, mark as lost', account, exchange_oid)
+                    changed += 1
+        if changed:
+            log.info('reconcile orders', account, changed=changed)
+        return changed, None
+
+    def stats(self):
+        with self.lock:
+            return {'orders': len(self.orders),
+                    'active': sum(len(self.by_status.get(s, ())) for s in Order.ACTIVE_STATUS),
+                    'updates': self.updates,
+                    'stale': self.stale,
+                    'lost': len(self.lost)}
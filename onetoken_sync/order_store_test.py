@@ -0,0 +1,77 @@
+from .model import Order
+from .order_store import OrderStore
+
+contract = 'binance/btc.usdt'
+
+
+def push(client_oid, status, version, exchange_oid=None, con=contract):
+    return {'contract': con, 'entrust_price': 100, 'bs': 'b', 'entrust_amount': 1,
+            'entrust_time': '2019-11-29T08:00:00+08:00', 'last_update': '2019-11-29T08:00:01+08:00',
+            'account': 'binance/test', 'exchange_oid': exchange_oid, 'client_oid': client_oid, 'status': status,
+            'version': version}
+
+
+def test_update_and_indexes():
+    store = OrderStore()
+    assert store.update(push('c1', Order.WAITING, 0))
+    assert store.update(push('c1', Order.PENDING, 1, 'e1'))
+    assert store.update(push('c2', Order.PENDING, 1, 'e2', con='binance/eth.usdt'))
+    assert store.get(exchange_oid='e1') is store.get(client_oid='c1')
+    assert store.get(client_oid='c1').status == Order.PENDING
+    assert [o.client_oid for o in store.active(contract)] == ['c1']
+    assert len(store.find(status=Order.PENDING)) == 2
+
+    # 乱序到达的旧推送
+    assert not store.update(push('c1', Order.WAITING, 0))
+    assert store.get(client_oid='c1').version == 1
+    store(push('c1', Order.DEALT, 2, 'e1'))
+    assert store.active(contract) == [] and len(store.find(contract, Order.END)) == 1
+    assert store.stats() == {'orders': 2, 'active': 1, 'updates': 4, 'stale': 1, 'lost': 0}
+
+
+def test_keep_ended():
+    store = OrderStore(keep_ended=2)
+    for i in range(4):
+        store.update(push('c{}'.format(i), Order.WITHDRAWN, 1, 'e{}'.format(i)))
+    store.update(push('active', Order.PENDING, 1, 'ea'))
+    assert len(store) == 3
+    assert store.get(client_oid='c0') is None and store.get(exchange_oid='e3').client_oid == 'c3'
+
+
+class FakeAccount:
+    def __init__(self, pending, queried):
+        self.pending = pending
+        self.queried = queried
+
+    def get_pending_list(self, contract=None):
+        return self.pending, None
+
+    def get_order_use_exchange_oid(self, *oids):
+        return [self.queried[oid] for oid in oids if oid in self.queried], None
+
+
+def test_reconcile():
+    store = OrderStore()
+    store.update(push('c1', Order.PENDING, 1, 'e1'))
+    store.update(push('c2', Order.PENDING, 1, 'e2'))
+    acc = FakeAccount([push('c1', Order.PART_DEAL_PENDING, 2, 'e1'), push('c3', Order.PENDING, 1, 'e3')],
+                      {'e2': push('c2', Order.WITHDRAWN, 2, 'e2')})
+    changed, err = store.reconcile(acc)
+    assert not err and changed == 3
+    assert sorted(o.client_oid for o in store.active()) == ['c1', 'c3']
+    assert store.get(client_oid='c2').status == Order.WITHDRAWN
+    assert store.reconcile(FakeAccount(acc.pending, {})) == (0, None)
+
+
+def test_reconcile_retires_lost_orders():
+    store = OrderStore()
+    store.update(push('c1', Order.PENDING, 1, 'e1'))
+    store.update(push('c2', Order.PENDING, 1, 'e2'))
+    changed, err = store.reconcile(FakeAccount([push('c1', Order.PENDING, 1, 'e1')], {}))
+    assert not err and changed == 1
+    assert [o.client_oid for o in store.active()] == ['c1']
+    assert store.get(client_oid='c2') is None and list(store.lost) == ['c2']
+    assert store.stats()['lost'] == 1
+    # 之后又收到了推送
+    store.update(push('c2', Order.DEALT, 2, 'e2'))
+    assert store.get(exchange_oid='e2').status == Order.DEALT and not store.lost
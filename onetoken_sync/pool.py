@@ -0,0 +1,267 @@
+import _thread as thread
+import bisect
+import hashlib
+import time
+
+from .config import Config
+from .logger import log
+from .quote import TickQuote
+
+
+class HashRing:
+    """
+    一致性哈希，节点增减时只有少量 contract 需要迁移
+    """
+
+    def __init__(self, nodes, replicas=64):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            h = self._hash('{}#{}'.format(node, i))
+            idx = bisect.bisect(self._keys, h)
+            self._keys.insert(idx, h)
+            self._nodes.insert(idx, node)
+
+    def remove(self, node):
+        keep = [(h, n) for h, n in zip(self._keys, self._nodes) if n != node]
+        self._keys = [h for h, _ in keep]
+        self._nodes = [n for _, n in keep]
+
+    def get(self, key):
+        if not self._keys:
+            return None
+        idx = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[idx]
+
+
+class TickQuotePool:
+    """
+    多个 TickQuote 连接组成的连接池，订阅的 contract 自动分配到各个连接上
+
+        pool = TickQuotePool('default', size=4)
+        pool.run()
+        pool.subscribe_tick('huobip/btc.usdt', on_update)
+
+    placement 为 hash 时按一致性哈希分配，为 rate 时分配到最近消息速率最低的连接
+    某个连接的接收延迟比最快的连接高出 max_lag 秒时，把它上面最繁忙的 contract 迁移到其他连接
+    """
+    HASH = 'hash'
+    RATE = 'rate'
+
+    def __init__(self, key='default', size=None, placement=HASH, workers=None, max_lag=None,
+                 rebalance_interval=None):
+        """
+        :param key: 连接池名称，每个连接的 key 为 {key}-{i}
+        :param size: 连接数量
+        :param placement: hash / rate
+        :param workers: 每个连接处理回调的线程数量
+        :param max_lag: 触发迁移的延迟差(秒)
+        :param rebalance_interval: 检查是否需要迁移的间隔(秒)，0 表示不自动检查
+        """
+        if placement not in (self.HASH, self.RATE):
+            raise ValueError('unknown placement {}, should be hash/rate'.format(placement))
+        self.key = key
+        self.size = size or Config.QUOTE_POOL_SIZE
+        self.placement = placement
+        self.max_lag = Config.QUOTE_POOL_MAX_LAG if max_lag is None else max_lag
+        self.rebalance_interval = Config.QUOTE_POOL_REBALANCE_INTERVAL if rebalance_interval is None \
+            else rebalance_interval
+        self.clients = [TickQuote('{}-{}'.format(key, i), workers) for i in range(self.size)]
+        self.ring = HashRing(range(self.size))
+        self.lock = thread.allocate_lock()
+        self.assigned = {}  # contract -> 连接序号
+        self.handlers = {}  # contract -> [(on_update, policy), ...]
+        self.rates = {}  # contract -> 最近的消息速率(条/秒)
+        self.moves = 0
+        self.is_running = False
+        self._last_received = {}
+        self._last_check = time.time()
+
+    def client_for(self, contract):
+        """
+        :param contract: 交易对
+        :return: 负责这个 contract 的 TickQuote，还没有订阅时返回 None
+        """
+        idx = self.assigned.get(contract)
+        return None if idx is None else self.clients[idx]
+
+    def _place(self, contract):
+        # 调用方持有 self.lock
+        if self.placement == self.HASH:
+            return self.ring.get(contract)
+        loads = self.loads(self.assigned)
+        counts = [0] * self.size
+        for idx in self.assigned.values():
+            counts[idx] += 1
+        return min(range(self.size), key=lambda i: (loads[i], counts[i]))
+
+    def _assigned(self):
+        with self.lock:
+            return dict(self.assigned)
+
+    def subscribe_tick(self, contract, on_update, policy=None):
+        # 订阅、取消订阅和迁移都在 self.lock 里操作连接，保证 assigned 和连接上实际的订阅一致
+        with self.lock:
+            idx = self.assigned.get(contract)
+            if idx is None:
+                idx = self._place(contract)
+                self.assigned[contract] = idx
+            self.handlers.setdefault(contract, []).append((on_update, policy))
+            self.clients[idx].subscribe_tick(contract, on_update, policy)
+
+    def unsubscribe_tick(self, contract):
+        with self.lock:
+            idx = self.assigned.pop(contract, None)
+            self.handlers.pop(contract, None)
+            self.rates.pop(contract, None)
+            if idx is not None:
+                self.clients[idx].unsubscribe_tick(contract)
+
+    def move(self, contract, dest):
+        """
+        把 contract 迁移到第 dest 个连接上，回调和投递策略保持不变
+        :return: 已经取消订阅或者已经在 dest 上时返回 False
+        """
+        with self.lock:
+            src = self.assigned.get(contract)
+            if src is None or src == dest:
+                return False
+            self.assigned[contract] = dest
+            # 先在新连接上订阅再取消旧连接，迁移期间可能收到重复的 tick，但不会漏掉
+            for on_update, policy in self.handlers[contract]:
+                self.clients[dest].subscribe_tick(contract, on_update, policy)
+            self.clients[src].unsubscribe_tick(contract)
+        self.moves += 1
+        log.info('move', contract, src=src, dest=dest)
+        return True
+
+    def measure(self):
+        """
+        根据每个订阅收到的数据数量更新 contract 的消息速率
+        :return: {contract: 条/秒}
+        """
+        now = time.time()
+        elapsed = max(now - self._last_check, 1e-6)
+        received = {}
+        for contract, idx in self._assigned().items():
+            client = self.clients[idx]
+            ch = client.data_queue.get(client.key_of({'contract': contract, 'uri': client.channel}))
+            received[contract] = ch.received if ch else 0
+        rates = {}
+        for contract, n in received.items():
+            last = self._last_received.get(contract, 0)
+            # 迁移之后 Channel 是新建的，计数会变小
+            rates[contract] = (n - last if n >= last else n) / elapsed
+        self.rates = rates
+        self._last_received = received
+        self._last_check = now
+        return rates
+
+    def loads(self, assigned=None):
+        """
+        :param assigned: contract -> 连接序号，默认取当前的分配
+        :return: 每个连接最近的消息速率
+        """
+        if assigned is None:
+            assigned = self._assigned()
+        loads = [0.0] * self.size
+        for contract, rate in list(self.rates.items()):
+            idx = assigned.get(contract)
+            if idx is not None:
+                loads[idx] += rate
+        return loads
+
+    def rebalance(self):
+        """
+        接收延迟明显落后的连接，按消息速率从高到低把 contract 迁出，直到它的负载不高于平均值
+        :return: [(contract, src, dest), ...]
+        """
+        self.measure()
+        lags = [c.lag for c in self.clients]
+        measured = [lag for lag in lags if lag is not None]
+        if len(measured) < 2:
+            return []
+        # 只比较连接之间的差值，本地时钟和服务器时钟的偏差会被抵消
+        fastest = min(measured)
+        assigned = self._assigned()
+        loads = self.loads(assigned)
+        average = sum(loads) / self.size
+        moves = []
+        for src, lag in enumerate(lags):
+            if lag is None or lag - fastest <= self.max_lag:
+                continue
+            contracts = sorted((c for c, idx in assigned.items() if idx == src),
+                               key=lambda c: self.rates.get(c, 0), reverse=True)
+            for contract in contracts[:-1]:
+                if loads[src] <= average:
+                    break
+                dest = min((i for i in range(self.size) if i != src), key=lambda i: loads[i])
+                rate = self.rates.get(contract, 0)
+                if loads[dest] + rate >= loads[src]:
+                    continue
+                if self.move(contract, dest):
+                    loads[src] -= rate
+                    loads[dest] += rate
+                    moves.append((contract, src, dest))
+            # 迁移之后重新测量
+            self.clients[src].lag = None
+        return moves
+
+    def stats(self):
+        """
+        每个连接的订阅数量、消息速率和接收延迟
+        :return: [dict, ...]
+        """
+        assigned = self._assigned()
+        loads = self.loads(assigned)
+        result = []
+        for i, client in enumerate(self.clients):
+            result.append({'key': client.key,
+                           'contracts': sum(1 for idx in assigned.values() if idx == i),
+                           'rate': loads[i],
+                           'lag': client.lag,
+                           'messages': client.messages})
+        return result
+
+    def run(self):
+        """
+        运行所有连接，rebalance_interval 大于 0 时启动自动迁移
+        :return: None
+        """
+        if self.is_running:
+            log.warning('pool is already running')
+            return
+        self.is_running = True
+        for client in self.clients:
+            client.run()
+        if self.rebalance_interval:
+            thread.start_new_thread(self._rebalance_loop, ())
+
+    def _rebalance_loop(self):
+        while self.is_running:
+            time.sleep(self.rebalance_interval)
+            if not self.is_running:
+                break
+            try:
+                self.rebalance()
+            except:
+                log.exception('rebalance fail')
+
+    def close(self):
+        self.is_running = False
+        for client in self.clients:
+            if client.is_running:
+                client.close()
+        with self.lock:
+            self.assigned = {}
+            self.handlers = {}
+            self.rates = {}
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from .pool import HashRing, TickQuotePool
+
+contracts = ['huobip/c{}.usdt'.format(i) for i in range(40)]
+
+
+def tick(contract):
+    return {'uri': 'single-tick-verbose',
+            'data': {'contract': contract, 'last': 1, 'volume': 1, 'time': '2019-11-29T08:00:00+08:00',
+                     'bids': [], 'asks': []}}
+
+
+@pytest.fixture
+def pool(server):
+    p = TickQuotePool('test', size=3, rebalance_interval=0)
+    for client in p.clients:
+        client.ws_url = server.url('/api/v1/ws/tick?gzip=true')
+    yield p
+    p.close()
+
+
+def test_hash_ring_stable():
+    ring = HashRing(range(4))
+    before = {c: ring.get(c) for c in contracts}
+    assert len(set(before.values())) == 4
+    ring.add(4)
+    after = {c: ring.get(c) for c in contracts}
+    moved = [c for c in contracts if before[c] != after[c]]
+    assert all(after[c] == 4 for c in moved)
+    assert len(moved) < len(contracts) / 2
+
+
+def test_subscribe_and_move(server, pool):
+    got = []
+    received = threading.Event()
+
+    def on_update(t):
+        got.append(t)
+        received.set()
+
+    for c in contracts:
+        pool.subscribe_tick(c, on_update)
+    pool.run()
+    assert server.wait_for(lambda: len(server.subscriptions) == len(contracts))
+    assert sorted(s['contracts'] for s in pool.stats()) != [0, 0, len(contracts)]
+
+    contract = contracts[0]
+    src = pool.assigned[contract]
+    dest = (src + 1) % pool.size
+    assert pool.move(contract, dest)
+    assert pool.client_for(contract) is pool.clients[dest]
+    assert server.wait_for(lambda: [s['contract'] for s in server.subscriptions].count(contract) == 1)
+    server.push(tick(contract))
+    assert received.wait(5)
+    assert got[0].contract == contract
+    assert pool.clients[dest].messages == 1
+
+
+def test_rebalance_moves_hot_contracts(pool):
+    for c in contracts:
+        pool.subscribe_tick(c, lambda t: None)
+    src = pool.assigned[contracts[0]]
+    on_src = [c for c in contracts if pool.assigned[c] == src]
+    pool.measure = lambda: None
+    pool.rates = {c: (100 if c in on_src[:3] else 1) for c in contracts}
+    for client in pool.clients:
+        client.lag = 0.1
+    pool.clients[src].lag = 5
+    moves = pool.rebalance()
+    assert moves and all(m[1] == src for m in moves)
+    assert {m[0] for m in moves} <= set(on_src[:3])
+    loads = pool.loads()
+    assert loads[src] <= max(loads)
+
+
+def test_move_racing_unsubscribe(pool):
+    contract = contracts[0]
+    pool.subscribe_tick(contract, lambda t: None)
+    src = pool.assigned[contract]
+    dest = (src + 1) % pool.size
+    client = pool.clients[dest]
+    subscribe = client.subscribe_tick
+    t = threading.Thread(target=pool.unsubscribe_tick, args=(contract,))
+
+    def slow_subscribe(*args):
+        # 在目标连接订阅之前，另一个线程取消了订阅
+        t.start()
+        t.join(0.1)
+        subscribe(*args)
+
+    client.subscribe_tick = slow_subscribe
+    pool.move(contract, dest)
+    t.join()
+    assert contract not in pool.assigned
+    assert all(not c.data_queue for c in pool.clients)
+
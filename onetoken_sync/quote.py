@@ -1,28 +1,44 @@
-import json
 from collections import defaultdict
 import time
 import _thread as thread
-import queue
-import arrow
+import threading
 import websocket
 from websocket import ABNF
+from . import codec
+from .book import OrderBook
 from .config import Config
+from .dispatch import ALL, Dispatcher
 from .logger import log
-from .model import Tick, Contract, Candle, Zhubi
+from .model import Tick, LazyTick, Contract, Candle, Zhubi
+from .timeparse import parse_time
 
 
 class Quote:
-    def __init__(self, key, ws_url, data_parser):
+    track_lag = False  # 推送的数据带有 time 时统计接收延迟
+
+    def __init__(self, key, ws_url, data_parser, workers=None):
         self.key = key
         self.ws_url = ws_url
         self.data_parser = data_parser
+        self.channel = None
         self.ws = None
         self.queue_handlers = defaultdict(list)
         self.data_queue = {}
+        self.subscriptions = {}  # q_key -> sub_data，重连之后按这里的内容重新订阅
         self.authorized = False
+        self.auth_event = threading.Event()
         self.lock = thread.allocate_lock()
         self.pong = 0
         self.is_running = False
+        self.decoder = codec.GzipDecoder()
+        self.dispatcher = Dispatcher(self.dispatch, workers or Config.QUOTE_WORKERS)
+        self.connected_at = None
+        self.auth_latency = None
+        self.first_data_latency = {}
+        self._waiting_first_data = set()
+        self.messages = 0
+        self.lag = None
+        self.frame_recorder = None  # recorder.FrameRecorder，设置之后原样记录收到的每一帧
 
     def ws_connect(self):
         log.debug('Connecting to {}'.format(self.ws_url))
@@ -31,11 +47,12 @@ class Quote:
             try:
                 if self.ws:
                     self.ws.close()
+                # websocket-client 0.x 调用 bound method 时不传 ws，1.x 总是传 ws，这里统一成不传
                 self.ws = websocket.WebSocketApp(self.ws_url,
-                                                 on_open=self.on_open,
-                                                 on_data=self.on_data,
-                                                 on_error=self.on_error,
-                                                 on_close=self.on_close)
+                                                 on_open=lambda ws: self.on_open(),
+                                                 on_data=lambda ws, *args: self.on_data(*args),
+                                                 on_error=lambda ws, error: self.on_error(error),
+                                                 on_close=lambda ws, *args: self.on_close())
             except Exception as e:
                 try:
                     self.ws.close()
@@ -63,7 +80,7 @@ class Quote:
         :param js: dict
         :return: None
         """
-        self.ws.send(json.dumps(js))
+        self.ws.send(codec.dumps(js))
 
     def heart_beat_loop(self):
         def run():
@@ -82,54 +99,130 @@ class Quote:
 
     def on_data(self, msg, msg_type, *args):
         try:
+            if self.frame_recorder is not None:
+                self.frame_recorder.write(msg, msg_type)
             if msg_type == ABNF.OPCODE_BINARY or msg_type == ABNF.OPCODE_TEXT:
-                import gzip
                 if msg_type == ABNF.OPCODE_TEXT:
-                    data = json.loads(msg)
+                    data = codec.loads(msg)
                 else:
-                    data = json.loads(gzip.decompress(msg).decode())
+                    data = self.decoder.loads(msg)
                 uri = data.get('uri', 'data')
                 if uri == 'pong':
-                    self.pong = arrow.now().timestamp
+                    self.pong = time.time()
                 elif uri == 'auth':
                     log.info(data)
-                    self.authorized = True
+                    self.on_auth()
                 elif uri == 'subscribe-single-tick-verbose':
                     log.info(data)
                 elif uri == 'subscribe-single-zhubi-verbose':
                     log.info(data)
                 elif uri == 'subscribe-single-candle':
                     log.info(data)
+                elif uri.startswith('unsubscribe-'):
+                    log.info(data)
                 else:
                     q_key, parsed_data = self.data_parser(data)
                     if q_key is None:
                         log.warning('unknown message', data)
                         return
+                    self.messages += 1
+                    if parsed_data is None:
+                        # 解析时没有人订阅，跳过了解析
+                        return
                     if q_key in self.data_queue:
                         self.data_queue[q_key].put(parsed_data)
+                        # 抽样统计延迟，LazyTick 不需要每一条都解析 time
+                        if self.track_lag and self.messages & 7 == 1:
+                            self._update_lag(parsed_data.time)
+                        if self._waiting_first_data and q_key in self._waiting_first_data:
+                            self._waiting_first_data.discard(q_key)
+                            self.first_data_latency[q_key] = time.time() - self.connected_at
         except Exception as e:
             log.warning('msg error...', e)
 
+    def _update_lag(self, data_time):
+        lag = time.time() - data_time.timestamp()
+        self.lag = lag if self.lag is None else self.lag * 0.9 + lag * 0.1
+
+    def compression_stats(self):
+        """
+        gzip 推送压缩前后的字节数统计
+        :return: dict
+        """
+        return self.decoder.stats()
+
+    def readiness_stats(self):
+        """
+        最近一次连接从建立到认证成功，以及到每个订阅收到第一条数据的耗时(秒)
+        :return: dict
+        """
+        return {'auth_latency': self.auth_latency,
+                'first_data_latency': dict(self.first_data_latency),
+                'waiting': len(self._waiting_first_data)}
+
     def on_open(self):
-        def run():
-            self.pong = time.time()
-            self.heart_beat_loop()
-            self.send_json({'uri': 'auth'})
-            wait_for_auth = time.time()
-            while not self.authorized and time.time() - wait_for_auth < 5:
-                time.sleep(0.1)
-            if not self.authorized:
+        self.connected_at = time.time()
+        self.auth_latency = None
+        self.first_data_latency = {}
+        self.pong = time.time()
+        self.heart_beat_loop()
+        self.send_json({'uri': 'auth'})
+        ws = self.ws
+
+        def wait_for_auth():
+            if not self.auth_event.wait(Config.QUOTE_AUTH_TIMEOUT) and self.ws is ws and ws.keep_running:
                 log.warning('wait for auth success timeout')
-                self.ws.close()
-            q_keys = list(self.queue_handlers.keys())
+                ws.close()
+
+        thread.start_new_thread(wait_for_auth, ())
+
+    def on_auth(self):
+        """
+        认证成功之后马上发送所有还没有发送的订阅
+        """
+        with self.lock:
+            self.authorized = True
+            self.auth_event.set()
+            if self.connected_at:
+                self.auth_latency = time.time() - self.connected_at
+            q_keys = list(self.data_queue.keys())
+            self._waiting_first_data = set(q_keys)
             if q_keys:
-                log.info('recover subscriptions', q_keys)
-                for q_key in q_keys:
-                    sub_data = json.loads(q_key)
-                    self.subscribe_data(**sub_data)
-                    print(sub_data)
+                log.info('recover {} subscriptions'.format(len(q_keys)))
+                self._send_subscribe([self.subscriptions[q_key] for q_key in q_keys])
 
-        thread.start_new_thread(run, ())
+    @staticmethod
+    def pack_subscribe(sub_list, batch):
+        """
+        把除 contract 以外参数相同的订阅合并，每一帧最多 batch 个 contract
+        :param sub_list: [{'uri': ..., 'contract': ...}, ...]
+        :param batch: 每一帧的 contract 数量上限
+        :return: [sub_data, ...]
+        """
+        if batch <= 1:
+            return sub_list
+        groups = {}
+        for sub_data in sub_list:
+            rest = tuple(sorted((k, v) for k, v in sub_data.items() if k != 'contract'))
+            groups.setdefault(rest, []).append(sub_data['contract'])
+        frames = []
+        for rest, contracts in groups.items():
+            for i in range(0, len(contracts), batch):
+                chunk = contracts[i:i + batch]
+                frame = dict(rest)
+                frame['contract'] = chunk if len(chunk) > 1 else chunk[0]
+                frames.append(frame)
+        return frames
+
+    def _send_subscribe(self, sub_list):
+        frames = self.pack_subscribe(sub_list, Config.QUOTE_SUB_BATCH)
+        for frame in frames:
+            try:
+                self.send_json(frame)
+            except Exception as e:
+                log.warning('subscribe {} failed...'.format(frame), e)
+                return
+        log.info('sub data', len(sub_list), frames=len(frames))
 
     @staticmethod
     def on_error(error):
@@ -145,47 +238,110 @@ class Quote:
         websocket 关闭的回调
         :return: None
         """
-        self.authorized = False
+        with self.lock:
+            self.authorized = False
+            self.auth_event.clear()
         log.info("### websocket closed ###")
 
-    def subscribe_data(self, uri, on_update=None, **kwargs):
+    def subscribe_data(self, uri, on_update=None, policy=None, **kwargs):
+        """
+        订阅数据
+        :param uri: 订阅的频道
+        :param on_update: 回调函数
+        :param policy: 回调来不及处理时的策略 all / latest / bounded(n)，None 表示保持原来的策略(默认 all)
+        :param kwargs: 订阅参数，例如 contract
+        :return: None
+        """
         log.info('subscribe', uri, **kwargs)
-        while not self.ws or not self.ws.keep_running or not self.authorized:
-            time.sleep(1)
         sub_data = {'uri': uri}
         sub_data.update(kwargs)
-        q_key = json.dumps(sub_data, sort_keys=True)
         with self.lock:
-            try:
-                self.send_json(sub_data)
-                log.info('sub data', sub_data)
-                if q_key not in self.data_queue:
-                    self.data_queue[q_key] = queue.Queue()
-                    if on_update:
-                        if not self.queue_handlers[q_key]:
-                            self.handle_q(q_key)
-            except Exception as e:
-                log.warning('subscribe {} failed...'.format(kwargs), e)
-            else:
-                if on_update:
-                    self.queue_handlers[q_key].append(on_update)
+            self._register(sub_data, on_update, policy)
+            # 还没有认证成功的话，会在 on_auth 里统一发送
+            if self.authorized:
+                self._send_subscribe([sub_data])
 
-    def handle_q(self, q_key):
-        def run():
-            while q_key in self.data_queue:
-                q = self.data_queue[q_key]
+    def subscribe_many(self, contracts, on_update=None, policy=None, **kwargs):
+        """
+        批量订阅，订阅请求会按照 Config.QUOTE_SUB_BATCH 合并发送
+        :param contracts: 交易对列表 ['huobip/btc.usdt', ...]
+        :param on_update: 回调函数
+        :param policy: 回调来不及处理时的策略 all / latest / bounded(n)
+        :param kwargs: 其他订阅参数，例如 duration
+        :return: None
+        """
+        assert self.channel, 'subscribe_many needs a quote with channel'
+        log.info('subscribe', self.channel, len(contracts), **kwargs)
+        sub_list = []
+        for contract in contracts:
+            sub_data = {'uri': self.channel, 'contract': contract}
+            sub_data.update(kwargs)
+            sub_list.append(sub_data)
+        with self.lock:
+            for sub_data in sub_list:
+                self._register(sub_data, on_update, policy)
+            if self.authorized:
+                self._send_subscribe(sub_list)
+
+    def unsubscribe_data(self, uri, **kwargs):
+        """
+        取消订阅，已经注册的回调会被移除
+        :param uri: 订阅时的 uri
+        :param kwargs: 订阅时的参数
+        :return: None
+        """
+        log.info('unsubscribe', uri, **kwargs)
+        sub_data = {'uri': uri}
+        sub_data.update(kwargs)
+        q_key = self.key_of(sub_data)
+        with self.lock:
+            self.data_queue.pop(q_key, None)
+            self.subscriptions.pop(q_key, None)
+            self.queue_handlers.pop(q_key, None)
+            self._waiting_first_data.discard(q_key)
+            if self.authorized:
+                sub_data['uri'] = 'un' + uri
                 try:
-                    tk = q.get()
-                except:
-                    log.warning('get data from queue failed')
-                    continue
-                for callback in self.queue_handlers[q_key]:
-                    try:
-                        callback(tk)
-                    except:
-                        log.exception('quote callback fail')
+                    self.send_json(sub_data)
+                except Exception as e:
+                    log.warning('unsubscribe {} failed...'.format(sub_data), e)
 
-        thread.start_new_thread(run, ())
+    @staticmethod
+    def key_of(sub_data):
+        """
+        订阅的路由 key，解析推送时直接拼出同样的 tuple，一次 dict 查找就能找到订阅
+        :param sub_data: {'uri': ..., 'contract': ..., 'duration': ...}
+        :return: (uri, contract) 或者 (uri, contract, duration)
+        """
+        key = (sub_data['uri'], sub_data.get('contract'))
+        rest = tuple(sub_data[k] for k in sorted(sub_data) if k != 'uri' and k != 'contract')
+        return key + rest if rest else key
+
+    def _register(self, sub_data, on_update, policy):
+        q_key = self.key_of(sub_data)
+        if q_key not in self.data_queue:
+            self.subscriptions[q_key] = sub_data
+            self.data_queue[q_key] = self.dispatcher.channel(q_key, policy or ALL)
+        elif policy is not None:
+            self.data_queue[q_key].set_policy(policy)
+        if on_update:
+            self.queue_handlers[q_key].append(on_update)
+        if self.authorized:
+            self._waiting_first_data.add(q_key)
+
+    def delivery_stats(self):
+        """
+        每个订阅收到 / 丢弃 / 等待回调的数据数量
+        :return: dict
+        """
+        return {q_key: ch.stats() for q_key, ch in list(self.data_queue.items())}
+
+    def dispatch(self, q_key, data):
+        for callback in self.queue_handlers.get(q_key, ()):
+            try:
+                callback(data)
+            except:
+                log.exception('quote callback fail')
 
     def run(self) -> None:
         """
@@ -214,90 +370,96 @@ class Quote:
         self.pong = 0
         self.queue_handlers = defaultdict(list)
         self.data_queue = {}
+        self.subscriptions = {}
+        self.dispatcher.stop()
         self.authorized = False
+        self.auth_event.clear()
 
 
 class TickQuote(Quote):
-    def __init__(self, key):
-        super().__init__(key, Config.TICK_HOST_WS, self.parse_tick)
+    track_lag = True
+    tick_class = Tick
+
+    def __init__(self, key, workers=None, lazy=False):
+        """
+        :param lazy: 为 True 时回调收到 LazyTick，time 和盘口在第一次访问时才解析
+        """
+        super().__init__(key, Config.TICK_HOST_WS, self.parse_tick, workers)
         self.channel = 'subscribe-single-tick-verbose'
+        if lazy:
+            self.tick_class = LazyTick
 
     def parse_tick(self, data):
         try:
-            tick = Tick.from_dict(data['data'])
-            q_key = json.dumps({'contract': tick.contract, 'uri': self.channel}, sort_keys=True)
-            return q_key, tick
+            d = data['data']
+            q_key = (self.channel, d['contract'])
+            # 没有订阅的 contract 不需要解析
+            if q_key not in self.data_queue:
+                return q_key, None
+            return q_key, self.tick_class.from_dict(d)
         except Exception as e:
             log.warning('parse error', e)
         return None, None
 
-    def subscribe_tick(self, contract, on_update):
-        self.subscribe_data(self.channel, on_update=on_update, contract=contract)
+    def subscribe_tick(self, contract, on_update, policy=None):
+        self.subscribe_data(self.channel, on_update=on_update, policy=policy, contract=contract)
+
+    def unsubscribe_tick(self, contract):
+        self.unsubscribe_data(self.channel, contract=contract)
 
 
 class TickV3Quote(Quote):
-    def __init__(self):
-        super().__init__('tick.v3', Config.TICK_V3_HOST_WS, self.parse_tick)
+    def __init__(self, workers=None):
+        super().__init__('tick.v3', Config.TICK_V3_HOST_WS, self.parse_tick, workers)
         self.channel = 'subscribe-single-tick-verbose'
         print(Config.TICK_V3_HOST_WS)
+        self.books = {}
+        # 有订阅的 contract 最新推送出去的 tick
         self.ticks = {}
 
     def parse_tick(self, data):
         try:
             c = data['c']
-            tm = arrow.get(data['tm'])
-            et = arrow.get(data['et']) if 'et' in data else None
             tp = data['tp']
-            q_key = json.dumps({'contract': c, 'uri': self.channel}, sort_keys=True)
+            q_key = (self.channel, c)
             if len(data['b']) > 0 and len(data['a']) > 0:
                 bid1, _ = data['b'][0]
                 ask1, _ = data['a'][0]
                 if bid1 >= ask1:
                     log.warning('bid1 >= ask1', bid1, ask1)
             if tp == 's':
-                bids = [{'price': p, 'volume': v} for p, v in data['b']]
-                asks = [{'price': p, 'volume': v} for p, v in data['a']]
-                tick = Tick(tm, data['l'], data['v'], bids, asks, c, 'tick.v3', et, data['vc'])
-                self.ticks[tick.contract] = tick
-                return q_key, tick
+                book = self.books.get(c)
+                if book is None:
+                    book = OrderBook(c, 'tick.v3')
+                    self.books[c] = book
+                book.reset(data['b'], data['a'])
             elif tp == 'd':
-                if c not in self.ticks:
+                book = self.books.get(c)
+                if book is None:
                     log.warning('update arriving before snapshot', self.channel, data)
                     return None, None
-                tick = self.ticks[c].copy()
-
-                tick.time = tm.datetime
-                tick.exchange_time = et.datetime
-                tick.price = data['l']
-                tick.volume = data['v']
-                tick.amount = data['vc']
-                bids = {p: v for p, v in data['b']}
-                old_bids = {item['price']: item['volume'] for item in tick.bids}
-                old_bids.update(bids)
-                bids = [{'price': p, 'volume': v} for p, v in old_bids.items() if v > 0]
-                bids = sorted(bids, key=lambda x: x['price'], reverse=True)
-
-                asks = {p: v for p, v in data['a']}
-                old_asks = {item['price']: item['volume'] for item in tick.asks}
-                old_asks.update(asks)
-                asks = [{'price': p, 'volume': v} for p, v in old_asks.items() if v > 0]
-                asks = sorted(asks, key=lambda x: x['price'])
-
-                tick.bids = bids
-                tick.asks = asks
-                self.ticks[c] = tick
-                return q_key, tick
+                book.update(data['b'], data['a'])
+            else:
+                return None, None
+            tm = parse_time(data['tm'])
+            et = parse_time(data['et']) if 'et' in data else None
+            book.set_trade(tm, data['l'], data['v'], et, data['vc'])
+            if q_key not in self.data_queue:
+                return q_key, None
+            tick = book.to_tick()
+            self.ticks[c] = tick
+            return q_key, tick
         except Exception as e:
             log.warning('parse error', e, data)
         return None, None
 
-    def subscribe_tick_v3(self, contract, on_update):
-        self.subscribe_data(self.channel, on_update=on_update, contract=contract)
+    def subscribe_tick_v3(self, contract, on_update, policy=None):
+        self.subscribe_data(self.channel, on_update=on_update, policy=policy, contract=contract)
 
 
 class CandleQuote(Quote):
-    def __init__(self, key):
-        super().__init__(key, Config.CANDLE_HOST_WS, self.parse_candle)
+    def __init__(self, key, workers=None):
+        super().__init__(key, Config.CANDLE_HOST_WS, self.parse_candle, workers)
         self.channel = 'subscribe-single-candle'
 
     def parse_candle(self, data):
@@ -305,33 +467,32 @@ class CandleQuote(Quote):
             if 'data' in data:
                 data = data['data']
             candle = Candle.from_dict(data)
-            q_key = json.dumps({'contract': candle.contract, 'duration': candle.duration, 'uri': self.channel},
-                               sort_keys=True)
+            q_key = (self.channel, candle.contract, candle.duration)
             return q_key, candle
         except Exception as e:
             log.warning('parse error', e)
         return None, None
 
-    def subscribe_candle(self, contract, duration, on_update):
-        self.subscribe_data(self.channel, on_update=on_update, contract=contract, duration=duration)
+    def subscribe_candle(self, contract, duration, on_update, policy=None):
+        self.subscribe_data(self.channel, on_update=on_update, policy=policy, contract=contract, duration=duration)
 
 
 class ZhubiQuote(Quote):
-    def __init__(self, key):
-        super().__init__(key, Config.TICK_HOST_WS, self.parse_zhubi)
+    def __init__(self, key, workers=None):
+        super().__init__(key, Config.TICK_HOST_WS, self.parse_zhubi, workers)
         self.channel = 'subscribe-single-zhubi-verbose'
 
     def parse_zhubi(self, data):
         try:
             zhubi = [Zhubi.from_dict(data) for data in data['data']]
-            q_key = json.dumps({'contract': zhubi[0].contract, 'uri': self.channel}, sort_keys=True)
+            q_key = (self.channel, zhubi[0].contract)
             return q_key, zhubi
         except Exception as e:
             log.warning('parse error', e)
         return None, None
 
-    def subscribe_zhubi(self, contract, on_update):
-        self.subscribe_data(self.channel, on_update=on_update, contract=contract)
+    def subscribe_zhubi(self, contract, on_update, policy=None):
+        self.subscribe_data(self.channel, on_update=on_update, policy=policy, contract=contract)
 
 
 _client_pool = {}
@@ -346,10 +507,10 @@ def get_client(key='defalut'):
         return c
 
 
-def subscribe_tick(contract, on_update):
+def subscribe_tick(contract, on_update, policy=None):
     c = get_client()
     c.run()
-    return c.subscribe_tick(contract, on_update)
+    return c.subscribe_tick(contract, on_update, policy)
 
 
 _tick_v3_client = None
@@ -362,10 +523,10 @@ def get_v3_client():
     return _tick_v3_client
 
 
-def subscribe_tick_v3(contract, on_update):
+def subscribe_tick_v3(contract, on_update, policy=None):
     c = get_v3_client()
     c.run()
-    return c.subscribe_tick_v3(contract, on_update)
+    return c.subscribe_tick_v3(contract, on_update, policy)
 
 
 _candle_client_pool = {}
@@ -380,10 +541,10 @@ def get_candle_client(key='defalut'):
         return c
 
 
-def subscribe_candle(contract, duration, on_update):
+def subscribe_candle(contract, duration, on_update, policy=None):
     c = get_candle_client()
     c.run()
-    return c.subscribe_candle(contract, duration, on_update)
+    return c.subscribe_candle(contract, duration, on_update, policy)
 
 
 _zhubi_quote_pool = {}
@@ -398,10 +559,10 @@ def get_zhubi_client(key='defalut'):
         return c
 
 
-def subscribe_zhubi(contract, on_update):
+def subscribe_zhubi(contract, on_update, policy=None):
     c = get_zhubi_client()
     c.run()
-    return c.subscribe_zhubi(contract, on_update)
+    return c.subscribe_zhubi(contract, on_update, policy)
 
 
 def get_last_tick(contract):
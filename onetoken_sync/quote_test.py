@@ -0,0 +1,97 @@
+import json
+import threading
+
+import pytest
+from websocket import ABNF
+
+from .quote import TickQuote
+
+contract = 'huobip/btc.usdt'
+tick = {'contract': contract, 'last': 100.5, 'volume': 10, 'time': '2019-11-29T08:00:00.123+08:00',
+        'bids': [{'price': 100, 'volume': 1}], 'asks': [{'price': 101, 'volume': 1}]}
+
+
+@pytest.fixture
+def quote(server):
+    q = TickQuote('test')
+    q.ws_url = server.url('/api/v1/ws/tick?gzip=true')
+    yield q
+    if q.is_running:
+        q.close()
+
+
+def test_subscribe_before_connect(server, quote):
+    got = []
+    received = threading.Event()
+
+    def on_update(t):
+        got.append(t)
+        received.set()
+
+    quote.subscribe_tick(contract, on_update)
+    assert not server.subscriptions
+    quote.run()
+    assert server.wait_for(lambda: server.subscriptions)
+    assert quote.auth_event.is_set()
+    server.push({'uri': 'single-tick-verbose', 'data': tick})
+    assert received.wait(5)
+    assert got[0].contract == contract and got[0].bid1 == 100
+    stats = quote.readiness_stats()
+    assert stats['auth_latency'] is not None
+    assert list(stats['first_data_latency'].values())[0] >= stats['auth_latency']
+
+
+def test_resubscribe_after_reconnect(server, quote):
+    quote.run()
+    assert quote.auth_event.wait(5)
+    quote.subscribe_tick(contract, lambda t: None)
+    assert server.wait_for(lambda: len(server.subscriptions) == 1)
+    server.drop_all()
+    assert server.wait_for(lambda: len(server.subscriptions) == 2, 10)
+    assert server.subscriptions[1] == {'uri': 'subscribe-single-tick-verbose', 'contract': contract}
+
+
+def test_subscribe_many_batched(server, quote, monkeypatch):
+    from .config import Config
+    monkeypatch.setattr(Config, 'QUOTE_SUB_BATCH', 4)
+    contracts = ['huobip/c{}.usdt'.format(i) for i in range(10)]
+    quote.subscribe_many(contracts, lambda t: None)
+    quote.run()
+    assert server.wait_for(lambda: len(server.subscriptions) == 10)
+    conn = server.live_connections()[0]
+    frames = [js for js in conn.received if js['uri'] == quote.channel]
+    assert [len(js['contract']) for js in frames] == [4, 4, 2]
+    assert [s['contract'] for s in server.subscriptions] == contracts
+
+
+def test_parse_tick_skips_unsubscribed():
+    q = TickQuote('test', lazy=True)
+    q_key, t = q.parse_tick({'uri': 'single-tick-verbose', 'data': dict(tick, time='not a time')})
+    assert q_key == (q.channel, contract) and t is None
+    q.subscribe_tick(contract, lambda t: None)
+    raw = dict(tick, bids=[{'price': 99, 'volume': 1}, {'price': 100, 'volume': 2}])
+    q_key, t = q.parse_tick({'uri': 'single-tick-verbose', 'data': raw})
+    assert 'time' not in t.__dict__ and 'bids' not in t.__dict__
+    assert t.contract == contract and t.last == 100.5
+    assert t.bid1 == 100 and t.bids[1]['price'] == 99
+    assert t.time.microsecond == 123000 and t.exchange_time is None
+    assert t.copy().to_dict() == t.to_dict()
+
+
+def test_subscribe_during_parse_skips_unparsed():
+    q = TickQuote('test')
+    put = []
+
+    class Channel:
+        def put(self, item):
+            put.append(item)
+
+    def parser(data):
+        q_key, t = q.parse_tick(data)
+        # 解析之后、分发之前刚好有人订阅
+        q.data_queue[q_key] = Channel()
+        return q_key, t
+
+    q.data_parser = parser
+    q.on_data(json.dumps({'uri': 'single-tick-verbose', 'data': tick}), ABNF.OPCODE_TEXT)
+    assert put == []
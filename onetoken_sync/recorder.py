@@ -0,0 +1,410 @@
+"""
+把行情按 contract 追加写入本地的二进制列式文件，读取时用 numpy memmap 直接映射
+
+    recorder = TickRecorder('/data/quote', depth=10)
+    quote.subscribe_tick('huobip/btc.usdt', recorder)
+    ...
+    recorder.close()
+
+    reader = Reader('/data/quote')
+    arrays = reader.read('huobip/btc.usdt', start, end)
+    for tick in reader.ticks('huobip/btc.usdt'):
+        ...
+
+目录结构为 {root}/{kind}/{exchange}/{name}/{segment}/{column}.{dtype}，segment 的名字是第一条数据的时间(微秒)
+每一列是一个定长数组文件，按时间和文件大小切分 segment；读取需要安装 numpy
+
+FrameRecorder 则原样记录收到的 websocket 帧，可以用 replay.Replay 重新走一遍 Quote 的解析和回调
+"""
+import _thread as thread
+import json
+import math
+import os
+import struct
+from datetime import datetime
+
+from .config import Config
+from .logger import log
+from .model import Tick, Zhubi
+from .timeparse import UTC, to_us, from_us
+
+NAN = float('nan')
+VERSION = 1
+
+# 列名 -> (struct 格式, numpy dtype)
+TICK_COLUMNS = [('time', 'q', 'i8'),
+                ('exchange_time', 'q', 'i8'),
+                ('price', 'd', 'f8'),
+                ('volume', 'd', 'f8'),
+                ('amount', 'd', 'f8'),
+                ('bid_price', 'd', 'f8'),
+                ('bid_volume', 'd', 'f8'),
+                ('ask_price', 'd', 'f8'),
+                ('ask_volume', 'd', 'f8')]
+DEPTH_COLUMNS = ('bid_price', 'bid_volume', 'ask_price', 'ask_volume')
+
+ZHUBI_COLUMNS = [('time', 'q', 'i8'),
+                 ('exchange_time', 'q', 'i8'),
+                 ('price', 'd', 'f8'),
+                 ('amount', 'd', 'f8'),
+                 ('bs', 'b', 'i1')]
+
+
+class FrameRecorder:
+    """
+    原样记录 websocket 收到的帧，用于 replay.Replay 回放
+
+        quote.frame_recorder = FrameRecorder('/data/frames')
+
+    每个文件名为 frames-{第一帧的时间(微秒)}.bin，每一帧为 [接收时间(微秒) int64][opcode uint8][长度 uint32][payload]
+    """
+    HEADER = struct.Struct('<qBI')
+
+    def __init__(self, root, rotate_bytes=None):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.rotate_bytes = rotate_bytes or Config.RECORDER_ROTATE_BYTES
+        self.file = None
+        self.size = 0
+        self.frames = 0
+
+    def write(self, msg, opcode, ts=None):
+        """
+        :param msg: 收到的 bytes / str
+        :param opcode: websocket opcode，文本帧为 1，二进制帧为 2
+        :param ts: 接收时间(微秒)，默认为当前时间
+        """
+        if isinstance(msg, str):
+            msg = msg.encode()
+        if ts is None:
+            ts = to_us(datetime.now(UTC))
+        if self.file is None or self.size >= self.rotate_bytes:
+            self.close()
+            self.file = open(os.path.join(self.root, 'frames-{:020d}.bin'.format(ts)), 'ab')
+            self.size = 0
+        self.file.write(self.HEADER.pack(ts, opcode, len(msg)))
+        self.file.write(msg)
+        self.size += self.HEADER.size + len(msg)
+        self.frames += 1
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _contract_dir(contract):
+    exchange, name = contract.split('/', 1)
+    return os.path.join(exchange, name)
+
+
+class _Segment:
+    """
+    一个 segment 目录，每一列一个追加写入的文件
+    写入先进入内存缓冲，超过 buffer_bytes 时一次性打开、追加、关闭每个列文件，
+    不长期占用文件句柄，同时记录几百个 contract 也不会超过进程的打开文件数限制
+    """
+
+    def __init__(self, path, columns, shapes, meta, buffer_bytes=None):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        self.path = path
+        self.start = meta['start']
+        self.buffer_bytes = buffer_bytes or Config.RECORDER_BUFFER_BYTES
+        self.paths = []
+        self.buffers = []
+        self.packers = []
+        for name, fmt, dtype in columns:
+            n = shapes.get(name, 1)
+            file = os.path.join(path, '{}.{}'.format(name, dtype))
+            open(file, 'ab').close()
+            self.paths.append(file)
+            self.buffers.append(bytearray())
+            self.packers.append(struct.Struct('<{}{}'.format(n, fmt)).pack)
+        self.row_size = sum(struct.calcsize('<{}{}'.format(shapes.get(name, 1), fmt)) for name, fmt, _ in columns)
+        self.rows = 0
+        self.buffered = 0
+
+    @property
+    def size(self):
+        return self.rows * self.row_size
+
+    def append(self, row):
+        for buf, pack, value in zip(self.buffers, self.packers, row):
+            if isinstance(value, (list, tuple)):
+                buf += pack(*value)
+            else:
+                buf += pack(value)
+        self.rows += 1
+        self.buffered += self.row_size
+        if self.buffered >= self.buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        for file, buf in zip(self.paths, self.buffers):
+            with open(file, 'ab') as f:
+                f.write(buf)
+            del buf[:]
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+class _Recorder:
+    kind = None
+    columns = None
+
+    def __init__(self, root, rotate_seconds=None, rotate_bytes=None):
+        """
+        :param root: 根目录
+        :param rotate_seconds: segment 覆盖的最长时间(秒)
+        :param rotate_bytes: segment 的最大字节数
+        """
+        self.root = root
+        self.rotate_us = int((rotate_seconds or Config.RECORDER_ROTATE_SECONDS) * 1e6)
+        self.rotate_bytes = rotate_bytes or Config.RECORDER_ROTATE_BYTES
+        self.segments = {}
+        self.locks = {}
+        self.lock = thread.allocate_lock()
+        self.rows = 0
+
+    def shapes(self):
+        return {}
+
+    def _lock(self, contract):
+        lock = self.locks.get(contract)
+        if lock is None:
+            with self.lock:
+                lock = self.locks.setdefault(contract, thread.allocate_lock())
+        return lock
+
+    def _open(self, contract, start):
+        path = os.path.join(self.root, self.kind, _contract_dir(contract), '{:020d}'.format(start))
+        meta = {'version': VERSION, 'kind': self.kind, 'contract': contract, 'start': start,
+                'columns': [[name, dtype] for name, _, dtype in self.columns], 'shapes': self.shapes()}
+        log.debug('open segment', path)
+        return _Segment(path, self.columns, self.shapes(), meta)
+
+    def write(self, contract, row):
+        ts = row[0]
+        with self._lock(contract):
+            seg = self.segments.get(contract)
+            if seg is not None and (ts - seg.start >= self.rotate_us or seg.size >= self.rotate_bytes):
+                seg.close()
+                seg = None
+            if seg is None:
+                seg = self._open(contract, ts)
+                self.segments[contract] = seg
+            seg.append(row)
+        self.rows += 1
+
+    def flush(self):
+        for contract, seg in list(self.segments.items()):
+            with self._lock(contract):
+                seg.flush()
+
+    def close(self):
+        for contract in list(self.segments):
+            with self._lock(contract):
+                seg = self.segments.pop(contract, None)
+                if seg is not None:
+                    seg.close()
+
+
+class TickRecorder(_Recorder):
+    """
+    可以直接作为 subscribe_tick / subscribe_tick_v3 的回调
+    每条 tick 记录前 depth 档盘口，不足的档位用 nan 填充
+    """
+    kind = 'tick'
+    columns = TICK_COLUMNS
+
+    def __init__(self, root, depth=10, rotate_seconds=None, rotate_bytes=None):
+        super().__init__(root, rotate_seconds, rotate_bytes)
+        self.depth = depth
+        self._pad = [NAN] * depth
+
+    def shapes(self):
+        return {name: self.depth for name in DEPTH_COLUMNS}
+
+    def __call__(self, tick):
+        self.record(tick)
+
+    def _side(self, levels):
+        n = self.depth
+        price = [x['price'] for x in levels[:n]]
+        volume = [x['volume'] for x in levels[:n]]
+        if len(price) < n:
+            price += self._pad[len(price):]
+            volume += self._pad[len(volume):]
+        return price, volume
+
+    def _arrays(self, price, volume):
+        price = price[:self.depth].tolist()
+        volume = volume[:self.depth].tolist()
+        if len(price) < self.depth:
+            price += self._pad[len(price):]
+            volume += self._pad[len(volume):]
+        return price, volume
+
+    def record(self, tick):
+        if tick.depth is not None:
+            d = tick.depth
+            bid_price, bid_volume = self._arrays(d.bid_price, d.bid_volume)
+            ask_price, ask_volume = self._arrays(d.ask_price, d.ask_volume)
+        else:
+            bid_price, bid_volume = self._side(tick.bids)
+            ask_price, ask_volume = self._side(tick.asks)
+        amount = tick.amount
+        self.write(tick.contract, (to_us(tick.time), to_us(tick.exchange_time), tick.price, tick.volume,
+                                   NAN if amount is None else amount,
+                                   bid_price, bid_volume, ask_price, ask_volume))
+
+
+class ZhubiRecorder(_Recorder):
+    """
+    可以直接作为 subscribe_zhubi 的回调
+    """
+    kind = 'zhubi'
+    columns = ZHUBI_COLUMNS
+
+    def __call__(self, zhubi_list):
+        for zhubi in zhubi_list:
+            self.record(zhubi)
+
+    def record(self, zhubi):
+        self.write(zhubi.contract, (to_us(zhubi.time), to_us(zhubi.exchange_time), zhubi.price, zhubi.amount,
+                                    1 if zhubi.bs == 'b' else -1))
+
+
+class Reader:
+    """
+    读取 TickRecorder / ZhubiRecorder 写入的数据，需要安装 numpy
+    """
+
+    def __init__(self, root, kind='tick'):
+        self.root = root
+        self.kind = kind
+
+    def contracts(self):
+        base = os.path.join(self.root, self.kind)
+        if not os.path.isdir(base):
+            return []
+        result = []
+        for exchange in sorted(os.listdir(base)):
+            for name in sorted(os.listdir(os.path.join(base, exchange))):
+                result.append('{}/{}'.format(exchange, name))
+        return result
+
+    def segments(self, contract, start=None, end=None):
+        """
+        :return: 和 [start, end) 有交集的 segment 目录，按时间排序
+        """
+        base = os.path.join(self.root, self.kind, _contract_dir(contract))
+        if not os.path.isdir(base):
+            return []
+        names = sorted(os.listdir(base))
+        start_us = to_us(start) if start is not None else None
+        end_us = to_us(end) if end is not None else None
+        result = []
+        for i, name in enumerate(names):
+            if end_us is not None and int(name) >= end_us:
+                break
+            # 下一个 segment 的开始时间不晚于 start，说明这个 segment 里都是 start 之前的数据
+            if start_us is not None and i + 1 < len(names) and int(names[i + 1]) <= start_us:
+                continue
+            result.append(os.path.join(base, name))
+        return result
+
+    @staticmethod
+    def read_segment(path):
+        """
+        :param path: segment 目录
+        :return: {column: numpy.memmap}，写入中断导致的不完整的行会被忽略
+        """
+        import numpy as np
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        shapes = meta.get('shapes', {})
+        files = []
+        rows = None
+        for name, dtype in meta['columns']:
+            shape = shapes.get(name, 1)
+            file = os.path.join(path, '{}.{}'.format(name, dtype))
+            n = os.path.getsize(file) // (np.dtype(dtype).itemsize * shape)
+            rows = n if rows is None else min(rows, n)
+            files.append((name, dtype, shape, file))
+        result = {}
+        for name, dtype, shape, file in files:
+            if rows:
+                arr = np.memmap(file, dtype='<' + dtype, mode='r', shape=(rows, shape) if name in shapes else (rows,))
+            else:
+                arr = np.empty((0, shape) if name in shapes else (0,), dtype='<' + dtype)
+            result[name] = arr
+        return result
+
+    def read(self, contract, start=None, end=None):
+        """
+        :param contract: 交易对
+        :param start: 开始时间(包含)
+        :param end: 结束时间(不包含)
+        :return: {column: numpy array}，time / exchange_time 为微秒时间戳；
+                 只有一个 segment 并且没有时间过滤时直接返回 memmap
+        """
+        import numpy as np
+        parts = [self.read_segment(path) for path in self.segments(contract, start, end)]
+        if not parts:
+            return {}
+        if len(parts) == 1:
+            arrays = parts[0]
+        else:
+            arrays = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+        if start is not None or end is not None:
+            t = arrays['time']
+            mask = np.ones(len(t), dtype=bool)
+            if start is not None:
+                mask &= t >= to_us(start)
+            if end is not None:
+                mask &= t < to_us(end)
+            arrays = {name: arr[mask] for name, arr in arrays.items()}
+        return arrays
+
+    def ticks(self, contract, start=None, end=None):
+        """
+        :return: Tick 的生成器，盘口用 numpy 数组表示
+        """
+        import numpy as np
+        arrays = self.read(contract, start, end)
+        if not arrays:
+            return
+        for i in range(len(arrays['time'])):
+            bid_price, ask_price = arrays['bid_price'][i], arrays['ask_price'][i]
+            bid_n = int(np.count_nonzero(~np.isnan(bid_price)))
+            ask_n = int(np.count_nonzero(~np.isnan(ask_price)))
+            amount = float(arrays['amount'][i])
+            yield Tick.from_arrays(from_us(arrays['time'][i]), float(arrays['price'][i]),
+                                   bid_price[:bid_n], arrays['bid_volume'][i][:bid_n],
+                                   ask_price[:ask_n], arrays['ask_volume'][i][:ask_n],
+                                   volume=float(arrays['volume'][i]),
+                                   contract=contract,
+                                   exchange_time=from_us(arrays['exchange_time'][i]),
+                                   amount=None if math.isnan(amount) else amount)
+
+    def zhubis(self, contract, start=None, end=None):
+        """
+        :return: Zhubi 的生成器
+        """
+        arrays = self.read(contract, start, end)
+        if not arrays:
+            return
+        for i in range(len(arrays['time'])):
+            yield Zhubi(from_us(arrays['time'][i]), from_us(arrays['exchange_time'][i]), contract,
+                        float(arrays['price'][i]), float(arrays['amount'][i]), 'b' if arrays['bs'][i] > 0 else 's')
@@ -0,0 +1,85 @@
+import os
+from datetime import timedelta
+
+import pytest
+
+from .book import OrderBook
+from .model import Tick, Zhubi
+from .recorder import TickRecorder, ZhubiRecorder, Reader
+from .timeparse import parse_time
+
+pytest.importorskip('numpy')
+
+contract = 'huobip/btc.usdt'
+t0 = parse_time('2019-11-29T08:00:00.123456+08:00')
+
+
+def make_tick(i):
+    return Tick(t0 + timedelta(seconds=i), 100 + i, volume=10 * i, contract=contract,
+                bids=[{'price': 99.5 + i, 'volume': 1}, {'price': 99 + i, 'volume': 2}],
+                asks=[{'price': 100.5 + i, 'volume': 3}])
+
+
+def test_tick_roundtrip(tmp_path):
+    recorder = TickRecorder(str(tmp_path), depth=3)
+    for i in range(5):
+        recorder(make_tick(i))
+    recorder.close()
+
+    reader = Reader(str(tmp_path))
+    assert reader.contracts() == [contract]
+    arrays = reader.read(contract)
+    assert arrays['bid_price'].shape == (5, 3)
+    assert arrays['price'].tolist() == [100, 101, 102, 103, 104]
+    ticks = list(reader.ticks(contract))
+    assert [t.time for t in ticks] == [make_tick(i).time for i in range(5)]
+    assert ticks[2].bids == make_tick(2).bids and ticks[2].asks == make_tick(2).asks
+    assert ticks[2].exchange_time is None and ticks[2].amount is None
+
+    assert len(reader.read(contract, t0 + timedelta(seconds=1), t0 + timedelta(seconds=3))['time']) == 2
+
+
+def test_rotate_and_partial_row(tmp_path):
+    recorder = TickRecorder(str(tmp_path), depth=2, rotate_seconds=2)
+    book = OrderBook(contract, 'tick.v3')
+    for i in range(5):
+        book.reset([[99, 1]], [[101, 1]])
+        book.set_trade(t0 + timedelta(seconds=i), 100, i, None, None)
+        recorder(book.to_tick())
+    recorder.close()
+    reader = Reader(str(tmp_path))
+    segments = reader.segments(contract)
+    assert len(segments) == 3
+    assert reader.segments(contract, start=t0 + timedelta(seconds=3)) == segments[1:]
+
+    # 写入中断只写了一部分列
+    with open(os.path.join(segments[-1], 'time.i8'), 'ab') as f:
+        f.write(b'\0' * 8)
+    arrays = reader.read(contract)
+    assert arrays['volume'].tolist() == [0, 1, 2, 3, 4]
+    assert arrays['ask_price'][0].tolist()[0] == 101
+
+
+def test_zhubi_roundtrip(tmp_path):
+    recorder = ZhubiRecorder(str(tmp_path))
+    zhubi = [Zhubi(t0, t0, contract, 100, 1.5, 'b'), Zhubi(t0, t0, contract, 101, 2, 's')]
+    recorder(zhubi)
+    recorder.close()
+    got = list(Reader(str(tmp_path), 'zhubi').zhubis(contract))
+    assert [(z.time, z.price, z.amount, z.bs) for z in got] == [(z.time, z.price, z.amount, z.bs) for z in zhubi]
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc/self/fd')
+def test_many_contracts_keep_no_files_open(tmp_path):
+    # 每个 contract 9 列，按 1024 的打开文件数限制最多只能同时打开一百多个 contract
+    n = 300
+    recorder = TickRecorder(str(tmp_path), depth=2)
+    before = len(os.listdir('/proc/self/fd'))
+    for i in range(3):
+        for c in range(n):
+            recorder(Tick(t0 + timedelta(seconds=i), 100 + i, volume=i, contract='huobip/c{}.usdt'.format(c)))
+    assert len(os.listdir('/proc/self/fd')) <= before
+    recorder.close()
+    reader = Reader(str(tmp_path))
+    assert len(reader.contracts()) == n
+    assert reader.read('huobip/c299.usdt')['price'].tolist() == [100, 101, 102]
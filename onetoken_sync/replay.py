@@ -0,0 +1,151 @@
+"""
+把 recorder.FrameRecorder 记录的帧重新交给 Quote.on_data，回调收到的数据和实盘时走的是同一条解析和分发路径
+
+    quote = TickQuote('backtest')
+    quote.subscribe_tick('huobip/btc.usdt', strategy.on_tick)
+    stats = Replay(quote, '/data/frames').run()          # 尽可能快
+    stats = Replay(quote, '/data/frames', speed=10).run()  # 按记录时的节奏，10 倍速
+
+文件按帧流式读取，不会一次读入内存
+"""
+import os
+import time
+
+from .logger import log
+from .recorder import FrameRecorder
+
+
+class OfflineWs:
+    """
+    回放时代替 websocket，Quote 发出的 auth / subscribe / ping 只记录数量
+    """
+    keep_running = True
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, message):
+        self.sent += 1
+
+    def close(self):
+        self.keep_running = False
+
+
+def iter_frames(path, buffering=1 << 20):
+    """
+    :param path: FrameRecorder 写入的文件
+    :return: (时间(微秒), opcode, payload) 的生成器
+    """
+    header = FrameRecorder.HEADER
+    with open(path, 'rb', buffering=buffering) as f:
+        while True:
+            head = f.read(header.size)
+            if len(head) < header.size:
+                break
+            ts, opcode, n = header.unpack(head)
+            payload = f.read(n)
+            if len(payload) < n:
+                log.warning('truncated frame', path, ts)
+                break
+            yield ts, opcode, payload
+
+
+def frame_files(path):
+    """
+    :param path: 文件、目录或者文件列表
+    :return: 按时间排序的文件列表
+    """
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.startswith('frames-') and name.endswith('.bin')]
+    return [path]
+
+
+class Replay:
+    def __init__(self, quote, path, speed=None):
+        """
+        :param quote: 已经订阅好的 Quote，不需要 run
+        :param path: FrameRecorder 的目录、文件或者文件列表
+        :param speed: None 表示尽可能快，1 表示按记录时的节奏，10 表示 10 倍速
+        """
+        assert speed is None or speed > 0
+        self.quote = quote
+        self.files = frame_files(path)
+        self.speed = speed
+        self.frames = 0
+        self.messages = 0
+        self.bytes = 0
+        self.elapsed = 0
+        self.total_elapsed = 0
+        self.is_running = False
+
+    def run(self, wait=True, timeout=None):
+        """
+        在当前线程回放所有帧
+        :param wait: 是否等待回调处理完所有数据
+        :param timeout: 等待回调的最长时间(秒)
+        :return: stats()
+        """
+        quote = self.quote
+        if quote.ws is None:
+            quote.ws = OfflineWs()
+        messages = quote.messages
+        self.is_running = True
+        start = time.perf_counter()
+        first_ts = None
+        try:
+            for file in self.files:
+                for ts, opcode, payload in iter_frames(file):
+                    if not self.is_running:
+                        break
+                    if self.speed is not None:
+                        if first_ts is None:
+                            first_ts = ts
+                        delay = (ts - first_ts) / 1e6 / self.speed - (time.perf_counter() - start)
+                        if delay > 0:
+                            time.sleep(delay)
+                    quote.on_data(payload, opcode)
+                    self.frames += 1
+                    self.bytes += len(payload)
+            self.elapsed = time.perf_counter() - start
+            if wait:
+                self.wait(timeout)
+        finally:
+            self.is_running = False
+        self.messages = quote.messages - messages
+        self.total_elapsed = time.perf_counter() - start
+        return self.stats()
+
+    def stop(self):
+        self.is_running = False
+
+    def wait(self, timeout=None):
+        """
+        等待所有订阅的回调处理完
+        :return: 是否在 timeout 之前处理完
+        """
+        end = None if timeout is None else time.time() + timeout
+        while end is None or time.time() < end:
+            if all(not ch.pending and not ch.scheduled for ch in list(self.quote.data_queue.values())):
+                return True
+            time.sleep(0.001)
+        return False
+
+    def stats(self):
+        """
+        :return: 回放的帧数、解析出的行情消息数、字节数和吞吐量；*_per_sec 只计算解析的耗时，total_msgs_per_sec 包括等待回调
+                 messages 不包括 auth / pong 等非行情帧，耗时为 0 时吞吐量为 None
+        """
+        def rate(n, seconds):
+            return n / seconds if seconds > 0 else None
+
+        return {'frames': self.frames,
+                'messages': self.messages,
+                'bytes': self.bytes,
+                'elapsed': self.elapsed,
+                'frames_per_sec': rate(self.frames, self.elapsed),
+                'msgs_per_sec': rate(self.messages, self.elapsed),
+                'total_msgs_per_sec': rate(self.messages, self.total_elapsed),
+                'mb_per_sec': rate(self.bytes / 1e6, self.elapsed)}
@@ -0,0 +1,58 @@
+import gzip
+import json
+import time
+
+import pytest
+
+from .quote import TickQuote
+from .recorder import FrameRecorder
+from .replay import Replay, iter_frames
+
+contract = 'huobip/btc.usdt'
+
+
+def frame(i):
+    tick = {'contract': contract, 'last': 100 + i, 'volume': i, 'time': '2019-11-29T08:00:00.{:03d}+08:00'.format(i),
+            'bids': [{'price': 99, 'volume': 1}], 'asks': [{'price': 101, 'volume': 1}]}
+    return gzip.compress(json.dumps({'uri': 'single-tick-verbose', 'data': tick}).encode())
+
+
+def record(path, n, step_us=0):
+    recorder = FrameRecorder(str(path), rotate_bytes=300)
+    recorder.write('{"uri": "auth", "message": "Auth succeed."}', 1, ts=1)
+    for i in range(n):
+        recorder.write(frame(i), 2, ts=2 + i * step_us)
+    recorder.close()
+
+
+def test_replay_fast(tmp_path):
+    record(tmp_path, 20)
+    assert len(list(tmp_path.iterdir())) > 1
+    q = TickQuote('replay')
+    got = []
+    q.subscribe_tick(contract, got.append)
+    stats = Replay(q, str(tmp_path)).run(timeout=5)
+    assert stats['frames'] == 21 and stats['messages'] == 20
+    assert stats['msgs_per_sec'] == pytest.approx(20 / stats['elapsed'])
+    assert stats['frames_per_sec'] == pytest.approx(21 / stats['elapsed'])
+    assert Replay(q, []).stats()['msgs_per_sec'] is None
+    assert [t.last for t in got] == [100 + i for i in range(20)]
+    assert q.authorized and q.ws.sent == 1
+    q.close()
+
+
+def test_replay_speed(tmp_path):
+    record(tmp_path, 5, step_us=20000)
+    q = TickQuote('replay')
+    start = time.time()
+    Replay(q, str(tmp_path), speed=2).run(timeout=5)
+    assert time.time() - start >= 0.04
+    q.close()
+
+
+def test_truncated_file(tmp_path):
+    record(tmp_path, 1)
+    path = sorted(tmp_path.iterdir())[-1]
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+    assert [f[0] for f in iter_frames(str(path))] == [1]
@@ -0,0 +1,130 @@
+import datetime
+
+import arrow
+
+UTC = datetime.timezone.utc
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=UTC)
+_ONE_US = datetime.timedelta(microseconds=1)
+
+# 'YYYY-MM-DDTHH:MM:SS' -> naive datetime，同一秒内的推送只需要解析一次
+_prefix_cache = {}
+_PREFIX_CACHE_SIZE = 4096
+
+_tz_cache = {'': UTC, 'Z': UTC, '+00:00': UTC, '+0000': UTC}
+
+try:
+    from arrow.constants import MAX_TIMESTAMP, MAX_TIMESTAMP_MS, MAX_TIMESTAMP_US
+except ImportError:
+    # arrow < 0.15
+    MAX_TIMESTAMP = 253402300800.0
+    MAX_TIMESTAMP_MS = MAX_TIMESTAMP * 1000
+    MAX_TIMESTAMP_US = MAX_TIMESTAMP * 1000000
+
+
+def _get_tz(s):
+    tz = _tz_cache.get(s)
+    if tz is None:
+        if len(s) == 6 and s[3] == ':':
+            hh, mm = s[1:3], s[4:6]
+        elif len(s) == 5:
+            hh, mm = s[1:3], s[3:5]
+        elif len(s) == 3:
+            hh, mm = s[1:3], '00'
+        else:
+            return None
+        if s[0] not in '+-' or not (hh + mm).isdigit():
+            return None
+        delta = datetime.timedelta(hours=int(hh), minutes=int(mm))
+        tz = datetime.timezone(-delta if s[0] == '-' else delta)
+        _tz_cache[s] = tz
+    return tz
+
+
+def _from_timestamp(ts):
+    # 和 arrow.util.normalize_timestamp 一样，超出秒级范围的才当作毫秒 / 微秒时间戳
+    if ts > MAX_TIMESTAMP:
+        if ts < MAX_TIMESTAMP_MS:
+            ts /= 1000
+        elif ts < MAX_TIMESTAMP_US:
+            ts /= 1000000
+        else:
+            raise ValueError('The specified timestamp {!r} is too large.'.format(ts))
+    return datetime.datetime.fromtimestamp(ts, UTC)
+
+
+def _from_iso(s):
+    if len(s) < 19 or s[4] != '-' or s[7] != '-' or s[10] not in 'T ' or s[13] != ':' or s[16] != ':':
+        return None
+    prefix = s[:19]
+    base = _prefix_cache.get(prefix)
+    if base is None:
+        try:
+            base = datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]),
+                                     int(s[17:19]))
+        except ValueError:
+            return None
+        if len(_prefix_cache) >= _PREFIX_CACHE_SIZE:
+            _prefix_cache.clear()
+        _prefix_cache[prefix] = base
+    microsecond = 0
+    i = 19
+    if len(s) > 19 and s[19] in '.,':
+        i = 20
+        n = len(s)
+        while i < n and '0' <= s[i] <= '9':
+            i += 1
+        digits = s[20:i]
+        if not digits:
+            return None
+        microsecond = int(digits[:6].ljust(6, '0'))
+        # 和 arrow 一样只看第 7 位，按四舍六入五成双取到微秒
+        if len(digits) > 6 and (digits[6] > '5' or digits[6] == '5' and microsecond % 2):
+            microsecond += 1
+            if microsecond == 1000000:
+                return None
+    tz = _get_tz(s[i:])
+    if tz is None:
+        return None
+    return base.replace(microsecond=microsecond, tzinfo=tz)
+
+
+def parse_time(value):
+    """
+    把推送 / 接口中的时间解析成带时区的 datetime，和 arrow(1.x).get(value).datetime 结果一致
+    ISO-8601 字符串和 epoch 时间戳走快速路径，其他格式(以及快速路径不认识的写法)交给 arrow
+    :param value: str / int / float / datetime / arrow.Arrow
+    :return: datetime
+    """
+    if isinstance(value, str):
+        dt = _from_iso(value)
+        if dt is not None:
+            return dt
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _from_timestamp(value)
+    elif isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=UTC)
+        return value
+    elif isinstance(value, arrow.Arrow):
+        return value.datetime
+    return arrow.get(value).datetime
+
+
+def to_us(dt):
+    """
+    :param dt: 带时区的 datetime，None 记为 0
+    :return: 微秒时间戳
+    """
+    if dt is None:
+        return 0
+    return (dt - EPOCH) // _ONE_US
+
+
+def from_us(us):
+    """
+    :param us: 微秒时间戳，0 表示 None
+    :return: UTC datetime
+    """
+    if not us:
+        return None
+    return EPOCH + datetime.timedelta(microseconds=int(us))
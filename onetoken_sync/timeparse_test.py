@@ -0,0 +1,62 @@
+import datetime
+
+import arrow
+import pytest
+
+from .timeparse import parse_time
+
+
+@pytest.mark.parametrize('value', [
+    '2019-11-29T08:00:00+08:00',
+    '2019-11-29T08:00:00.123+08:00',
+    '2019-11-29T08:00:00.123456-05:30',
+    '2019-11-29T08:00:00.123456789Z',
+    '2019-11-29T08:00:00.5+0800',
+    '2019-11-29 08:00:00.000001',
+    '2019-11-29T08:00:00',
+    '2019-11-29',
+    1575014400,
+    1575014400.25,
+    1575014400250,
+    1575014400250000,
+    1e11 + 5,
+    '2019-01-01T00:00:00.1234565+08:00',
+    '2019-01-01T00:00:00.1234575+08:00',
+    '2019-01-01T00:00:00.1234566+08:00',
+    '2019-01-01T00:00:00.9999995Z',
+])
+def test_same_as_arrow(value):
+    dt = parse_time(value)
+    assert isinstance(dt, datetime.datetime)
+    assert dt.tzinfo
+    assert dt == arrow.get(value).datetime
+    assert dt.utcoffset() == arrow.get(value).datetime.utcoffset()
+
+
+@pytest.mark.parametrize('value', ['2019-11-29T08:00:00z', '2019-11-29T08:00:00+8'])
+def test_rejected_like_arrow(value):
+    with pytest.raises(arrow.parser.ParserError):
+        arrow.get(value)
+    with pytest.raises(arrow.parser.ParserError):
+        parse_time(value)
+
+
+def test_prefix_cache():
+    a = parse_time('2019-11-29T08:00:00.100+08:00')
+    b = parse_time('2019-11-29T08:00:00.200+00:00')
+    assert b - a == datetime.timedelta(hours=8, milliseconds=100)
+    dt = datetime.datetime(2019, 11, 29, tzinfo=datetime.timezone.utc)
+    assert parse_time(dt) is dt
+    assert parse_time(arrow.get(dt)) == dt
+
+
+def test_candle_time_stays_arrow():
+    from .model import Candle
+    data = {'time': '2019-11-29T08:00:00+08:00', 'open': 1, 'high': 2, 'low': 0.5, 'close': 1.5, 'volume': 10,
+            'contract': 'huobip/btc.usdt', 'duration': '1m'}
+    candle = Candle.from_dict(data)
+    assert isinstance(candle.time, arrow.Arrow)
+    assert candle.time == arrow.get(data['time'])
+    assert candle.time.shift(minutes=1).format('HH:mm') == '08:01'
+    dt = parse_time(data['time'])
+    assert Candle(dt, 1, 2, 0.5, 1.5, 10, 'huobip/btc.usdt', '1m').time is dt
@@ -1,14 +1,22 @@
+import _thread as thread
 import hashlib
 import hmac
 import json
 import random
+import socket
 import string
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 import arrow
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 
+from . import codec
 from .config import Config
 from .logger import log
 
@@ -77,32 +85,176 @@ def http_go(func, url, method='json', accept_4xx=False, **kwargs):
     except requests.HTTPError as e:
         return None, HTTPError(HTTPError.HTTP_ERROR, str(e))
 
-    txt = resp.text
     if resp.status_code >= 500:
-        return None, HTTPError(HTTPError.RESPONSE_5XX, txt)
+        return None, HTTPError(HTTPError.RESPONSE_5XX, resp.text)
     if 400 <= resp.status_code < 500:
-        return None, HTTPError(HTTPError.RESPONSE_4XX, txt)
+        return None, HTTPError(HTTPError.RESPONSE_4XX, resp.text)
 
     if method == 'raw':
         return resp, None
     elif method == 'text':
-        return txt, None
+        return resp.text, None
     elif method == 'json':
         try:
-            return json.loads(txt), None
+            return codec.loads(resp.content), None
         except:
-            return None, HTTPError(HTTPError.NOT_JSON, txt)
+            return None, HTTPError(HTTPError.NOT_JSON, resp.text)
+
+
+class _Adapter(HTTPAdapter):
+    def __init__(self, keepalive=True, **kwargs):
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive:
+            # 长时间空闲的连接也能及时发现被对端断开
+            options = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            for name, value in (('TCP_KEEPIDLE', 60), ('TCP_KEEPINTVL', 10), ('TCP_KEEPCNT', 3)):
+                if hasattr(socket, name):
+                    options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+            kwargs['socket_options'] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _retry(retries, backoff):
+    # 读取失败只重试 GET / HEAD：撤单的 DELETE 会带着同一个 nonce 和签名重发，服务端可能执行两次
+    kwargs = dict(total=retries, connect=retries, read=retries, status=0, backoff_factor=backoff,
+                  raise_on_status=False)
+    methods = frozenset(['GET', 'HEAD', 'OPTIONS'])
+    try:
+        return Retry(allowed_methods=methods, **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=methods, **kwargs)
 
 
-_requests_sess = None
+class Transport:
+    """
+    共享的 http 连接池，所有 Account 和 quote 的 rest 请求默认使用同一个 Transport
+    连接按 host 复用，stats() 可以确认是否每次请求都在重新建立连接(以及 TLS 握手)
+    每个 Account 通过 new_session() 拿到自己的 session(cookie、header 互不影响)，底层共用同一个连接池
+    """
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, retries=None, backoff=None, keepalive=None):
+        """
+        :param pool_connections: 缓存多少个 host 的连接池
+        :param pool_maxsize: 每个 host 最多保持的空闲连接数
+        :param retries: 建立连接失败，以及 GET / HEAD 读取失败时的重试次数，POST / PATCH / DELETE 读取失败不会重试
+        :param backoff: 重试的退避系数(秒)
+        :param keepalive: 是否开启 TCP keepalive
+        """
+        self.pool_connections = pool_connections or Config.HTTP_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or Config.HTTP_POOL_MAXSIZE
+        retries = Config.HTTP_RETRIES if retries is None else retries
+        backoff = Config.HTTP_RETRY_BACKOFF if backoff is None else backoff
+        keepalive = Config.HTTP_TCP_KEEPALIVE if keepalive is None else keepalive
+        self.adapter = _Adapter(keepalive=keepalive,
+                                pool_connections=self.pool_connections,
+                                pool_maxsize=self.pool_maxsize,
+                                max_retries=_retry(retries, backoff))
+        self.session = self.new_session()
+
+    def new_session(self):
+        """
+        创建一个使用共享连接池的 session，不要调用它的 close()，否则会清空共享连接池里的空闲连接
+        :return: requests.Session
+        """
+        sess = requests.session()
+        sess.mount('https://', self.adapter)
+        sess.mount('http://', self.adapter)
+        return sess
+
+    def prewarm(self, url=None, connections=None, timeout=5):
+        """
+        并发请求 url，提前建立好连接，第一次下单不需要等待 TCP 和 TLS 握手
+        :param url: 默认为 Config.HOST_REST
+        :param connections: 建立的连接数量，不超过 pool_maxsize
+        :return: 成功的请求数量
+        """
+        url = url or Config.HOST_REST
+        n = min(connections or Config.HTTP_PREWARM or 1, self.pool_maxsize)
+        done = []
+
+        def run():
+            try:
+                self.session.head(url, timeout=timeout)
+                done.append(1)
+            except Exception as e:
+                log.warning('prewarm {} failed'.format(url), e)
+
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return len(done)
+
+    def stats(self):
+        """
+        :return: {'requests': 请求数, 'connections': 新建的连接数, 'reused': 复用连接的请求数,
+                  'reuse_ratio': 复用比例, 'hosts': {host: {...}}}
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = '{}://{}:{}'.format(key.key_scheme, key.key_host, key.key_port or '')
+            hosts[host] = {'requests': pool.num_requests,
+                           'connections': pool.num_connections,
+                           'idle': pool.pool.qsize() if pool.pool is not None else 0}
+        n_requests = sum(x['requests'] for x in hosts.values())
+        n_connections = sum(x['connections'] for x in hosts.values())
+        return {'requests': n_requests,
+                'connections': n_connections,
+                'reused': max(n_requests - n_connections, 0),
+                'reuse_ratio': 1 - n_connections / n_requests if n_requests else None,
+                'hosts': hosts}
+
+    def close(self):
+        self.session.close()
+
+
+_transport = None
+_transport_lock = thread.allocate_lock()
+
+
+def get_transport():
+    """
+    进程内共享的 Transport，Config.HTTP_PREWARM 大于 0 时第一次创建会在后台预先建立连接
+    :return: Transport
+    """
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = Transport()
+                if Config.HTTP_PREWARM:
+                    thread.start_new_thread(_transport.prewarm, ())
+    return _transport
 
 
 def get_requests_sess():
-    global _requests_sess
-    if _requests_sess is None:
-        _requests_sess = requests.session()
-        _requests_sess.close()
-    return _requests_sess
+    return get_transport().session
+
+
+_executor = None
+
+
+def get_executor():
+    """
+    进程内共享的线程池，所有 Account 的批量下单 / 撤单一共最多 Config.ACCOUNT_HTTP_WORKERS 个请求同时进行
+    线程在第一次使用时创建，进程退出时由 concurrent.futures 回收
+    :return: ThreadPoolExecutor
+    """
+    global _executor
+    if _executor is None:
+        with _transport_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.ACCOUNT_HTTP_WORKERS)
+    return _executor
 
 
 def load_ot_from_config_file():
@@ -149,8 +301,17 @@ def load_ot_from_config_file():
     return None, None, False
 
 
+_nonce_lock = thread.allocate_lock()
+_last_nonce = 0
+
+
 def gen_nonce():
-    return str(int(time.time() * 1000000))
+    # 并发请求时同一微秒内可能生成多个 nonce，保证严格递增
+    global _last_nonce
+    with _nonce_lock:
+        nonce = max(int(time.time() * 1000000), _last_nonce + 1)
+        _last_nonce = nonce
+    return str(nonce)
 
 
 def get_trans_host(exg):
@@ -178,3 +339,31 @@ def gen_sign(secret, verb, endpoint, nonce, data_str):
     message = verb + path + str(nonce) + data_str
     signature = hmac.new(bytes(secret, 'utf8'), bytes(message, 'utf8'), digestmod=hashlib.sha256).hexdigest()
     return signature
+
+
+class Signer:
+    """
+    一个账户一个 Signer，secret 只初始化一次 HMAC，每次签名复制已经初始化的状态
+    签名路径的前缀 /{exchange}/{name} 也只拼接一次，endpoint 不包含 query，不需要 urlparse
+    """
+
+    def __init__(self, secret, path_prefix=''):
+        """
+        :param secret: ot-secret
+        :param path_prefix: /binance/test_user1
+        """
+        self._hmac = hmac.new(bytes(secret, 'utf8'), digestmod=hashlib.sha256)
+        self.path_prefix = path_prefix
+
+    def sign(self, verb, endpoint, nonce, data_str=''):
+        """
+        和 gen_sign(secret, verb, path_prefix + endpoint, nonce, data_str) 的结果一致
+        :param verb: GET / POST / PATCH / DELETE
+        :param endpoint: /orders
+        :param nonce: str
+        :param data_str: 请求的 json 字符串
+        :return: hex 签名
+        """
+        h = self._hmac.copy()
+        h.update((verb + self.path_prefix + endpoint + nonce + (data_str or '')).encode())
+        return h.hexdigest()
@@ -0,0 +1,90 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from . import util
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    deletes = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        Handler.deletes += 1
+        time.sleep(0.5)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+@pytest.fixture
+def url(http_server):
+    return http_server(Handler)
+
+
+def test_transport_reuses_connections(url):
+    transport = util.Transport(pool_maxsize=4)
+    assert transport.prewarm(url, connections=2) == 2
+    for i in range(10):
+        res, err = util.http_go(transport.session.get, '{}/x/{}'.format(url, i))
+        assert not err and res['path'] == '/x/{}'.format(i)
+    stats = transport.stats()
+    assert stats['requests'] == 12
+    assert stats['connections'] <= 2
+    assert stats['reuse_ratio'] >= 10 / 12
+    transport.close()
+
+
+def test_delete_not_retried_after_read_timeout(url):
+    transport = util.Transport(retries=2, backoff=0)
+    Handler.deletes = 0
+    with pytest.raises(requests.Timeout):
+        transport.session.delete(url + '/orders', timeout=0.2)
+    assert Handler.deletes == 1
+    transport.close()
+
+
+def test_shared_session():
+    assert util.get_requests_sess() is util.get_requests_sess()
+    assert util.get_requests_sess() is util.get_transport().session
+
+
+def test_new_session_shares_pool():
+    transport = util.Transport()
+    s1, s2 = transport.new_session(), transport.new_session()
+    s1.cookies.set('token', 'a')
+    s1.headers['X-Test'] = '1'
+    assert 'token' not in s2.cookies and 'X-Test' not in s2.headers
+    assert s1.get_adapter('https://1token.trade') is s2.get_adapter('https://1token.trade') is transport.adapter
+
+
+def test_nonce_increasing():
+    nonces = [int(util.gen_nonce()) for _ in range(1000)]
+    assert nonces == sorted(set(nonces))
+
+
+def test_signer_matches_gen_sign():
+    signer = util.Signer('secret', '/binance/test_user1')
+    body = '{"contract": "binance/btc.usdt", "price": 1, "bs": "b", "amount": 1}'
+    for verb, data in (('POST', body), ('GET', ''), ('DELETE', None)):
+        nonce = util.gen_nonce()
+        assert signer.sign(verb, '/orders', nonce, data) == \
+            util.gen_sign('secret', verb, '/binance/test_user1/orders', nonce, data)
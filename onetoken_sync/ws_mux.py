@@ -0,0 +1,371 @@
+"""
+一个线程驱动多个账户的 websocket 连接
+
+    mux = AccountWsMux()
+    for symbol in symbols:
+        acc = Account(symbol, ws_mux=mux)     # 或者设置 Config.ACCOUNT_WS_MUX = True 使用进程内共享的 mux
+        acc.ws_subscribe_orders(on_order)
+        acc.ws_start()
+
+所有连接的读取、心跳和重连调度都在 mux 的线程里完成，只有建立连接(握手)交给一个小的线程池，
+每个账户不再需要单独的 run 线程和心跳线程。推送的回调也在 mux 线程里执行，耗时的处理应该交给其他线程
+"""
+import _thread as thread
+import collections
+import heapq
+import selectors
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import websocket
+from websocket import ABNF
+
+from . import codec
+from .config import Config
+from .logger import log
+
+
+class _Conn:
+    """
+    mux 里的一条连接，AccountWs.ws 指向它，send / close 都交给 mux 线程执行
+    """
+
+    def __init__(self, mux, account_ws, ws):
+        self.mux = mux
+        self.account_ws = account_ws
+        self.ws = ws
+        self.sock = ws.sock  # 连接断开时 websocket-client 会把 ws.sock 置为 None
+        self.out = bytearray()  # 还没有写进 socket 的帧
+        self.out_since = None  # out 从什么时候开始不为空
+        self.ping_sent = None
+        self.next_ping = time.time() + account_ws.ping_interval
+
+    def send(self, message):
+        self.mux.call(self.mux._write, self, message)
+
+    def close(self):
+        self.mux.call(self.mux._drop, self)
+
+
+class AccountWsMux:
+    def __init__(self, connect_workers=None, connect_timeout=None, send_timeout=5):
+        """
+        :param connect_workers: 同时建立连接的线程数，默认 Config.ACCOUNT_WS_MUX_CONNECT_WORKERS
+        :param connect_timeout: 建立连接的超时时间(秒)，默认 Config.ACCOUNT_WS_CONNECT_TIMEOUT
+        :param send_timeout: 待发送的数据超过这么多秒还没有写完时断开连接(秒)
+        """
+        self.connect_workers = connect_workers or Config.ACCOUNT_WS_MUX_CONNECT_WORKERS
+        self.connect_timeout = connect_timeout or Config.ACCOUNT_WS_CONNECT_TIMEOUT
+        self.send_timeout = send_timeout
+        self.selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self.accounts = {}  # AccountWs -> _Conn，没有连接时为 None
+        self._connecting = set()
+        self._commands = collections.deque()
+        self._timers = []  # (时间, 序号, AccountWs)
+        self._seq = 0
+        self._heartbeat_at = 0
+        self._executor = None
+        self._lock = thread.allocate_lock()
+        self.is_running = False
+        self.closed = False
+        self.messages = 0
+
+    def add(self, account_ws):
+        """
+        开始维护 account_ws 的连接，由 AccountWs.run 调用
+        """
+        self.call(self._add, account_ws)
+
+    def remove(self, account_ws):
+        """
+        断开并不再维护 account_ws 的连接，由 AccountWs.close 调用
+        """
+        self.call(self._remove, account_ws)
+
+    def call(self, func, *args):
+        """
+        在 mux 线程里执行 func(*args)
+        """
+        self._commands.append((func, args))
+        self._start()
+        self._wake()
+
+    def _start(self):
+        if self.is_running or self.closed:
+            return
+        with self._lock:
+            if not self.is_running and not self.closed:
+                self.is_running = True
+                thread.start_new_thread(self._loop, ())
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _loop(self):
+        while self.is_running:
+            try:
+                for key, events in self.selector.select(self._timeout()):
+                    if key.data is None:
+                        self._drain_wake()
+                        continue
+                    if events & selectors.EVENT_WRITE:
+                        self._flush(key.data)
+                    if events & selectors.EVENT_READ:
+                        self._read(key.data)
+                while self._commands:
+                    func, args = self._commands.popleft()
+                    func(*args)
+                now = time.time()
+                if now >= self._heartbeat_at:
+                    self._heartbeat(now)
+                self._run_timers(now)
+            except Exception:
+                log.exception('account ws mux loop error')
+        for conn in list(self.accounts.values()):
+            if conn is not None:
+                self._shutdown(conn)
+        self.accounts = {}
+        self.selector.close()
+
+    def _timeout(self):
+        if self._commands:
+            return 0
+        deadline = self._heartbeat_at if self.accounts else None
+        if self._timers:
+            deadline = self._timers[0][0] if deadline is None else min(deadline, self._timers[0][0])
+        if deadline is None:
+            return None
+        return max(deadline - time.time(), 0)
+
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _add(self, account_ws):
+        if account_ws in self.accounts:
+            return
+        self.accounts[account_ws] = None
+        if account_ws.ws_state == account_ws.IDLE:
+            account_ws.set_ws_state(account_ws.GOING_TO_CONNECT, 'added to mux')
+        self._schedule(account_ws, 0)
+
+    def _remove(self, account_ws):
+        conn = self.accounts.pop(account_ws, None)
+        if conn is not None:
+            self._shutdown(conn)
+
+    def _schedule(self, account_ws, delay):
+        self._seq += 1
+        heapq.heappush(self._timers, (time.time() + delay, self._seq, account_ws))
+
+    def _run_timers(self, now):
+        while self._timers and self._timers[0][0] <= now:
+            _, _, account_ws = heapq.heappop(self._timers)
+            if self.accounts.get(account_ws, False) is None and account_ws not in self._connecting:
+                self._start_connect(account_ws)
+
+    def _start_connect(self, account_ws):
+        if self.closed:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.connect_workers)
+        account_ws.set_ws_state(account_ws.CONNECTING)
+        self._connecting.add(account_ws)
+        self._executor.submit(self._connect, account_ws, account_ws.ws_path, account_ws.ws_headers())
+
+    def _connect(self, account_ws, url, headers):
+        # 在连接线程里完成握手，结果交回 mux 线程
+        ws = websocket.WebSocket()
+        try:
+            ws.connect(url, header=headers, timeout=self.connect_timeout)
+        except Exception as e:
+            log.warning('ws connect failed', account_ws.symbol, e)
+            ws = None
+        self.call(self._connected, account_ws, ws)
+
+    def _connected(self, account_ws, ws):
+        self._connecting.discard(account_ws)
+        if account_ws not in self.accounts or not account_ws.is_running:
+            if ws is not None:
+                ws.shutdown()
+            return
+        if ws is None:
+            self._lost(account_ws)
+            return
+        ws.sock.setblocking(False)
+        conn = _Conn(self, account_ws, ws)
+        self.accounts[account_ws] = conn
+        account_ws.ws = conn
+        account_ws.connected_at = time.time()
+        account_ws._was_ready = False
+        self.selector.register(ws.sock, selectors.EVENT_READ, conn)
+        self._heartbeat_at = min(self._heartbeat_at, conn.next_ping)
+        # 握手时可能已经收到了数据(TLS 解密后的缓冲区不会触发 select)
+        self._read(conn)
+
+    def _read(self, conn):
+        account_ws = conn.account_ws
+        while self.accounts.get(account_ws) is conn:
+            try:
+                opcode, data = conn.ws.recv_data(control_frame=True)
+            except (BlockingIOError, ssl.SSLWantReadError):
+                return
+            except Exception as e:
+                log.warning('ws connection lost', account_ws.symbol, e)
+                self._drop(conn)
+                return
+            if opcode == ABNF.OPCODE_CLOSE:
+                self._drop(conn)
+                return
+            if opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+                self.messages += 1
+                if opcode == ABNF.OPCODE_TEXT and isinstance(data, bytes):
+                    data = data.decode()
+                account_ws.on_message(data)
+                if not account_ws.ws_support:
+                    self._drop(conn)
+
+    def _write(self, conn, message):
+        if self.accounts.get(conn.account_ws) is not conn:
+            return
+        opcode = ABNF.OPCODE_BINARY if isinstance(message, bytes) else ABNF.OPCODE_TEXT
+        frame = ABNF.create_frame(message, opcode)
+        if conn.ws.get_mask_key:
+            frame.get_mask_key = conn.ws.get_mask_key
+        if not conn.out:
+            conn.out_since = time.time()
+        conn.out += frame.format()
+        self._flush(conn)
+
+    def _flush(self, conn):
+        # socket 是非阻塞的，写不完的部分留在 out 里，等 socket 可写时继续，不会卡住其他连接
+        if self.accounts.get(conn.account_ws) is not conn:
+            return
+        try:
+            while conn.out:
+                n = conn.sock.send(conn.out)
+                del conn.out[:n]
+        except (BlockingIOError, ssl.SSLWantWriteError, ssl.SSLWantReadError):
+            pass
+        except Exception as e:
+            log.warning('ws send failed', conn.account_ws.symbol, e)
+            self._drop(conn)
+            return
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if conn.out else selectors.EVENT_READ
+        if self.selector.get_key(conn.sock).events != events:
+            self.selector.modify(conn.sock, events, conn)
+        if not conn.out:
+            conn.out_since = None
+
+    def _heartbeat(self, now):
+        next_at = now + 1
+        for conn in list(self.accounts.values()):
+            if conn is None:
+                continue
+            account_ws = conn.account_ws
+            if conn.out_since is not None and now - conn.out_since >= self.send_timeout:
+                log.warning('ws send timeout', account_ws.symbol)
+                self._drop(conn)
+                continue
+            if conn.ping_sent is not None:
+                if account_ws.last_pong >= conn.ping_sent:
+                    conn.ping_sent = None
+                elif now - conn.ping_sent >= account_ws.ping_timeout:
+                    log.warning('ws connection heartbeat lost', account_ws.symbol)
+                    account_ws.heartbeat_lost += 1
+                    self._drop(conn)
+                    continue
+                else:
+                    next_at = min(next_at, conn.ping_sent + account_ws.ping_timeout)
+                    continue
+            if now >= conn.next_ping:
+                conn.ping_sent = now
+                conn.next_ping = now + account_ws.ping_interval
+                self._write(conn, codec.dumps({'uri': 'ping', 'uuid': now}))
+                next_at = min(next_at, now + account_ws.ping_timeout)
+            else:
+                next_at = min(next_at, conn.next_ping)
+        self._heartbeat_at = next_at
+
+    def _shutdown(self, conn):
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            conn.ws.shutdown()
+        except Exception:
+            pass
+
+    def _drop(self, conn):
+        account_ws = conn.account_ws
+        if self.accounts.get(account_ws) is not conn:
+            return
+        self._shutdown(conn)
+        self.accounts[account_ws] = None
+        account_ws.on_close()
+        self._lost(account_ws)
+
+    def _lost(self, account_ws):
+        if account_ws.disconnected_at is None:
+            account_ws.disconnected_at = time.time()
+        if not account_ws.is_running or not account_ws.ws_support:
+            self.accounts.pop(account_ws, None)
+            return
+        account_ws.set_ws_state(account_ws.GOING_TO_CONNECT, 'connection closed')
+        # 认证通过过的连接断开时马上重连，连续失败才退避
+        delay = 0 if account_ws._was_ready else account_ws.backoff.next()
+        account_ws._was_ready = False
+        self._schedule(account_ws, delay)
+
+    def stats(self):
+        """
+        :return: 连接数、READY 的账户数、收到的消息数和重连次数
+        """
+        accounts = list(self.accounts.items())
+        return {'accounts': len(accounts),
+                'connected': sum(1 for _, conn in accounts if conn is not None),
+                'ready': sum(1 for acc, _ in accounts if acc.ws_state == acc.READY),
+                'messages': self.messages,
+                'reconnects': sum(acc.reconnects for acc, _ in accounts),
+                'heartbeat_lost': sum(acc.heartbeat_lost for acc, _ in accounts)}
+
+    def close(self):
+        """
+        断开所有连接并停止 mux 线程
+        """
+        self.closed = True
+        self.is_running = False
+        self._wake()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_mux = None
+_mux_lock = thread.allocate_lock()
+
+
+def get_account_ws_mux():
+    """
+    进程内共享的 AccountWsMux，Config.ACCOUNT_WS_MUX 为 True 时所有 Account 默认使用它
+    :return: AccountWsMux
+    """
+    global _mux
+    if _mux is None or _mux.closed:
+        with _mux_lock:
+            # close() 之后重新创建，否则之后的 Account 会一直连不上
+            if _mux is None or _mux.closed:
+                _mux = AccountWsMux()
+    return _mux
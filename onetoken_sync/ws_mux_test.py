@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from .mock_server import MockServer
+from .ws_mux import AccountWsMux
+
+
+@pytest.fixture
+def mux():
+    m = AccountWsMux()
+    yield m
+    m.close()
+
+
+def test_many_accounts_one_thread(server, mux, account_ws):
+    n = 20
+    got = {}
+    done = threading.Event()
+
+    def handler(name):
+        def on_order(order):
+            got[name] = order
+            if len(got) == n:
+                done.set()
+        return on_order
+
+    before = len(sys._current_frames())
+    accounts = [account_ws(server, 'acc{:02d}'.format(i), mux=mux) for i in range(n)]
+    for ws in accounts:
+        ws.subscribe_orders(handler(ws.account))
+        ws.run()
+    assert server.wait_for(lambda: len(server.subscriptions) == n)
+    assert mux.stats()['ready'] == n
+    # 除了 mock server 每个连接的线程，只多了 mux 线程和建立连接的线程池
+    assert len(sys._current_frames()) - before - n <= 1 + mux.connect_workers
+    for ws in accounts:
+        server.push({'uri': 'order', 'data': [{'exchange_oid': ws.account, 'status': 'pending'}]}, ws.account)
+    assert done.wait(5)
+    assert all(got[name]['exchange_oid'] == name for name in got)
+
+
+def test_reconnect_and_close(server, mux, account_ws):
+    ws = account_ws(server, mux=mux)
+    ws.subscribe_info(lambda info: None)
+    ws.run()
+    assert server.wait_for(lambda: len(server.subscriptions) == 1)
+    server.drop_all()
+    assert server.wait_for(lambda: len(server.subscriptions) == 2)
+    assert ws.reconnect_stats()['reconnects'] == 1
+    ws.close()
+    assert server.wait_for(lambda: not server.live_connections())
+    assert mux.stats()['accounts'] == 0
+
+
+def test_heartbeat_lost(mux, account_ws):
+    with MockServer(respond_pong=False) as server:
+        ws = account_ws(server, mux=mux, ping_interval=0.2, ping_timeout=0.2)
+        ws.run()
+        assert server.wait_for(lambda: ws.reconnects >= 1)
+        assert ws.heartbeat_lost >= 1
+
+
+def test_slow_peer_does_not_block_others(server, mux, account_ws):
+    release = threading.Event()
+
+    def stall(conn, js):
+        # 这个连接的服务端线程停止读取，客户端的发送缓冲区很快会被写满
+        if js.get('uri') == 'stall':
+            release.wait(10)
+            return True
+
+    server.on_message(stall)
+    slow, fast = account_ws(server, 'slow', mux=mux), account_ws(server, 'fast', mux=mux)
+    got = threading.Event()
+    fast.subscribe_orders(lambda order: got.set())
+    slow.run()
+    fast.run()
+    assert server.wait_for(lambda: mux.stats()['ready'] == 2)
+    slow.send_json({'uri': 'stall'})
+    for _ in range(16):
+        slow.send_message('x' * (1 << 20))
+    try:
+        time.sleep(0.2)
+        server.push({'uri': 'order', 'data': [{'exchange_oid': 'e1', 'status': 'pending'}]}, 'fast')
+        assert got.wait(1)
+    finally:
+        release.set()
+
+
+def test_shared_mux_recreated_after_close():
+    from . import ws_mux
+    first = ws_mux.get_account_ws_mux()
+    assert ws_mux.get_account_ws_mux() is first
+    first.close()
+    second = ws_mux.get_account_ws_mux()
+    assert second is not first and not second.closed
+    second.close()
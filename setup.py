@@ -35,5 +35,11 @@ setup(name='onetoken_sync',
           'PyYAML>=3',
           'requests',
       ],
+      extras_require={
+          'aio': ['aiohttp'],
+          'numpy': ['numpy'],
+          'orjson': ['orjson'],
+          'ujson': ['ujson'],
+      },
       zip_safe=False,
       )